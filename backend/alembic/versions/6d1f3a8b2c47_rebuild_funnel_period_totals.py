@@ -0,0 +1,69 @@
+"""rebuild funnel period totals
+
+Revision ID: 6d1f3a8b2c47
+Revises: 5b7d2e4c8a13
+Create Date: 2026-10-18 13:35:12.804416
+
+"""
+from datetime import datetime
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d1f3a8b2c47'
+down_revision = '5b7d2e4c8a13'
+branch_labels = None
+depends_on = None
+
+# The period math as of this revision, inlined so that later changes to app.lib.monthly_period don't change it
+PERIOD_BREAKPOINT = 15
+
+
+def clamp_month(month, year):
+    return (month - 1) % 12 + 1, year + (month - 1) // 12
+
+
+def clamp_month_before(month, year):
+    """clamp_month before this revision, it put January before the breakpoint in December of the same year"""
+    if month % 12 == 0:
+        return 12, year
+    return month % 12, year + math.floor(month / 12)
+
+
+def period_start(timestamp, clamp):
+    dt = datetime.fromtimestamp(timestamp / 1000)
+    month, year = clamp(dt.month - 1 if dt.day < PERIOD_BREAKPOINT else dt.month, dt.year)
+    dt = dt.replace(year=year, month=month, day=PERIOD_BREAKPOINT, hour=0, minute=0, second=0, microsecond=0)
+    return math.ceil(dt.timestamp() * 1000)
+
+
+def rebuild_totals(clamp):
+    totals_table = sa.table('funnel_period_totals',
+        sa.column('funnel_id', sa.String()),
+        sa.column('period_start', sa.Integer()),
+        sa.column('spent', sa.Float()),
+    )
+    totals = {}
+    for funnel_id, timestamp, amount in op.get_bind().execute(
+        sa.text('SELECT funnel_id, timestamp, amount FROM spendings')
+    ):
+        key = (funnel_id, period_start(timestamp, clamp))
+        totals[key] = totals.get(key, 0) + amount
+    op.execute(totals_table.delete())
+    if totals:
+        op.bulk_insert(totals_table, [
+            {'funnel_id': funnel_id, 'period_start': start, 'spent': spent}
+            for (funnel_id, start), spent in totals.items()
+        ])
+
+
+def upgrade() -> None:
+    # Spendings in January before the breakpoint were totalled under a period starting in December of the same year
+    rebuild_totals(clamp_month)
+
+
+def downgrade() -> None:
+    rebuild_totals(clamp_month_before)
@@ -0,0 +1,36 @@
+from .config import (
+    CACHE_SIZE,
+    BLACKLIST_CACHE_TTL,
+    OVERVIEW_CACHE_TTL,
+    SETTINGS_CACHE_TTL,
+    CACHE_BACKEND,
+    CACHE_URL,
+)
+from .hooks import on_user_data_changed
+from .lib.cache import Cache, TTLCache, DiskCache, RedisCache
+
+
+def make_cache(namespace: str, maxsize: int, ttl: float | None = None) -> Cache:
+    """Creates a cache on the configured CACHE_BACKEND"""
+    if CACHE_BACKEND == "disk":
+        return DiskCache(CACHE_URL or "cache.db", namespace, maxsize, ttl)
+    if CACHE_BACKEND == "redis":
+        return RedisCache(CACHE_URL or "redis://localhost:6379/0", namespace, ttl)
+    return TTLCache(maxsize, ttl)
+
+
+# Tokens are cached until their `exp`, so expiry is still enforced by jwt.decode
+decoded_tokens_cache = make_cache("tokens", CACHE_SIZE)
+# username -> iat_until, or None when the user has no blacklist entry
+token_blacklist_cache = make_cache("blacklist", CACHE_SIZE, BLACKLIST_CACHE_TTL)
+# username -> {"day": the user's day, "funnels": list[FunnelPublic] as JSON}
+funnel_overview_cache = make_cache("overview", CACHE_SIZE, OVERVIEW_CACHE_TTL)
+# username -> users.data_version, set by BaseDAO._data_changed once a write has committed
+data_version_cache = make_cache("data_version", CACHE_SIZE, OVERVIEW_CACHE_TTL)
+# username -> (period_breakpoint, timezone)
+user_settings_cache = make_cache("settings", CACHE_SIZE, SETTINGS_CACHE_TTL)
+
+
+@on_user_data_changed
+def invalidate_funnel_overview(username: str):
+    funnel_overview_cache.delete(username)
@@ -0,0 +1,30 @@
+"""Maintenance commands, run as `python -m app.cli <command>`"""
+import argparse
+
+from .cache import funnel_overview_cache
+from .database import engine
+from .dao.spendings import SpendingDAO
+
+
+def rebuild_totals():
+    """Recomputes the funnel period totals from scratch, repairing any drift"""
+    with engine.begin() as conn:
+        written = SpendingDAO(conn).rebuild_period_totals()
+    funnel_overview_cache.clear()
+    print(f"Rebuilt {written} funnel period totals")
+
+
+commands = {
+    "rebuild-totals": rebuild_totals,
+}
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    parser.add_argument("command", choices=commands.keys())
+    args = parser.parse_args(argv)
+    commands[args.command]()
+
+
+if __name__ == "__main__":
+    main()
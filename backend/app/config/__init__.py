@@ -6,3 +6,44 @@ load_dotenv()
 
 DB_URL: str = os.getenv('DB_URL') or './sqlite.db'
 JWT_SECRET: str = os.getenv('JWT_SECRET') or 'secret' # TODO this should be automatically generated and re-generated every month or so
+
+MAX_BATCH_SIZE: int = int(os.getenv('MAX_BATCH_SIZE') or 10000) # rows per POST /spending/batch
+IMPORT_CHUNK_SIZE: int = int(os.getenv('IMPORT_CHUNK_SIZE') or 5000) # rows per transaction of POST /import
+
+EVENTS_QUEUE_SIZE: int = int(os.getenv('EVENTS_QUEUE_SIZE') or 100) # messages a GET /events client may fall behind before the oldest are dropped
+EVENTS_KEEPALIVE: float = float(os.getenv('EVENTS_KEEPALIVE') or 15) # seconds between keep-alive comments of GET /events
+
+COMPRESSION_MIN_SIZE: int = int(os.getenv('COMPRESSION_MIN_SIZE') or 1024) # bytes, smaller responses are sent uncompressed
+COMPRESSION_GZIP_LEVEL: int = int(os.getenv('COMPRESSION_GZIP_LEVEL') or 1) # 1 (fastest) to 9 (smallest)
+COMPRESSION_BROTLI_QUALITY: int = int(os.getenv('COMPRESSION_BROTLI_QUALITY') or 4) # 0 (fastest) to 11 (smallest)
+
+SLOW_QUERY_MS: float = float(os.getenv('SLOW_QUERY_MS') or 100) # statements taking longer are logged with their query plan
+SLOW_QUERY_LOG_SIZE: int = int(os.getenv('SLOW_QUERY_LOG_SIZE') or 1000) # slow statements kept for GET /admin/slow-queries
+ADMIN_USERNAMES: set[str] = {name.strip() for name in (os.getenv('ADMIN_USERNAMES') or '').split(',') if name.strip()} # comma separated, the users who may call the /admin routes
+
+CACHE_SIZE: int = int(os.getenv('CACHE_SIZE') or 10000) # max entries of each cache
+BLACKLIST_CACHE_TTL: float = float(os.getenv('BLACKLIST_CACHE_TTL') or 300) # seconds, bounds staleness of blacklist entries
+OVERVIEW_CACHE_TTL: float = float(os.getenv('OVERVIEW_CACHE_TTL') or 300) # seconds, the overview also changes as days pass
+SETTINGS_CACHE_TTL: float = float(os.getenv('SETTINGS_CACHE_TTL') or 60) # seconds, bounds how long other processes of the "memory" backend see old settings
+
+# "memory" keeps caches per process, "disk" shares them through the SQLite file at CACHE_URL, "redis" through the server at CACHE_URL
+CACHE_BACKEND: str = os.getenv('CACHE_BACKEND') or 'memory'
+CACHE_URL: str = os.getenv('CACHE_URL') or ''
+
+LOG_LEVEL: str = os.getenv('LOG_LEVEL') or 'INFO'
+LOG_JSON: bool = (os.getenv('LOG_JSON') or '').lower() in ('1', 'true', 'yes')
+SQL_ECHO: bool = (os.getenv('SQL_ECHO') or '').lower() in ('1', 'true', 'yes') # logs every SQL statement at INFO
+
+# "sync" runs the DAOs on a threadpool over DB_URL, "async" runs them on an AsyncEngine over ASYNC_DB_URL
+DB_BACKEND: str = os.getenv('DB_BACKEND') or 'sync'
+ASYNC_DB_URL: str = os.getenv('ASYNC_DB_URL') or DB_URL.replace('sqlite://', 'sqlite+aiosqlite://', 1)
+
+# Applied to every new SQLite connection, see https://www.sqlite.org/pragma.html
+SQLITE_PRAGMAS: dict[str, str] = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE') or 'WAL',
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS') or 'NORMAL',
+    'busy_timeout': os.getenv('SQLITE_BUSY_TIMEOUT') or '5000', # ms
+    'cache_size': os.getenv('SQLITE_CACHE_SIZE') or '-20000', # negative is KiB, i.e. 20MB
+    'mmap_size': os.getenv('SQLITE_MMAP_SIZE') or '268435456', # 256MB
+    'temp_store': os.getenv('SQLITE_TEMP_STORE') or 'MEMORY',
+}
@@ -2,18 +2,25 @@ import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.pool import StaticPool
 import pyotp
 
 from datetime import datetime, timedelta
 from uuid import uuid4
 
+from .cache import *
 from .database import metadata_obj
+from .hooks import commit
 from .lib.monthly_period import ms_timestamp
 from .main import make_app
+from .slow_queries import log_slow_queries
+from .timing import record_query_timings
+from .dao.aio import *
 from .dao.funnels import *
 from .dto.funnels import *
 from .dependencies import *
+from .dependencies import _get_db_conn, _get_db_conn_no_tx
 from .dao.spendings import *
 from .dto.spendings import *
 from .dao.users import *
@@ -27,6 +34,12 @@ TEST_USERNAME = "test"
 engine = sa.create_engine(
     SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool
 )
+async_engine = create_async_engine(
+    "sqlite+aiosqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+)
+for _engine in (engine, async_engine.sync_engine):
+    record_query_timings(_engine)
+    log_slow_queries(_engine)
 
 now = datetime.now()
 
@@ -63,9 +76,20 @@ def insert_test_data(conn: sa.Connection):
                     }
                 )
             )
+    SpendingDAO(conn).rebuild_period_totals()
     conn.commit()
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    yield
+    decoded_tokens_cache.clear()
+    token_blacklist_cache.clear()
+    funnel_overview_cache.clear()
+    user_settings_cache.clear()
+    data_version_cache.clear()
+
+
 @pytest.fixture
 def user_data():
     yield {"username": TEST_USERNAME, "otp_secret": TEST_OTP_SECRET}
@@ -102,7 +126,11 @@ def fake_auth(app: FastAPI):
             pass
 
     with DependencyOverrider(
-        app, overrides={get_user_auth: get_test_user_auth}
+        app,
+        overrides={
+            get_user_auth: get_test_user_auth,
+            get_stream_user_auth: get_test_user_auth,
+        },
     ) as overrider:
         yield overrider
 
@@ -111,25 +139,70 @@ def fake_auth(app: FastAPI):
 def client(app: FastAPI, db_connection: sa.Connection):
     def get_test_funnel_dao():
         try:
-            yield FunnelDAO(db_connection, SpendingDAO(db_connection))
+            yield AsyncFunnelDAO(db_connection)
         finally:
             pass
 
     def get_test_spending_dao():
         try:
-            yield SpendingDAO(db_connection)
+            yield AsyncSpendingDAO(db_connection)
         finally:
             pass
 
     def get_test_user_dao():
         try:
-            yield UsersDAO(db_connection)
+            yield AsyncUsersDAO(db_connection)
+        finally:
+            pass
+
+    def get_test_import_dao():
+        try:
+            yield AsyncImportDAO(db_connection)
+        finally:
+            pass
+
+    def get_test_sync_dao():
+        try:
+            yield AsyncSyncDAO(db_connection)
         finally:
             pass
 
     app.dependency_overrides[get_funnel_dao] = get_test_funnel_dao
     app.dependency_overrides[get_spending_dao] = get_test_spending_dao
     app.dependency_overrides[get_user_dao] = get_test_user_dao
+    app.dependency_overrides[get_import_dao] = get_test_import_dao
+    app.dependency_overrides[get_sync_dao] = get_test_sync_dao
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def async_client(app: FastAPI):
+    """Same as `client`, but the DAOs run on an AsyncEngine like with DB_BACKEND=async"""
+
+    async def get_test_async_db_conn():
+        async with async_engine.connect() as conn:
+            yield conn
+            await conn.run_sync(commit)
+
+    async def get_test_async_db_conn_no_tx():
+        async with async_engine.connect() as conn:
+            yield conn
+
+    async def create_test_data():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(metadata_obj.create_all)
+            await conn.run_sync(insert_test_data)
+
+    async def drop_test_data():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(metadata_obj.drop_all)
+
+    app.dependency_overrides[_get_db_conn] = get_test_async_db_conn
+    app.dependency_overrides[_get_db_conn_no_tx] = get_test_async_db_conn_no_tx
 
     with TestClient(app) as client:
+        client.portal.call(create_test_data)
         yield client
+        client.portal.call(drop_test_data)
@@ -0,0 +1,231 @@
+from abc import ABC, abstractmethod
+from itertools import islice
+from typing import AsyncIterator, Callable, Iterator, TypeVar
+from uuid import UUID
+
+from sqlalchemy import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+from starlette.concurrency import run_in_threadpool
+
+from .base import BaseDAO
+from .funnels import FunnelDAO
+from .imports import ImportDAO
+from .spendings import SpendingDAO
+from .sync import SyncDAO
+from .users import UsersDAO
+from ..dto.analytics import *
+from ..dto.funnels import *
+from ..dto.imports import *
+from ..dto.spendings import *
+from ..dto.sync import *
+from ..dto.users import *
+from ..lib.monthly_period import PeriodCalendar
+
+T = TypeVar("T")
+
+
+class AsyncBaseDAO(ABC):
+    """Awaitable facade over the sync DAOs, so that route handlers never block the event loop.
+
+    On an `AsyncConnection` the sync DAO logic runs through the async driver, otherwise it runs on the threadpool.
+    """
+
+    _connection: AsyncConnection | Connection
+
+    def __init__(self, connection: AsyncConnection | Connection):
+        self._connection = connection
+
+    @abstractmethod
+    def _make_sync(self, connection: Connection) -> BaseDAO:
+        """The sync DAO whose methods `_call` runs"""
+
+    async def _call(self, method: Callable[..., T], *args, **kwargs) -> T:
+        """Calls the sync DAO `method` with a sync view of the connection"""
+
+        def call(connection: Connection):
+            return method(self._make_sync(connection), *args, **kwargs)
+
+        if isinstance(self._connection, AsyncConnection):
+            return await self._connection.run_sync(call)
+        return await run_in_threadpool(call, self._connection)
+
+    async def _iter_in_batches(
+        self, rows: Iterator[T], batch_size: int
+    ) -> AsyncIterator[T]:
+        """Drains a sync iterator on the threadpool `batch_size` items at a time, rather than one thread hop per item"""
+        while batch := await run_in_threadpool(list, islice(rows, batch_size)):
+            for row in batch:
+                yield row
+
+    async def calendar(self, username: str) -> PeriodCalendar:
+        return await self._call(BaseDAO.calendar, username)
+
+    async def data_version(self, username: str) -> int:
+        return await self._call(BaseDAO.data_version, username)
+
+
+class AsyncSpendingDAO(AsyncBaseDAO):
+    def _make_sync(self, connection: Connection):
+        return SpendingDAO(connection)
+
+    async def get_all(self, username: str, **filters) -> list[SpendingPublic]:
+        return await self._call(SpendingDAO.get_all, username, **filters)
+
+    async def get_rows(self, username: str, **filters) -> list[SpendingRow]:
+        return await self._call(SpendingDAO.get_rows, username, **filters)
+
+    async def iter_all(
+        self, username: str, yield_per: int = 500, **filters
+    ) -> AsyncIterator[dict]:
+        if isinstance(self._connection, AsyncConnection):
+            query = SpendingDAO(self._connection.sync_connection).select_all(
+                username, **filters
+            )
+            result = await self._connection.stream(
+                query, execution_options={"yield_per": yield_per}
+            )
+            async for row in result:
+                yield row._asdict()
+        else:
+            rows = SpendingDAO(self._connection).iter_all(
+                username, yield_per, **filters
+            )
+            async for row in self._iter_in_batches(rows, yield_per):
+                yield row
+
+    async def get_totals(
+        self, username: str, bucket: Bucket, **filters
+    ) -> list[AnalyticsBucket]:
+        return await self._call(SpendingDAO.get_totals, username, bucket, **filters)
+
+    async def iter_export(
+        self, username: str, yield_per: int = 500
+    ) -> AsyncIterator[dict]:
+        if isinstance(self._connection, AsyncConnection):
+            queries = SpendingDAO(self._connection.sync_connection).export_queries(
+                username
+            )
+            for query in queries:
+                result = await self._connection.stream(
+                    query, execution_options={"yield_per": yield_per}
+                )
+                async for row in result:
+                    yield row._asdict()
+        else:
+            rows = SpendingDAO(self._connection).iter_export(username, yield_per)
+            async for row in self._iter_in_batches(rows, yield_per):
+                yield row
+
+    async def create(self, spending: SpendingCreate, username: str) -> UUID:
+        return await self._call(SpendingDAO.create, spending, username)
+
+    async def create_many(
+        self, spendings: list[SpendingCreate], username: str
+    ) -> list[UUID | None]:
+        return await self._call(SpendingDAO.create_many, spendings, username)
+
+    async def update(
+        self, id: UUID, spending: SpendingCreate, username: str
+    ) -> None:
+        return await self._call(SpendingDAO.update, id, spending, username)
+
+    async def delete(self, id: UUID, username: str) -> None:
+        return await self._call(SpendingDAO.delete, id, username)
+
+    async def rebuild_period_totals(self, username: str | None = None) -> int:
+        return await self._call(SpendingDAO.rebuild_period_totals, username)
+
+
+class AsyncFunnelDAO(AsyncBaseDAO):
+    def _make_sync(self, connection: Connection):
+        return FunnelDAO(connection, SpendingDAO(connection))
+
+    async def create_default_funnels(self, username: str):
+        return await self._call(FunnelDAO.create_default_funnels, username)
+
+    async def get_all(self, username: str) -> list[FunnelPublic]:
+        return await self._call(FunnelDAO.get_all, username)
+
+    async def get_forecast(self, username: str) -> list[FunnelForecast]:
+        return await self._call(FunnelDAO.get_forecast, username)
+
+    async def get(self, id: UUID, username: str) -> FunnelPublic | None:
+        return await self._call(FunnelDAO.get, id, username)
+
+    async def create(self, *funnels: FunnelCreate) -> UUID:
+        return await self._call(FunnelDAO.create, *funnels)
+
+    async def update(self, id: UUID, funnel: FunnelCreate):
+        return await self._call(FunnelDAO.update, id, funnel)
+
+    async def delete(self, id: UUID, username: str):
+        return await self._call(FunnelDAO.delete, id, username)
+
+
+class AsyncImportDAO(AsyncBaseDAO):
+    def _make_sync(self, connection: Connection):
+        spendingDao = SpendingDAO(connection)
+        return ImportDAO(connection, FunnelDAO(connection, spendingDao), spendingDao)
+
+    async def start(self, username: str) -> ImportPublic:
+        return await self._call(ImportDAO.start, username)
+
+    async def get(self, id: UUID, username: str) -> ImportPublic | None:
+        return await self._call(ImportDAO.get, id, username)
+
+    async def funnel_ids(self, username: str) -> dict[str, str]:
+        return await self._call(ImportDAO.funnel_ids, username)
+
+    async def import_chunk(
+        self,
+        job: ImportPublic,
+        username: str,
+        records: list[dict | ValueError],
+        funnel_ids: dict[str, str],
+    ) -> ImportPublic:
+        return await self._call(
+            ImportDAO.import_chunk, job, username, records, funnel_ids
+        )
+
+    async def finish(self, job: ImportPublic) -> ImportPublic:
+        return await self._call(ImportDAO.finish, job)
+
+
+class AsyncSyncDAO(AsyncBaseDAO):
+    def _make_sync(self, connection: Connection):
+        spendingDao = SpendingDAO(connection)
+        return SyncDAO(connection, FunnelDAO(connection, spendingDao), spendingDao)
+
+    async def get_delta(self, username: str, since: int = 0) -> SyncDelta:
+        return await self._call(SyncDAO.get_delta, username, since)
+
+    async def apply(
+        self, writes: list[SyncWrite], username: str
+    ) -> list[SpendingBatchResult]:
+        return await self._call(SyncDAO.apply, writes, username)
+
+
+class AsyncUsersDAO(AsyncBaseDAO):
+    def _make_sync(self, connection: Connection):
+        return UsersDAO(connection)
+
+    async def create(self, user: UserCreate):
+        return await self._call(UsersDAO.create, user)
+
+    async def check_username(self, username: str):
+        return await self._call(UsersDAO.check_username, username)
+
+    async def check_auth(self, username: str, otp: str):
+        return await self._call(UsersDAO.check_auth, username, otp)
+
+    async def decode_token(self, token: str):
+        return await self._call(UsersDAO.decode_token, token)
+
+    async def invalidate_tokens(self, username: str, iat_until: int):
+        return await self._call(UsersDAO.invalidate_tokens, username, iat_until)
+
+    async def get_settings(self, username: str) -> UserSettings:
+        return await self._call(UsersDAO.get_settings, username)
+
+    async def update_settings(self, username: str, settings: UserSettings):
+        return await self._call(UsersDAO.update_settings, username, settings)
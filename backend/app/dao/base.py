@@ -1,5 +1,22 @@
+from typing import Callable
+
+import sqlalchemy as sa
 from sqlalchemy import Connection
 
+from .tables import users_table
+from ..cache import data_version_cache, user_settings_cache
+from ..events import publish_on_commit, user_events
+from ..hooks import call_on_commit, has_pending_changes, user_data_changed
+from ..lib.monthly_period import PERIOD_BREAKPOINT, PeriodCalendar, get_calendar
+
+
+def cache_data_version(username: str, version: int):
+    """Caches the version unless a newer one is cached: a reader that loaded its version before a concurrent write
+    committed may get here after the writer did, and must not put the older version back"""
+    cached = data_version_cache.get(username)
+    if cached is None or cached < version:
+        data_version_cache.set(username, version)
+
 
 class BaseDAO:
     _connection: Connection
@@ -8,3 +25,75 @@ class BaseDAO:
     def __init__(self, connection: Connection):
         self._connection = connection
 
+    def _load_user_state(self, username: str) -> tuple[tuple[int, str | None], int]:
+        """Reads the settings and the data version of the user in one go, and caches both"""
+        row = self._connection.execute(
+            sa.select(
+                users_table.c.period_breakpoint,
+                users_table.c.timezone,
+                users_table.c.data_version,
+            ).where(users_table.c.username == username)
+        ).one_or_none()
+        settings, version = (
+            ((PERIOD_BREAKPOINT, None), 0)
+            if row is None
+            else ((row.period_breakpoint, row.timezone), row.data_version)
+        )
+        user_settings_cache.set(username, settings)
+        # after a write of this transaction, the version is one that may never commit
+        if not has_pending_changes(self._connection, username):
+            cache_data_version(username, version)
+        return settings, version
+
+    def calendar(self, username: str) -> PeriodCalendar:
+        """The period calendar of the user's breakpoint and timezone.
+
+        Settings are cached, and calendars are shared, so the boundaries of each day are computed once"""
+        settings = user_settings_cache.get(username)
+        if settings is None:
+            settings, _ = self._load_user_state(username)
+        return get_calendar(*settings)
+
+    def data_version(self, username: str) -> int:
+        """The version of the user's data, which changes with every write to their funnels, spendings or settings"""
+        version = data_version_cache.get(username)
+        if version is None:
+            _, version = self._load_user_state(username)
+        return version
+
+    def _bump_data_version(self, username: str) -> tuple[int, PeriodCalendar]:
+        """Bumps the version of the user's data. Returns it along with the user's calendar as of this transaction,
+        which writes file their period totals by: the cached settings may lag behind a concurrent PUT /user/settings,
+        or one served by another worker, and totals filed under the periods of old settings are never read again"""
+        row = self._connection.execute(
+            sa.update(users_table)
+            .where(users_table.c.username == username)
+            .values(data_version=users_table.c.data_version + 1)
+            .returning(
+                users_table.c.data_version,
+                users_table.c.period_breakpoint,
+                users_table.c.timezone,
+            )
+        ).one()
+        return row.data_version, get_calendar(row.period_breakpoint, row.timezone)
+
+    def _data_changed(
+        self,
+        username: str,
+        event: Callable[[], dict] | None = None,
+        version: int | None = None,
+    ):
+        """Called after every write to the user's data, bumps its version unless the write did with
+        `_bump_data_version` already, and fires the user_data_changed hooks.
+
+        When the user has GET /events subscribers, they get the message made by `event` on commit, with the new version
+        """
+        if version is None:
+            version, _ = self._bump_data_version(username)
+        user_data_changed(self._connection, username)
+        # the rest of this transaction reads its own version, the new one is cached once other connections can read it
+        data_version_cache.delete(username)
+        call_on_commit(self._connection, lambda: cache_data_version(username, version))
+        if user_events.has_subscribers(username):
+            message = {"type": "changed"} if event is None else event()
+            publish_on_commit(self._connection, username, message | {"version": version})
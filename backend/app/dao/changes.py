@@ -0,0 +1,75 @@
+from typing import Literal
+
+import sqlalchemy as sa
+
+from .base import BaseDAO
+from .tables import changes_table
+
+Entity = Literal["funnel", "spending"]
+
+
+class ChangeLogDAO(BaseDAO):
+    """Keeps the latest change of every funnel and spending under a sequence number that only grows,
+    so that clients can fetch what changed since the last sequence they saw. Deletes leave a tombstone.
+
+    A funnel is also recorded as changed when a spending moves away from it, since its remaining amount changes."""
+
+    def record(
+        self,
+        username: str,
+        entity: Entity,
+        *changes: tuple[str, str],
+        deleted: bool = False,
+    ):
+        """Records the (entity_id, funnel_id) changes, replacing the previous change of each entity"""
+        if not changes:
+            return
+        self._connection.execute(
+            sa.insert(changes_table).prefix_with("OR REPLACE"),
+            [
+                {
+                    "user_name": username,
+                    "entity": entity,
+                    "entity_id": entity_id,
+                    "funnel_id": funnel_id,
+                    "deleted": deleted,
+                }
+                for entity_id, funnel_id in changes
+            ],
+        )
+
+    def record_from(
+        self, username: str, entity: Entity, rows: sa.Select, deleted: bool = False
+    ):
+        """Same as `record` for the (entity_id, funnel_id) rows that `rows` selects, in one INSERT ... SELECT"""
+        rows = rows.subquery()
+        self._connection.execute(
+            sa.insert(changes_table)
+            .prefix_with("OR REPLACE")
+            .from_select(
+                ["user_name", "entity", "entity_id", "funnel_id", "deleted"],
+                sa.select(
+                    sa.literal(username),
+                    sa.literal(entity),
+                    *rows.c,
+                    sa.literal(deleted),
+                ),
+            )
+        )
+
+    def version(self, username: str) -> int:
+        """The sequence of the user's latest change, 0 when there is none"""
+        return (
+            self._connection.execute(
+                sa.select(sa.func.max(changes_table.c.seq)).where(
+                    changes_table.c.user_name == username
+                )
+            ).scalar()
+            or 0
+        )
+
+    def since(self, username: str, seq: int, *columns) -> sa.Select:
+        """Selects the user's changes after `seq`"""
+        return sa.select(*(columns or (changes_table,))).where(
+            changes_table.c.user_name == username, changes_table.c.seq > seq
+        )
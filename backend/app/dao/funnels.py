@@ -1,14 +1,20 @@
 from uuid import uuid4, UUID
 from pydantic.color import Color
 
+import numpy as np
 import sqlalchemy as sa
 
 from .base import BaseDAO
+from .changes import ChangeLogDAO
+from .scope import UserScope
+from .snapshots import PeriodSnapshotDAO
 from .spendings import SpendingDAO
-from .tables import funnels_table
+from .tables import funnels_table, funnel_period_totals_table, spendings_table
+from ..cache import funnel_overview_cache
 from ..database import *
 from ..dto.funnels import *
 from ..exceptions import FunnelDoesNotExistException
+from ..lib.forecast import BURN_RATE_WINDOW, daily_spend, forecast
 from ..lib.monthly_period import *
 
 
@@ -16,6 +22,7 @@ class FunnelDAO(BaseDAO):
     def __init__(self, connection: sa.Connection, spendingDao: SpendingDAO):
         super().__init__(connection)
         self._spendingDao = spendingDao
+        self._changes = ChangeLogDAO(connection)
 
     def create_default_funnels(self, username: str):
         return self.create(
@@ -35,15 +42,26 @@ class FunnelDAO(BaseDAO):
             ),
         )
 
-    def from_row(self, row: dict) -> FunnelPublic:
-        spendings = [
-            spending.amount
-            for spending in self._spendingDao.get_all(
-                timestamp_from=get_current_period_start()
+    def _select_with_spent(self, username: str, calendar: PeriodCalendar) -> sa.Select:
+        """Selects the user's funnels along with the amount spent in the current period of their calendar"""
+        return (
+            UserScope(username)
+            .funnels(
+                funnels_table,
+                sa.func.coalesce(funnel_period_totals_table.c.spent, 0).label("spent"),
             )
-            if str(spending.funnel_id) == row["id"]
-        ]
-        remaining = row["limit"] - sum(spendings)
+            .outerjoin(
+                funnel_period_totals_table,
+                (funnel_period_totals_table.c.funnel_id == funnels_table.c.id)
+                & (
+                    funnel_period_totals_table.c.period_start
+                    == calendar.current_period_start()
+                ),
+            )
+        )
+
+    def from_row(self, row: dict, calendar: PeriodCalendar) -> FunnelPublic:
+        remaining = row["limit"] - row.pop("spent")
         return FunnelPublic(
             **row
             | {
@@ -51,45 +69,154 @@ class FunnelDAO(BaseDAO):
                 "daily": remaining
                 - (
                     row["limit"]
-                    * get_current_period_remaining_days()
-                    / get_current_period_length()
+                    * calendar.remaining_days()
+                    / calendar.period_length()
                 ),
             }
         )
 
     def get_all(self, username: str) -> list[FunnelPublic]:
-        result = self._connection.execute(
-            sa.select(funnels_table).where(funnels_table.c.user_name == username)
+        """The user's funnels, cached along with the user's day, since the period and the daily allowances depend on it
+        just like the ETag of GET /funnel/ does"""
+        day = self.calendar(username).today().isoformat()
+        cached = funnel_overview_cache.get(username)
+        if isinstance(cached, dict) and cached["day"] == day:
+            return funnel_list_adapter.validate_python(cached["funnels"])
+        funnels = self.get_many(username)
+        funnel_overview_cache.set(
+            username,
+            {"day": day, "funnels": funnel_list_adapter.dump_python(funnels, mode="json")},
+        )
+        return funnels
+
+    def get_many(
+        self, username: str, ids: sa.Select | list[str] | None = None
+    ) -> list[FunnelPublic]:
+        """Same as `get_all` without the cache, for the funnels whose ids are in `ids`, or all of them"""
+        calendar = self.calendar(username)
+        query = self._select_with_spent(username, calendar)
+        if ids is not None:
+            query = query.where(funnels_table.c.id.in_(ids))
+        result = self._connection.execute(query).all()
+        return [self.from_row(row._asdict(), calendar) for row in result]
+
+    def _funnels_event(self, username: str, ids: list[str]) -> dict:
+        """The GET /events message with the written funnels as GET /funnel/ shows them"""
+        return {
+            "type": "funnels",
+            "funnels": [
+                funnel.dict()
+                for funnel in self.get_many(username, ids)
+            ],
+        }
+
+    def get_forecast(self, username: str) -> list[FunnelForecast]:
+        """Forecasts all of the user's funnels at once from the spendings of the trailing burn rate window"""
+        calendar = self.calendar(username)
+        funnels = self._connection.execute(
+            self._select_with_spent(username, calendar)
+        ).all()
+        if not funnels:
+            return []
+        index = {funnel.id: i for i, funnel in enumerate(funnels)}
+
+        start = calendar.midnight(calendar.today()) - (BURN_RATE_WINDOW - 1) * DAY_MS
+        rows = self._connection.execute(
+            UserScope(username)
+            .spendings(
+                spendings_table.c.funnel_id,
+                spendings_table.c.timestamp,
+                spendings_table.c.amount,
+            )
+            .where(spendings_table.c.timestamp >= start)
         ).all()
-        return [self.from_row(row._asdict()) for row in result]
+        funnel_ids, timestamps, amounts = zip(*rows) if rows else ((), (), ())
 
-    def get(self, id: UUID, username: str) -> FunnelPublic:
+        daily = daily_spend(
+            np.fromiter((index[id] for id in funnel_ids), np.int64, len(rows)),
+            np.fromiter(timestamps, np.int64, len(rows)),
+            np.fromiter(amounts, np.float64, len(rows)),
+            len(funnels),
+            start,
+            BURN_RATE_WINDOW,
+        )
+        result = forecast(
+            np.array([funnel.limit for funnel in funnels]),
+            np.array([funnel.spent for funnel in funnels]),
+            daily,
+            calendar.remaining_days(),
+        )
+        return [
+            FunnelForecast(
+                id=funnel.id, **{key: values[i] for key, values in result.items()}
+            )
+            for i, funnel in enumerate(funnels)
+        ]
+
+    def get(self, id: UUID, username: str) -> FunnelPublic | None:
+        calendar = self.calendar(username)
         result = self._connection.execute(
-            sa.select(funnels_table)
-            .where(funnels_table.c.user_name == username)
-            .where(funnels_table.c.id == str(id))
+            self._select_with_spent(username, calendar).where(
+                funnels_table.c.id == str(id)
+            )
         ).one_or_none()
-        return self.from_row(result._asdict())
+        if result is None:
+            return None
+        return self.from_row(result._asdict(), calendar)
 
     def create(self, *funnels: FunnelCreate) -> UUID:
-        result = self._connection.execute(
-            sa.insert(funnels_table),
-            [{**funnel.dict(), "id": str(uuid4())} for funnel in funnels],
-        )
-        return result.inserted_primary_key_rows[0][0]
+        rows = [{**funnel.dict(), "id": str(uuid4())} for funnel in funnels]
+        self._connection.execute(sa.insert(funnels_table), rows)
+        for username in {funnel.user_name for funnel in funnels}:
+            self._changes.record(
+                username,
+                "funnel",
+                *((row["id"], row["id"]) for row in rows if row["user_name"] == username),
+            )
+            self._data_changed(
+                username,
+                lambda: self._funnels_event(
+                    username, [row["id"] for row in rows if row["user_name"] == username]
+                ),
+            )
+        return rows[0]["id"]
 
     def update(self, id: UUID, funnel: FunnelCreate):
         result = self._connection.execute(
             sa.update(funnels_table)
             .where(funnels_table.c.id == str(id))
+            .where(funnels_table.c.user_name == funnel.user_name)
             .values(**funnel.dict())
         )
         if result.rowcount == 0:
             raise FunnelDoesNotExistException()
+        self._changes.record(funnel.user_name, "funnel", (str(id), str(id)))
+        self._data_changed(
+            funnel.user_name, lambda: self._funnels_event(funnel.user_name, [str(id)])
+        )
 
-    def delete(self, id: UUID):
+    def delete(self, id: UUID, username: str):
         result = self._connection.execute(
-            sa.delete(funnels_table).where(funnels_table.c.id == str(id))
+            sa.delete(funnels_table)
+            .where(funnels_table.c.id == str(id))
+            .where(funnels_table.c.user_name == username)
         )
         if result.rowcount == 0:
             raise FunnelDoesNotExistException()
+        self._connection.execute(
+            sa.delete(funnel_period_totals_table).where(
+                funnel_period_totals_table.c.funnel_id == str(id)
+            )
+        )
+        PeriodSnapshotDAO(self._connection).invalidate_all(username)
+        # the spendings go with their funnel, out of the user's scope
+        self._changes.record_from(
+            username,
+            "spending",
+            sa.select(spendings_table.c.id, spendings_table.c.funnel_id).where(
+                spendings_table.c.funnel_id == str(id)
+            ),
+            deleted=True,
+        )
+        self._changes.record(username, "funnel", (str(id), str(id)), deleted=True)
+        self._data_changed(username, lambda: {"type": "funnel_deleted", "id": str(id)})
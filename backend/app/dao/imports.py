@@ -0,0 +1,137 @@
+from uuid import uuid4, UUID
+
+import sqlalchemy as sa
+from pydantic import ValidationError
+
+from .base import BaseDAO
+from .funnels import FunnelDAO
+from .scope import UserScope
+from .spendings import SpendingDAO
+from .tables import funnels_table, imports_table
+from ..dto.funnels import *
+from ..dto.imports import *
+from ..dto.spendings import *
+from ..hooks import commit
+
+
+class ImportDAO(BaseDAO):
+    """Imports records in chunks, every chunk is committed along with the progress of its import.
+
+    The connection must not be inside a `begin()` block, since the DAO commits it."""
+
+    def __init__(
+        self,
+        connection: sa.Connection,
+        funnelDao: FunnelDAO,
+        spendingDao: SpendingDAO,
+    ):
+        super().__init__(connection)
+        self._funnelDao = funnelDao
+        self._spendingDao = spendingDao
+
+    def start(self, username: str) -> ImportPublic:
+        id = str(uuid4())
+        self._connection.execute(
+            sa.insert(imports_table).values(id=id, user_name=username)
+        )
+        commit(self._connection)
+        return self.get(UUID(id), username)
+
+    def get(self, id: UUID, username: str) -> ImportPublic | None:
+        result = self._connection.execute(
+            sa.select(
+                imports_table.c.id,
+                imports_table.c.rows_done,
+                imports_table.c.rows_failed,
+                imports_table.c.finished,
+            )
+            .where(imports_table.c.id == str(id))
+            .where(imports_table.c.user_name == username)
+        ).one_or_none()
+        return None if result is None else ImportPublic(**result._asdict())
+
+    def funnel_ids(self, username: str) -> dict[str, str]:
+        """Maps the names of the user's funnels to their ids"""
+        result = self._connection.execute(
+            UserScope(username).funnels(funnels_table.c.name, funnels_table.c.id)
+        )
+        return {row.name: row.id for row in result}
+
+    def _create_funnels(
+        self, records: list[dict], username: str, funnel_ids: dict[str, str]
+    ) -> int:
+        """Creates the funnels whose names are unknown so far, returns the amount of invalid records"""
+        failed = 0
+        funnels: dict[str, FunnelCreate] = {}
+        for record in records:
+            try:
+                funnel = FunnelCreate.model_validate(record | {"user_name": username})
+            except ValidationError:
+                failed += 1
+                continue
+            if funnel.name not in funnel_ids:
+                funnels[funnel.name] = funnel
+        if funnels:
+            self._funnelDao.create(*funnels.values())
+            funnel_ids.update(self.funnel_ids(username))
+        return failed
+
+    def import_chunk(
+        self,
+        job: ImportPublic,
+        username: str,
+        records: list[dict | ValueError],
+        funnel_ids: dict[str, str],
+    ) -> ImportPublic:
+        """Imports funnel records, which are skipped if the user has a funnel with the same name,
+        and spending records, which refer to their funnel by name. Unparseable records are counted as failed.
+
+        `funnel_ids` is the lookup from `funnel_ids()`, it's kept up to date with the created funnels"""
+        funnels, spendings = [], []
+        failed = 0
+        for record in records:
+            if isinstance(record, ValueError) or not isinstance(record, dict):
+                failed += 1
+            elif record.get("record") == "funnel":
+                funnels.append(record)
+            else:
+                spendings.append(record)
+
+        failed += self._create_funnels(funnels, username, funnel_ids)
+
+        valid = []
+        for record in spendings:
+            funnel_id = funnel_ids.get(record.get("funnel"))
+            try:
+                valid.append(
+                    SpendingCreate.model_validate(record | {"funnel_id": funnel_id})
+                )
+            except ValidationError:
+                failed += 1
+        ids = self._spendingDao.create_many(valid, username)
+        failed += ids.count(None)
+
+        self._connection.execute(
+            sa.update(imports_table)
+            .where(imports_table.c.id == str(job.id))
+            .values(
+                rows_done=imports_table.c.rows_done + len(records),
+                rows_failed=imports_table.c.rows_failed + failed,
+            )
+        )
+        commit(self._connection)
+        return job.model_copy(
+            update={
+                "rows_done": job.rows_done + len(records),
+                "rows_failed": job.rows_failed + failed,
+            }
+        )
+
+    def finish(self, job: ImportPublic) -> ImportPublic:
+        self._connection.execute(
+            sa.update(imports_table)
+            .where(imports_table.c.id == str(job.id))
+            .values(finished=True)
+        )
+        commit(self._connection)
+        return job.model_copy(update={"finished": True})
@@ -0,0 +1,35 @@
+import sqlalchemy as sa
+
+from .tables import funnels_table, spendings_table
+
+
+class UserScope:
+    """Builds queries that can only ever see the rows of a single user.
+
+    Spendings are joined to their funnel explicitly, so the planner can start from the `funnels.user_name` index."""
+
+    def __init__(self, username: str):
+        self.username = username
+
+    def funnels(self, *columns) -> sa.Select:
+        return sa.select(*(columns or (funnels_table,))).where(
+            funnels_table.c.user_name == self.username
+        )
+
+    def funnel_ids(self) -> sa.Select:
+        return self.funnels(funnels_table.c.id)
+
+    def spendings(self, *columns) -> sa.Select:
+        return (
+            sa.select(*(columns or (spendings_table,)))
+            .join_from(
+                spendings_table,
+                funnels_table,
+                spendings_table.c.funnel_id == funnels_table.c.id,
+            )
+            .where(funnels_table.c.user_name == self.username)
+        )
+
+    def owns_spending(self) -> sa.ColumnElement[bool]:
+        """A filter for statements on `spendings` that can't join, i.e. UPDATE and DELETE"""
+        return spendings_table.c.funnel_id.in_(self.funnel_ids())
@@ -0,0 +1,69 @@
+import json
+import logging
+from typing import Iterable
+
+import sqlalchemy as sa
+
+from .base import BaseDAO
+from .tables import period_snapshots_table
+
+logger = logging.getLogger(__name__)
+
+DayTotal = tuple[str, int, float, int]
+"""(funnel_id, day, spent, count), where day is the number of the user's local day since 1970-01-01"""
+
+
+class PeriodSnapshotDAO(BaseDAO):
+    """Stores the per-day totals of a user's closed periods, which are read far more often than they change.
+
+    A snapshot is dropped whenever a spending in its period is written, and taken again on the next read."""
+
+    def get(
+        self, username: str, period_from: int, period_to: int
+    ) -> dict[int, list[DayTotal]]:
+        """Returns the snapshots of the periods starting in [period_from, period_to) by period start"""
+        result = self._connection.execute(
+            sa.select(period_snapshots_table.c.period_start, period_snapshots_table.c.totals)
+            .where(period_snapshots_table.c.user_name == username)
+            .where(period_snapshots_table.c.period_start >= period_from)
+            .where(period_snapshots_table.c.period_start < period_to)
+        )
+        return {
+            row.period_start: [tuple(total) for total in json.loads(row.totals)]
+            for row in result
+        }
+
+    def put(self, username: str, snapshots: dict[int, list[DayTotal]]):
+        if not snapshots:
+            return
+        # in a savepoint, so a failed write leaves the transaction of the read that took them as it was
+        try:
+            with self._connection.begin_nested():
+                self._connection.execute(
+                    sa.insert(period_snapshots_table).prefix_with("OR REPLACE"),
+                    [
+                        {
+                            "user_name": username,
+                            "period_start": period_start,
+                            "totals": json.dumps(totals, separators=(",", ":")),
+                        }
+                        for period_start, totals in snapshots.items()
+                    ],
+                )
+        except sa.exc.OperationalError as e:
+            # a concurrent write got in first, the snapshot is taken again on the next read
+            logger.debug("Skipped storing snapshots of %s: %s", username, e)
+
+    def invalidate(self, username: str, period_starts: Iterable[int]):
+        """Drops the snapshots of the periods starting at `period_starts`"""
+        self._connection.execute(
+            sa.delete(period_snapshots_table)
+            .where(period_snapshots_table.c.user_name == username)
+            .where(period_snapshots_table.c.period_start.in_(set(period_starts)))
+        )
+
+    def invalidate_all(self, username: str | None = None):
+        query = sa.delete(period_snapshots_table)
+        if username is not None:
+            query = query.where(period_snapshots_table.c.user_name == username)
+        self._connection.execute(query)
@@ -1,69 +1,468 @@
 from uuid import uuid4, UUID
+import logging
 import math
 from datetime import datetime
 
+import numpy as np
 import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
+from ..dto.analytics import *
 from ..dto.spendings import *
-from ..exceptions import SpendingDoesNotExistException
+from ..exceptions import SpendingDoesNotExistException, FunnelDoesNotExistException
 from ..lib.monthly_period import *
 from .base import BaseDAO
-from .tables import spendings_table, funnels_table, users_table
+from .changes import ChangeLogDAO
+from .scope import UserScope
+from .snapshots import DayTotal, PeriodSnapshotDAO
+from .tables import (
+    spendings_table,
+    funnels_table,
+    funnel_period_totals_table,
+    users_table,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _local_day(offsets: list[tuple[int, int]]) -> sa.ColumnElement[int]:
+    """The number of the local day of each spending since 1970-01-01, given the (since, offset) UTC offsets
+    in effect over the queried range. Ranges without offset changes cost a single addition per row"""
+    timestamp = spendings_table.c.timestamp
+    offset = sa.literal(offsets[-1][1])
+    if len(offsets) > 1:
+        offset = sa.case(
+            *(
+                (timestamp < since, previous)
+                for (since, _), (_, previous) in zip(offsets[1:], offsets)
+            ),
+            else_=offset,
+        )
+    return (timestamp + offset) // DAY_MS
 
 
 class SpendingDAO(BaseDAO):
-    def get_all(
+    def __init__(self, connection: sa.Connection):
+        super().__init__(connection)
+        self._snapshots = PeriodSnapshotDAO(connection)
+        self._changes = ChangeLogDAO(connection)
+
+    def select_all(
         self,
-        username: str | None = None,
+        username: str,
         timestamp_from: int | None = None,
         timestamp_to: int | None = None,
         funnel_id: UUID4 | None = None,
-    ) -> list[SpendingPublic]:
+        after: tuple[int, str] | None = None,
+        limit: int | None = None,
+    ) -> sa.Select:
+        """Selects the user's spendings in keyset order, i.e. by (timestamp, id), starting after the `after` key.
+        Accepts the same filters as `get_all`, for callers that execute or stream the query themselves"""
         if timestamp_from is None:
-            timestamp_from = get_current_period_start()
+            timestamp_from = self.calendar(username).current_period_start()
         if timestamp_to is None:
             timestamp_to = ms_timestamp(datetime.now())
-        print("from", timestamp_from)
+        logger.debug("Selecting spendings from %s to %s", timestamp_from, timestamp_to)
 
         query = (
-            sa.select(spendings_table)
+            UserScope(username)
+            .spendings()
             .where(spendings_table.c.timestamp > timestamp_from)
             .where(spendings_table.c.timestamp < timestamp_to)
+            .order_by(spendings_table.c.timestamp, spendings_table.c.id)
+            .limit(limit)
         )
 
-        if username is not None:
+        if funnel_id is not None:
+            query = query.where(spendings_table.c.funnel_id == str(funnel_id))
+
+        if after is not None:
             query = query.where(
-                (spendings_table.c.funnel_id == funnels_table.c.id)
-                & (funnels_table.c.user_name == username)
+                sa.tuple_(spendings_table.c.timestamp, spendings_table.c.id)
+                > sa.tuple_(*after)
             )
 
-        if funnel_id is not None:
-            query = query.where(spendings_table.c.funnel_id == str(funnel_id))
+        return query
 
-        result = self._connection.execute(query).all()
-        return [SpendingPublic(**row._asdict()) for row in result]
+    def get_all(
+        self,
+        username: str,
+        timestamp_from: int | None = None,
+        timestamp_to: int | None = None,
+        funnel_id: UUID4 | None = None,
+        after: tuple[int, str] | None = None,
+        limit: int | None = None,
+    ) -> list[SpendingPublic]:
+        rows = self.get_rows(
+            username, timestamp_from, timestamp_to, funnel_id, after, limit
+        )
+        return [SpendingPublic(**row) for row in rows]
 
-    def create(self, spending: SpendingCreate) -> UUID:
+    def get_rows(
+        self,
+        username: str,
+        timestamp_from: int | None = None,
+        timestamp_to: int | None = None,
+        funnel_id: UUID4 | None = None,
+        after: tuple[int, str] | None = None,
+        limit: int | None = None,
+    ) -> list[SpendingRow]:
+        """Same as `get_all`, as plain row dicts for `spending_rows_adapter`"""
         result = self._connection.execute(
-            sa.insert(spendings_table).values(
-                **{**spending.dict(), "id": str(uuid4())}
-                | {"funnel_id": str(spending.funnel_id)}
+            self.select_all(
+                username, timestamp_from, timestamp_to, funnel_id, after, limit
             )
         )
-        return result.inserted_primary_key[0]
+        return [row._asdict() for row in result]
 
-    def update(self, id: UUID, spending: SpendingCreate) -> None:
+    def iter_all(self, username: str, yield_per: int = 500, **filters):
+        """Accepts the same filters as `get_all`, but yields plain row dicts while fetching them from the DB in batches"""
         result = self._connection.execute(
-            sa.update(spendings_table)
-            .where(spendings_table.c.id == str(id))
-            .values(**spending.dict())
+            self.select_all(username, **filters),
+            execution_options={"yield_per": yield_per},
         )
-        if result.rowcount == 0:
-            raise SpendingDoesNotExistException()
+        for row in result:
+            yield row._asdict()
+
+    def _query_day_totals(
+        self,
+        username: str,
+        calendar: PeriodCalendar,
+        timestamp_from: int,
+        timestamp_to: int,
+    ) -> list[DayTotal]:
+        """Sums the spendings in the range per funnel and local day with a GROUP BY over the spendings themselves"""
+        if timestamp_to - timestamp_from <= 1:
+            return []
+        query = self.select_all(username, timestamp_from, timestamp_to).order_by(None)
+        day = _local_day(calendar.utc_offsets(timestamp_from, timestamp_to)).label("day")
+        result = self._connection.execute(
+            query.with_only_columns(
+                spendings_table.c.funnel_id,
+                day,
+                sa.func.sum(spendings_table.c.amount),
+                sa.func.count(),
+            ).group_by(spendings_table.c.funnel_id, day)
+        )
+        return [tuple(row) for row in result]
+
+    def _first_period_start(self, username: str) -> int | None:
+        """The start of the user's first period with spendings"""
+        return self._connection.execute(
+            UserScope(username)
+            .funnels(sa.func.min(funnel_period_totals_table.c.period_start))
+            .where(funnel_period_totals_table.c.funnel_id == funnels_table.c.id)
+        ).scalar()
+
+    def _closed_periods(
+        self, calendar: PeriodCalendar, timestamp_from: int, timestamp_to: int
+    ) -> tuple[int, int] | None:
+        """Returns the [start, end) of the closed periods that lie entirely inside the range"""
+        start = calendar.period_start(timestamp_from + 1)
+        if start <= timestamp_from:
+            start = calendar.next_period_start(start)
+        end = calendar.period_start(
+            min(timestamp_to, calendar.current_period_start())
+        )
+        return (start, end) if start < end else None
+
+    def _snapshot_totals(
+        self, username: str, calendar: PeriodCalendar, start: int, end: int
+    ) -> list[DayTotal]:
+        """Per-day totals of the closed periods in [start, end), taking the snapshots that are missing"""
+        snapshots = self._snapshots.get(username, start, end)
+        missing = {}
+        period_start = start
+        while period_start < end:
+            if period_start not in snapshots:
+                missing[period_start] = []
+            period_start = calendar.next_period_start(period_start)
+
+        if missing:
+            rows = self._query_day_totals(
+                username,
+                calendar,
+                min(missing) - 1,
+                calendar.next_period_start(max(missing)),
+            )
+            for row in rows:
+                period_start = calendar.bucket_start("period", row[1])
+                if period_start in missing:
+                    missing[period_start].append(row)
+            self._snapshots.put(username, missing)
+            snapshots |= missing
+        return [total for totals in snapshots.values() for total in totals]
+
+    def get_totals(
+        self,
+        username: str,
+        bucket: Bucket,
+        timestamp_from: int | None = None,
+        timestamp_to: int | None = None,
+    ) -> list[AnalyticsBucket]:
+        """Sums the user's spendings per funnel and bucket, with the same default range as `get_all`.
 
-    def delete(self, id: UUID) -> None:
+        The DB sums per local day, which are then rolled up into buckets by the user's calendar.
+        Closed periods that the range covers entirely are summed from their snapshots rather than the spendings"""
+        calendar = self.calendar(username)
+        if timestamp_from is None:
+            timestamp_from = calendar.current_period_start()
+        if timestamp_to is None:
+            timestamp_to = ms_timestamp(datetime.now())
+
+        first = self._first_period_start(username)
+        if first is None:
+            return []
+        timestamp_from = max(timestamp_from, first - 1)
+        closed = self._closed_periods(calendar, timestamp_from, timestamp_to)
+        if closed is None:
+            days = self._query_day_totals(
+                username, calendar, timestamp_from, timestamp_to
+            )
+        else:
+            start, end = closed
+            days = [
+                *self._query_day_totals(username, calendar, timestamp_from, start),
+                *self._snapshot_totals(username, calendar, start, end),
+                *self._query_day_totals(username, calendar, end - 1, timestamp_to),
+            ]
+
+        totals: dict[tuple[int, str], list] = {}
+        for funnel_id, day, spent, count in days:
+            start = calendar.bucket_start(bucket, day)
+            total = totals.setdefault((start, funnel_id), [0, 0])
+            total[0] += spent
+            total[1] += count
+        return [
+            AnalyticsBucket(funnel_id=funnel_id, start=start, spent=spent, count=count)
+            for (start, funnel_id), (spent, count) in sorted(totals.items())
+        ]
+
+    def export_queries(self, username: str) -> tuple[sa.Select, sa.Select]:
+        """Selects the user's funnels, then all of their spendings, labelled the way `lib.export` writes them.
+
+        Spendings are not sorted, so the DB streams them in index order (by funnel, then timestamp) without a temp B-tree
+        """
+        scope = UserScope(username)
+        return (
+            scope.funnels(
+                sa.literal("funnel").label("record"),
+                funnels_table.c.id,
+                funnels_table.c.name,
+                funnels_table.c.limit,
+                funnels_table.c.color,
+                funnels_table.c.emoji,
+            ),
+            scope.spendings(
+                sa.literal("spending").label("record"),
+                spendings_table.c.id,
+                funnels_table.c.name.label("funnel"),
+                spendings_table.c.timestamp,
+                spendings_table.c.amount,
+            ),
+        )
+
+    def iter_export(self, username: str, yield_per: int = 500):
+        """Yields the user's whole history as plain row dicts, fetching them from the DB in batches"""
+        for query in self.export_queries(username):
+            result = self._connection.execute(
+                query, execution_options={"yield_per": yield_per}
+            )
+            for row in result:
+                yield row._asdict()
+
+    def _add_to_period_totals(
+        self, calendar: PeriodCalendar, *changes: tuple[str, int, float]
+    ) -> dict[tuple[str, int], float]:
+        """Adds each (funnel_id, timestamp, amount) change, where amount may be negative, to the funnel's total
+        for the period of `timestamp` in the user's `calendar`. Returns the amount added by (funnel_id, period_start)"""
+        if not changes:
+            return {}
+        funnel_ids, timestamps, amounts = zip(*changes)
+        period_starts = calendar.starts(
+            np.fromiter(timestamps, np.int64, len(timestamps))
+        )
+        totals: dict[tuple[str, int], float] = {}
+        for key, amount in zip(zip(funnel_ids, period_starts.tolist()), amounts):
+            totals[key] = totals.get(key, 0) + amount
+
+        query = sqlite_insert(funnel_period_totals_table)
+        self._connection.execute(
+            query.on_conflict_do_update(
+                index_elements=[
+                    funnel_period_totals_table.c.funnel_id,
+                    funnel_period_totals_table.c.period_start,
+                ],
+                set_={
+                    "spent": funnel_period_totals_table.c.spent + query.excluded.spent
+                },
+            ),
+            [
+                {"funnel_id": funnel_id, "period_start": period_start, "spent": spent}
+                for (funnel_id, period_start), spent in totals.items()
+            ],
+        )
+        return totals
+
+    def _spendings_changed(self, username: str, *changes: tuple[str, int, float]):
+        """Brings the data derived from the user's spendings up to date with the (funnel_id, timestamp, amount) changes"""
+        version, calendar = self._bump_data_version(username)
+        touched = self._add_to_period_totals(calendar, *changes)
+        self._snapshots.invalidate(username, (period_start for _, period_start in touched))
+
+        def event():
+            current = calendar.current_period_start()
+            # the daily allowance moves with the remaining amount, see FunnelDAO.from_row
+            return {
+                "type": "spendings",
+                "deltas": [
+                    {"id": funnel_id, "remaining": -spent, "daily": -spent}
+                    for (funnel_id, period_start), spent in touched.items()
+                    if period_start == current
+                ],
+            }
+
+        self._data_changed(username, event, version)
+
+    def create(
+        self, spending: SpendingCreate, username: str, id: UUID | None = None
+    ) -> UUID:
+        values = {**spending.dict(), "id": str(id or uuid4())}
         result = self._connection.execute(
-            sa.delete(spendings_table).where(spendings_table.c.id == str(id))
+            sa.insert(spendings_table).from_select(
+                list(values.keys()),
+                UserScope(username)
+                .funnels(*(sa.literal(value) for value in values.values()))
+                .where(funnels_table.c.id == values["funnel_id"]),
+            )
         )
         if result.rowcount == 0:
+            raise FunnelDoesNotExistException()
+        self._changes.record(username, "spending", (values["id"], values["funnel_id"]))
+        self._spendings_changed(
+            username, (values["funnel_id"], values["timestamp"], values["amount"])
+        )
+        return UUID(values["id"])
+
+    def create_many(
+        self, spendings: list[SpendingCreate], username: str
+    ) -> list[UUID | None]:
+        """Inserts all spendings in a single statement. Returns their ids in order,
+        or None for the ones whose funnel doesn't exist or belongs to another user"""
+        funnel_ids = set(
+            self._connection.execute(UserScope(username).funnel_ids()).scalars()
+        )
+        rows = [
+            {**spending.dict(), "id": str(uuid4())}
+            for spending in spendings
+            if str(spending.funnel_id) in funnel_ids
+        ]
+        if rows:
+            self._connection.execute(sa.insert(spendings_table), rows)
+            self._changes.record(
+                username,
+                "spending",
+                *((row["id"], row["funnel_id"]) for row in rows),
+            )
+            self._spendings_changed(
+                username,
+                *((row["funnel_id"], row["timestamp"], row["amount"]) for row in rows),
+            )
+
+        ids = iter(rows)
+        return [
+            UUID(next(ids)["id"]) if str(spending.funnel_id) in funnel_ids else None
+            for spending in spendings
+        ]
+
+    def update(self, id: UUID, spending: SpendingCreate, username: str) -> None:
+        scope = UserScope(username)
+        old = self._connection.execute(
+            scope.spendings(
+                spendings_table.c.funnel_id,
+                spendings_table.c.timestamp,
+                spendings_table.c.amount,
+            ).where(spendings_table.c.id == str(id))
+        ).one_or_none()
+        if old is None:
+            raise SpendingDoesNotExistException()
+        values = spending.dict()
+        if values["funnel_id"] != old.funnel_id and (
+            self._connection.execute(
+                scope.funnel_ids().where(funnels_table.c.id == values["funnel_id"])
+            ).one_or_none()
+            is None
+        ):
+            raise FunnelDoesNotExistException()
+        self._connection.execute(
+            sa.update(spendings_table)
+            .where(spendings_table.c.id == str(id))
+            .values(**values)
+        )
+        self._changes.record(username, "spending", (str(id), values["funnel_id"]))
+        if values["funnel_id"] != old.funnel_id:
+            self._changes.record(username, "funnel", (old.funnel_id, old.funnel_id))
+        self._spendings_changed(
+            username,
+            (old.funnel_id, old.timestamp, -old.amount),
+            (values["funnel_id"], values["timestamp"], values["amount"]),
+        )
+
+    def delete(self, id: UUID, username: str) -> None:
+        old = self._connection.execute(
+            sa.delete(spendings_table)
+            .where(spendings_table.c.id == str(id))
+            .where(UserScope(username).owns_spending())
+            .returning(
+                spendings_table.c.funnel_id,
+                spendings_table.c.timestamp,
+                spendings_table.c.amount,
+            )
+        ).one_or_none()
+        if old is None:
             raise SpendingDoesNotExistException()
+        self._changes.record(
+            username, "spending", (str(id), old.funnel_id), deleted=True
+        )
+        self._spendings_changed(username, (old.funnel_id, old.timestamp, -old.amount))
+
+    def upsert(self, id: UUID, spending: SpendingCreate, username: str) -> None:
+        """Updates the spending, or creates it under `id` when the user has none, so that a write may be retried"""
+        try:
+            self.update(id, spending, username)
+        except SpendingDoesNotExistException:
+            self.create(spending, username, id)
+
+    def rebuild_period_totals(self, username: str | None = None) -> int:
+        """Recomputes the funnel period totals of one or all users from their spendings, each in the user's calendar.
+        Returns the amount of totals written. Period snapshots are dropped as well, they are taken again on the next read"""
+        if username is None:
+            usernames = self._connection.execute(
+                sa.select(users_table.c.username)
+            ).scalars().all()
+        else:
+            usernames = [username]
+
+        written = 0
+        for username in usernames:
+            scope = UserScope(username)
+            self._snapshots.invalidate_all(username)
+            self._connection.execute(
+                sa.delete(funnel_period_totals_table).where(
+                    funnel_period_totals_table.c.funnel_id.in_(scope.funnel_ids())
+                )
+            )
+            settings, _ = self._load_user_state(username)
+            written += len(
+                self._add_to_period_totals(
+                    get_calendar(*settings),
+                    *self._connection.execute(
+                        scope.spendings(
+                            spendings_table.c.funnel_id,
+                            spendings_table.c.timestamp,
+                            spendings_table.c.amount,
+                        )
+                    ),
+                )
+            )
+        return written
@@ -0,0 +1,94 @@
+from uuid import UUID
+
+import sqlalchemy as sa
+
+from .base import BaseDAO
+from .changes import ChangeLogDAO
+from .funnels import FunnelDAO
+from .scope import UserScope
+from .spendings import SpendingDAO
+from .tables import changes_table, spendings_table
+from ..dto.spendings import *
+from ..dto.sync import *
+from ..exceptions import SpendingDoesNotExistException, FunnelDoesNotExistException
+
+
+class SyncDAO(BaseDAO):
+    """Serves the changes of a user's data since a version of the change log, and applies writes queued offline"""
+
+    def __init__(
+        self,
+        connection: sa.Connection,
+        funnelDao: FunnelDAO,
+        spendingDao: SpendingDAO,
+    ):
+        super().__init__(connection)
+        self._funnelDao = funnelDao
+        self._spendingDao = spendingDao
+        self._changes = ChangeLogDAO(connection)
+
+    def get_delta(self, username: str, since: int = 0) -> SyncDelta:
+        """Returns what changed after the version `since`, or the whole state of the user when it's 0"""
+        version = max(since, self._changes.version(username))
+        spendings = UserScope(username).spendings(
+            spendings_table.c.id,
+            spendings_table.c.amount,
+            spendings_table.c.timestamp,
+            spendings_table.c.funnel_id,
+        )
+        if since == 0:
+            funnels = self._funnelDao.get_many(username)
+            deleted = []
+        else:
+            changes = self._changes.since(username, since).subquery()
+            funnels = self._funnelDao.get_many(
+                username,
+                sa.select(changes.c.funnel_id).where(
+                    ~((changes.c.entity == "funnel") & changes.c.deleted)
+                ),
+            )
+            spendings = spendings.where(
+                spendings_table.c.id.in_(
+                    sa.select(changes.c.entity_id).where(
+                        changes.c.entity == "spending", ~changes.c.deleted
+                    )
+                )
+            )
+            deleted = [
+                SyncTombstone(entity=row.entity, id=row.entity_id)
+                for row in self._connection.execute(
+                    self._changes.since(
+                        username,
+                        since,
+                        changes_table.c.entity,
+                        changes_table.c.entity_id,
+                    ).where(changes_table.c.deleted)
+                )
+            ]
+        return SyncDelta(
+            version=version,
+            funnels=funnels,
+            spendings=[
+                SpendingPublic(**row._asdict())
+                for row in self._connection.execute(spendings)
+            ],
+            deleted=deleted,
+        )
+
+    def apply(self, writes: list[SyncWrite], username: str) -> list[SpendingBatchResult]:
+        """Applies the writes in order. Deleting a spending that is already gone succeeds, so that deletes may be retried"""
+        results = []
+        for write in writes:
+            try:
+                if write.spending is None:
+                    self._spendingDao.delete(write.id, username)
+                else:
+                    self._spendingDao.upsert(write.id, write.spending, username)
+                results.append(SpendingBatchResult(id=write.id))
+            except SpendingDoesNotExistException:
+                results.append(SpendingBatchResult(id=write.id))
+            except FunnelDoesNotExistException:
+                results.append(SpendingBatchResult(error="Funnel does not exist"))
+            except sa.exc.IntegrityError:
+                results.append(SpendingBatchResult(error="Spending id is taken"))
+        return results
@@ -10,6 +10,11 @@ users_table = sa.Table(
     metadata_obj,
     sa.Column("username", sa.String, primary_key=True),
     sa.Column("otp_secret", sa.String, nullable=False),
+    sa.Column("period_breakpoint", sa.Integer, nullable=False, server_default="15"),
+    # an IANA name, None is the server's local time
+    sa.Column("timezone", sa.String, nullable=True),
+    # bumped by every write to the user's funnels, spendings or settings
+    sa.Column("data_version", sa.Integer, nullable=False, server_default="0"),
 )
 
 
@@ -26,6 +31,7 @@ funnels_table = sa.Table(
     sa.Column(
         "user_name", sa.String, sa.ForeignKey(users_table.c.username), nullable=False
     ),
+    sa.Index("ix_funnels_user_name", "user_name"),
 )
 
 
@@ -40,6 +46,24 @@ spendings_table = sa.Table(
     sa.Column(
         "funnel_id", sa.String, sa.ForeignKey(funnels_table.c.id), nullable=False
     ),
+    sa.Index("ix_spendings_funnel_id_timestamp", "funnel_id", "timestamp"),
+)
+
+
+funnel_period_totals_table_name = "funnel_period_totals"
+
+funnel_period_totals_table = sa.Table(
+    funnel_period_totals_table_name,
+    metadata_obj,
+    sa.Column(
+        "funnel_id",
+        sa.String,
+        sa.ForeignKey(funnels_table.c.id),
+        nullable=False,
+        primary_key=True,
+    ),
+    sa.Column("period_start", sa.Integer, nullable=False, primary_key=True),
+    sa.Column("spent", sa.Float, nullable=False, server_default="0"),
 )
 
 
@@ -57,3 +81,56 @@ jwt_blacklist_table = sa.Table(
     ),
     sa.Column("iat_until", sa.Integer),
 )
+
+
+imports_table_name = "imports"
+
+imports_table = sa.Table(
+    imports_table_name,
+    metadata_obj,
+    sa.Column("id", sa.String, primary_key=True),
+    sa.Column(
+        "user_name", sa.String, sa.ForeignKey(users_table.c.username), nullable=False
+    ),
+    sa.Column("rows_done", sa.Integer, nullable=False, server_default="0"),
+    sa.Column("rows_failed", sa.Integer, nullable=False, server_default="0"),
+    sa.Column("finished", sa.Boolean, nullable=False, server_default=sa.false()),
+)
+
+
+period_snapshots_table_name = "period_snapshots"
+
+period_snapshots_table = sa.Table(
+    period_snapshots_table_name,
+    metadata_obj,
+    sa.Column(
+        "user_name",
+        sa.String,
+        sa.ForeignKey(users_table.c.username),
+        nullable=False,
+        primary_key=True,
+    ),
+    sa.Column("period_start", sa.Integer, nullable=False, primary_key=True),
+    sa.Column("totals", sa.Text, nullable=False),
+)
+
+
+changes_table_name = "changes"
+
+changes_table = sa.Table(
+    changes_table_name,
+    metadata_obj,
+    # AUTOINCREMENT, so the sequence of a replaced change is never handed out again
+    sa.Column("seq", sa.Integer, primary_key=True),
+    sa.Column(
+        "user_name", sa.String, sa.ForeignKey(users_table.c.username), nullable=False
+    ),
+    # "funnel" or "spending"
+    sa.Column("entity", sa.String, nullable=False),
+    sa.Column("entity_id", sa.String, nullable=False, unique=True),
+    # the funnel itself, or the funnel of the spending
+    sa.Column("funnel_id", sa.String, nullable=False),
+    sa.Column("deleted", sa.Boolean, nullable=False, server_default=sa.false()),
+    sa.Index("ix_changes_user_name_seq", "user_name", "seq"),
+    sqlite_autoincrement=True,
+)
@@ -6,7 +6,19 @@ from .base import BaseDAO
 from .tables import users_table, jwt_blacklist_table
 from ..dto.users import *
 from ..exceptions import UserNotFoundException, JwtTokenBlacklistedException
+from ..cache import decoded_tokens_cache, token_blacklist_cache, user_settings_cache
 from ..config import JWT_SECRET
+from ..hooks import call_on_commit, call_on_rollback
+from ..lib.cache import MISSING
+
+
+def cache_token_blacklist(username: str, iat_until: int | None):
+    """Caches the user's blacklist entry unless a newer one is cached: a reader that loaded the entry before an
+    invalidation committed may get here after it, and must not put the older entry back"""
+    cached = token_blacklist_cache.get(username)
+    if cached is None or (iat_until is not None and iat_until > cached):
+        token_blacklist_cache.set(username, iat_until)
+
 
 class UsersDAO(BaseDAO):
     def create(self, user: UserCreate):
@@ -20,17 +32,26 @@ class UsersDAO(BaseDAO):
 
     def check_auth(self, username: str, otp: str):
         try:
-            username, secret = self._connection.execute(sa.select(users_table).where(users_table.c.username == username)).one()
+            secret = self._connection.execute(sa.select(users_table.c.otp_secret).where(users_table.c.username == username)).scalar_one()
             return pyotp.TOTP(secret).verify(otp)
         except:
             raise UserNotFoundException()
     
     def _check_token_blacklist(self, username: str, token_iat: int):
-        blacklist_entry = self._connection.execute(sa.select(jwt_blacklist_table).where(jwt_blacklist_table.c.username == username)).one_or_none()
-        return blacklist_entry is None or blacklist_entry[1] <= token_iat 
+        iat_until = token_blacklist_cache.get(username, MISSING)
+        if iat_until is MISSING:
+            blacklist_entry = self._connection.execute(sa.select(jwt_blacklist_table).where(jwt_blacklist_table.c.username == username)).one_or_none()
+            iat_until = None if blacklist_entry is None else blacklist_entry[1]
+            cache_token_blacklist(username, iat_until)
+            # an invalidation may have committed and cached its entry since, which is fresher than the row read above
+            iat_until = token_blacklist_cache.get(username, iat_until)
+        return iat_until is None or iat_until <= token_iat
 
     def decode_token(self, token: str):
-        decoded = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        decoded = decoded_tokens_cache.get(token)
+        if decoded is None:
+            decoded = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+            decoded_tokens_cache.set(token, decoded, expires_at=decoded['exp'])
         if not self._check_token_blacklist(decoded['username'], decoded['iat']):
             raise JwtTokenBlacklistedException()
         return decoded
@@ -38,4 +59,28 @@ class UsersDAO(BaseDAO):
     def invalidate_tokens(self, username: str, iat_until: int):
         """Invalidates all tokens forged before `iat_until` for user `username`"""
         self._connection.execute(sa.delete(jwt_blacklist_table).where(jwt_blacklist_table.c.username == username))
-        self._connection.execute(sa.insert(jwt_blacklist_table).values({'username': username, 'iat_until': iat_until}))
\ No newline at end of file
+        self._connection.execute(sa.insert(jwt_blacklist_table).values({'username': username, 'iat_until': iat_until}))
+        # not before the commit, a concurrent decode_token could refill the cache with the old entry in between
+        call_on_commit(self._connection, lambda: token_blacklist_cache.set(username, iat_until))
+
+    def get_settings(self, username: str) -> UserSettings:
+        result = self._connection.execute(
+            sa.select(users_table.c.period_breakpoint, users_table.c.timezone).where(
+                users_table.c.username == username
+            )
+        ).one()
+        return UserSettings(**result._asdict())
+
+    def update_settings(self, username: str, settings: UserSettings):
+        """Stores the settings, the period totals of the user must be rebuilt afterwards"""
+        self._connection.execute(
+            sa.update(users_table)
+            .where(users_table.c.username == username)
+            .values(**settings.dict())
+        )
+        # the rebuild in this transaction caches the uncommitted settings, which must not outlive a rollback
+        user_settings_cache.delete(username)
+        cached = (settings.period_breakpoint, settings.timezone)
+        call_on_commit(self._connection, lambda: user_settings_cache.set(username, cached))
+        call_on_rollback(self._connection, lambda: user_settings_cache.delete(username))
+        self._data_changed(username)
@@ -1,8 +1,31 @@
 import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import create_async_engine
 
-from .config import DB_URL
+from .config import DB_URL, DB_BACKEND, ASYNC_DB_URL, SQLITE_PRAGMAS
+from .slow_queries import log_slow_queries
+from .timing import record_query_timings
 
-print(f"Connecting to database at: {DB_URL}")
 
-engine = sa.create_engine(DB_URL, echo=True)
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Applies the SQLITE_PRAGMAS profile to a new connection"""
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def use_sqlite_pragmas(engine: sa.Engine):
+    if engine.dialect.name == "sqlite":
+        sa.event.listen(engine, "connect", set_sqlite_pragmas)
+
+
+engine = sa.create_engine(DB_URL)
+async_engine = create_async_engine(ASYNC_DB_URL) if DB_BACKEND == "async" else None
+use_sqlite_pragmas(engine)
+record_query_timings(engine)
+log_slow_queries(engine)
+if async_engine is not None:
+    use_sqlite_pragmas(async_engine.sync_engine)
+    record_query_timings(async_engine.sync_engine)
+    log_slow_queries(async_engine.sync_engine)
 metadata_obj = sa.MetaData()
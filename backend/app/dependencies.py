@@ -1,55 +1,106 @@
-from fastapi import HTTPException, Depends
+from fastapi import HTTPException, Depends, Header, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy import Connection
-from typing import Annotated
+from sqlalchemy.ext.asyncio import AsyncConnection
+from starlette.concurrency import run_in_threadpool
+from typing import Annotated, Awaitable
 import jwt
 
-from .database import engine
+from .config import ADMIN_USERNAMES, DB_BACKEND
+from .database import engine, async_engine
 from .exceptions import JwtTokenBlacklistedException
-
-from .dao.funnels import FunnelDAO
-from .dao.spendings import SpendingDAO
+from .hooks import commit
+
+from .dao.aio import (
+    AsyncFunnelDAO,
+    AsyncImportDAO,
+    AsyncSpendingDAO,
+    AsyncSyncDAO,
+    AsyncUsersDAO,
+)
 from .dao.users import UsersDAO
 from .dto.users import UserJwtPayload
+from .lib.etag import etag_matches, make_etag
+from .timing import timed_auth
 
 
 def _get_db_conn():
-    with engine.begin() as conn:
+    """A connection whose transaction commits after the route, rolled back if the route fails"""
+    with engine.connect() as conn:
+        yield conn
+        commit(conn)
+
+
+async def _get_async_db_conn():
+    async with async_engine.connect() as conn:
+        yield conn
+        await conn.run_sync(commit)
+
+
+_DepDbConn = Annotated[
+    Connection | AsyncConnection,
+    Depends(_get_async_db_conn if DB_BACKEND == "async" else _get_db_conn),
+]
+
+
+def _get_db_conn_no_tx():
+    """A connection for DAOs that commit on their own, whatever they leave uncommitted is rolled back"""
+    with engine.connect() as conn:
         yield conn
 
 
-_DepDbConn = Annotated[Connection, Depends(_get_db_conn)]
+async def _get_async_db_conn_no_tx():
+    async with async_engine.connect() as conn:
+        yield conn
+
+
+_DepDbConnNoTx = Annotated[
+    Connection | AsyncConnection,
+    Depends(_get_async_db_conn_no_tx if DB_BACKEND == "async" else _get_db_conn_no_tx),
+]
 
 
 def get_funnel_dao(conn: _DepDbConn):
-    return FunnelDAO(conn, SpendingDAO(conn))
+    return AsyncFunnelDAO(conn)
 
 
-DepFunnelDAO = Annotated[FunnelDAO, Depends(get_funnel_dao)]
+DepFunnelDAO = Annotated[AsyncFunnelDAO, Depends(get_funnel_dao)]
 
 
 def get_spending_dao(conn: _DepDbConn):
-    return SpendingDAO(conn)
+    return AsyncSpendingDAO(conn)
+
+
+DepSpendingDAO = Annotated[AsyncSpendingDAO, Depends(get_spending_dao)]
+
+
+def get_import_dao(conn: _DepDbConnNoTx):
+    return AsyncImportDAO(conn)
+
 
+DepImportDAO = Annotated[AsyncImportDAO, Depends(get_import_dao)]
 
-DepSpendingDAO = Annotated[SpendingDAO, Depends(get_spending_dao)]
+
+def get_sync_dao(conn: _DepDbConn):
+    return AsyncSyncDAO(conn)
+
+
+DepSyncDAO = Annotated[AsyncSyncDAO, Depends(get_sync_dao)]
 
 
 def get_user_dao(conn: _DepDbConn):
-    return UsersDAO(conn)
+    return AsyncUsersDAO(conn)
 
 
-DepUserDAO = Annotated[UsersDAO, Depends(get_user_dao)]
+DepUserDAO = Annotated[AsyncUsersDAO, Depends(get_user_dao)]
 
 auth_scheme = HTTPBearer()
 
 
-def get_user_auth(
-    authorization: Annotated[HTTPAuthorizationCredentials, Depends(auth_scheme)],
-    user_dao: DepUserDAO,
-):
+async def _authenticate(decoded_token: Awaitable[dict]) -> UserJwtPayload:
     try:
-        decoded = user_dao.decode_token(authorization.credentials)
+        with timed_auth():
+            decoded = await decoded_token
         if decoded["type"] == "refresh":
             raise HTTPException(
                 status_code=403, detail="Only access tokens are accepted"
@@ -63,5 +114,70 @@ def get_user_auth(
         raise HTTPException(status_code=400, detail="Invalid token")
 
 
+async def get_user_auth(
+    authorization: Annotated[HTTPAuthorizationCredentials, Depends(auth_scheme)],
+    user_dao: DepUserDAO,
+):
+    return await _authenticate(user_dao.decode_token(authorization.credentials))
+
+
 VoidDepUserAuth = Depends(get_user_auth)
 DepUserAuth = Annotated[UserJwtPayload, Depends(get_user_auth)]
+
+
+def get_admin_auth(user: DepUserAuth):
+    if user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Only admins are allowed")
+    return user
+
+
+DepAdminAuth = Annotated[UserJwtPayload, Depends(get_admin_auth)]
+
+
+def _decode_token_on_own_connection(token: str) -> dict:
+    with engine.begin() as conn:
+        return UsersDAO(conn).decode_token(token)
+
+
+async def get_stream_user_auth(
+    authorization: Annotated[HTTPAuthorizationCredentials, Depends(auth_scheme)],
+):
+    """Same as `get_user_auth`, on a connection that goes back to the pool before the response starts,
+    since a stream may stay open for hours"""
+    if DB_BACKEND == "async":
+        async with async_engine.begin() as conn:
+            return await _authenticate(
+                AsyncUsersDAO(conn).decode_token(authorization.credentials)
+            )
+    # one threadpool call from checkout to release, so that clients reconnecting all at once can't leave
+    # the threads waiting for the pool while the connections wait for a thread
+    return await _authenticate(
+        run_in_threadpool(_decode_token_on_own_connection, authorization.credentials)
+    )
+
+
+DepStreamUserAuth = Annotated[UserJwtPayload, Depends(get_stream_user_auth)]
+
+
+async def get_data_etag(
+    request: Request,
+    user: DepUserAuth,
+    user_dao: DepUserDAO,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> str:
+    """The ETag of the user's data as the route shows it on the user's current day, since the current period and the
+    daily allowances depend on it. Answers 304 Not Modified right away when the client has it, without any SQL
+    once the data version and the settings of the user are cached"""
+    etag = make_etag(
+        await user_dao.data_version(user.username),
+        (await user_dao.calendar(user.username)).today(),
+        request.url.path,
+        request.url.query,
+        request.headers.get("accept"),
+    )
+    if etag_matches(if_none_match, etag):
+        raise HTTPException(status_code=304, headers={"ETag": etag})
+    return etag
+
+
+DepDataETag = Annotated[str, Depends(get_data_etag)]
@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+
+
+class SlowQuery(BaseModel):
+    """A statement that took at least SLOW_QUERY_MS. `route` is the method and route of the request that ran it, if any"""
+    fingerprint: str
+    sql: str
+    parameters: str
+    route: str | None
+    duration_ms: float
+    plan: list[str]
+    timestamp: int
+
+
+class SlowQueryFingerprint(BaseModel):
+    """The slow runs of one normalized statement among the recent ones. `parameters` and `plan` are of the slowest run"""
+    fingerprint: str
+    sql: str
+    count: int
+    max_ms: float
+    total_ms: float
+    routes: list[str]
+    parameters: str
+    plan: list[str]
+    last_seen: int
@@ -0,0 +1,13 @@
+from typing import Literal
+
+from pydantic import BaseModel, UUID4
+
+Bucket = Literal["day", "week", "period"]
+
+
+class AnalyticsBucket(BaseModel):
+    funnel_id: UUID4
+    start: int
+    """ms timestamp of the local midnight the bucket starts at"""
+    spent: float
+    count: int
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, UUID4
+from pydantic import BaseModel, TypeAdapter, UUID4
 from pydantic.color import Color
 
 
@@ -15,6 +15,10 @@ class FunnelPublic(BaseModel):
         return {**super().dict(*args, **kwargs), 'color': self.color.as_hex(), 'id': str(self.id)}
 
 
+# the overview cache holds funnels in their JSON form
+funnel_list_adapter = TypeAdapter(list[FunnelPublic])
+
+
 class FunnelCreateBody(BaseModel):
     name: str
     limit: float
@@ -25,4 +29,13 @@ class FunnelCreateBody(BaseModel):
         return {**super().dict(*args, **kwargs), 'color': self.color.as_hex()}
 
 class FunnelCreate(FunnelCreateBody):
-    user_name: str
\ No newline at end of file
+    user_name: str
+
+class FunnelForecast(BaseModel):
+    """Daily amounts are averages over the trailing 28 days, or 7 days for `recent_burn_rate`"""
+    id: UUID4
+    burn_rate: float
+    recent_burn_rate: float
+    projected_spent: float
+    projected_remaining: float
+    daily_allowance: float
@@ -0,0 +1,8 @@
+from pydantic import BaseModel, UUID4
+
+
+class ImportPublic(BaseModel):
+    id: UUID4
+    rows_done: int
+    rows_failed: int
+    finished: bool
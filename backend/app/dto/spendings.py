@@ -1,5 +1,6 @@
-from pydantic import BaseModel, UUID4
+from pydantic import BaseModel, TypeAdapter, UUID4
 from pydantic.color import Color
+from typing_extensions import TypedDict
 
 
 class SpendingPublic(BaseModel):
@@ -12,6 +13,21 @@ class SpendingPublic(BaseModel):
         return {**super().dict(*args, **kwargs), 'funnel_id': str(self.funnel_id), 'id': str(self.id)}
 
 
+class SpendingRow(TypedDict):
+    """A spending as the DB returns it, which serializes exactly like SpendingPublic.
+
+    Except for amounts below 1e-4 or from 1e16, whose exponent is spelled `1e-7` and `1e16` rather than `1e-07` and
+    `1e+16`, as the GET /spending/ description documents"""
+    id: str
+    amount: float
+    timestamp: int
+    funnel_id: str
+
+
+spending_rows_adapter = TypeAdapter(list[SpendingRow])
+"""Dumps the rows straight to JSON, without validating them into models first"""
+
+
 class SpendingCreate(BaseModel):
     amount: float
     timestamp: int
@@ -19,3 +35,9 @@ class SpendingCreate(BaseModel):
 
     def dict(self, *args, **kwargs):
         return {**super().dict(*args, **kwargs), 'funnel_id': str(self.funnel_id)}
+
+
+class SpendingBatchResult(BaseModel):
+    """Outcome of a single row of a batch: either the id of the created spending or the reason it was rejected"""
+    id: UUID4 | None = None
+    error: str | None = None
@@ -0,0 +1,27 @@
+from typing import Literal
+
+from pydantic import BaseModel, UUID4
+
+from .funnels import FunnelPublic
+from .spendings import SpendingCreate, SpendingPublic
+
+
+class SyncTombstone(BaseModel):
+    entity: Literal["funnel", "spending"]
+    id: UUID4
+
+
+class SyncDelta(BaseModel):
+    """The data that changed since the requested version. `funnels` also holds the funnels whose remaining amount
+    changed with their spendings. Pass `version` as `since` to the next sync"""
+    version: int
+    funnels: list[FunnelPublic]
+    spendings: list[SpendingPublic]
+    deleted: list[SyncTombstone]
+
+
+class SyncWrite(BaseModel):
+    """A spending write queued offline: creates or replaces the spending `id`, or deletes it when `spending` is null.
+    Ids are chosen by the client, so that a write may be retried safely"""
+    id: UUID4
+    spending: SpendingCreate | None = None
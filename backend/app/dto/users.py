@@ -1,5 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from typing import Literal
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from ..lib.monthly_period import PERIOD_BREAKPOINT
 
 class UserPublic(BaseModel):
     username: str
@@ -33,4 +36,18 @@ class JwtRefreshBody(BaseModel):
     refresh: str
 
 class GenerateSecretBody(BaseModel):
-    username: str
\ No newline at end of file
+    username: str
+
+class UserSettings(BaseModel):
+    period_breakpoint: int = Field(PERIOD_BREAKPOINT, ge=1, le=28)
+    timezone: str | None = None
+
+    @field_validator('timezone')
+    @classmethod
+    def check_timezone(cls, timezone: str | None):
+        if timezone is not None:
+            try:
+                ZoneInfo(timezone)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError(f'Unknown timezone {timezone}')
+        return timezone
@@ -0,0 +1,14 @@
+import sqlalchemy as sa
+
+from .config import EVENTS_QUEUE_SIZE
+from .hooks import call_on_commit
+from .lib.pubsub import PubSub
+
+# username -> the messages of GET /events
+user_events = PubSub(EVENTS_QUEUE_SIZE)
+
+
+def publish_on_commit(connection: sa.Connection, username: str, message: dict):
+    """Publishes the message to the user's subscribers once the transaction has committed, so that they read what it
+    wrote, or never if it rolls back or the COMMIT fails"""
+    call_on_commit(connection, lambda: user_events.publish(username, message))
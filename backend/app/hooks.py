@@ -0,0 +1,93 @@
+from typing import Callable
+
+import sqlalchemy as sa
+
+UserDataChangedHook = Callable[[str], None]
+Callback = Callable[[], None]
+
+_user_data_changed_hooks: list[UserDataChangedHook] = []
+
+
+def on_user_data_changed(hook: UserDataChangedHook) -> UserDataChangedHook:
+    """Registers `hook(username)` to be called whenever a user's funnels or spendings are written"""
+    _user_data_changed_hooks.append(hook)
+    return hook
+
+
+def _fire(username: str):
+    for hook in _user_data_changed_hooks:
+        hook(username)
+
+
+def _take_pending(connection: sa.Connection) -> tuple[set[str], list[Callback], list[Callback]]:
+    # `info` outlives the transaction, it belongs to the pooled DBAPI connection
+    return (
+        connection.info.pop("changed_users", set()),
+        connection.info.pop("on_commit", []),
+        connection.info.pop("on_rollback", []),
+    )
+
+
+def _on_commit_event(connection: sa.Connection):
+    # fires before the COMMIT, so what waits for it is only set aside for `commit` to run once the COMMIT went through
+    connection.info["committing"] = _take_pending(connection)
+
+
+def _on_rollback_event(connection: sa.Connection):
+    connection.info.pop("committing", None)
+    _, _, on_rollback = _take_pending(connection)
+    for callback in on_rollback:
+        callback()
+
+
+def _listen(connection: sa.Connection):
+    # listeners registered with once=True stay registered after firing, and registering them again is ignored
+    if not sa.event.contains(connection, "commit", _on_commit_event):
+        sa.event.listen(connection, "commit", _on_commit_event)
+        sa.event.listen(connection, "rollback", _on_rollback_event)
+
+
+def commit(connection: sa.Connection):
+    """Commits the transaction, then fires the user_data_changed hooks of its writes once more and runs its on-commit
+    callbacks. SQLAlchemy's "commit" event fires before the COMMIT, while other connections can't see the writes yet,
+    so whatever commits a transaction that writes user data calls this rather than `connection.commit()`"""
+    # set aside by a transaction that was committed some other way
+    connection.info.pop("committing", None)
+    try:
+        connection.commit()
+    except BaseException:
+        _, _, on_rollback = connection.info.pop("committing", (set(), [], []))
+        for callback in on_rollback:
+            callback()
+        _on_rollback_event(connection)
+        raise
+    changed_users, on_commit, _ = connection.info.pop("committing", (set(), [], []))
+    for username in changed_users:
+        _fire(username)
+    for callback in on_commit:
+        callback()
+
+
+def call_on_commit(connection: sa.Connection, callback: Callback):
+    """Calls `callback()` once `commit` committed the transaction, or never if it rolls back"""
+    _listen(connection)
+    connection.info.setdefault("on_commit", []).append(callback)
+
+
+def call_on_rollback(connection: sa.Connection, callback: Callback):
+    """Calls `callback()` if the transaction rolls back, e.g. to drop what it cached of its uncommitted writes"""
+    _listen(connection)
+    connection.info.setdefault("on_rollback", []).append(callback)
+
+
+def has_pending_changes(connection: sa.Connection, username: str) -> bool:
+    """Whether the user's data was written in the connection's transaction, which hasn't committed yet"""
+    return username in connection.info.get("changed_users", ())
+
+
+def user_data_changed(connection: sa.Connection, username: str):
+    """Called by the DAOs after a write. The hooks fire right away, so the rest of the transaction sees fresh data,
+    and once more after `commit`, in case another request refilled a cache from the pre-commit state in the meantime."""
+    _fire(username)
+    _listen(connection)
+    connection.info.setdefault("changed_users", set()).add(username)
@@ -0,0 +1,260 @@
+import json
+import logging
+import socket
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable
+from urllib.parse import urlparse
+
+MISSING = object()
+
+logger = logging.getLogger(__name__)
+
+
+class Cache(ABC):
+    """Interface of the cache backends. Values expire at their own `expires_at` epoch timestamp, or after the cache's `ttl`.
+
+    Values must be JSON serializable: the shared backends store them as JSON, so that a value planted in the shared store
+    can't run code in the app the way a pickle could. Tuples come back from them as lists."""
+
+    def __init__(self, ttl: float | None = None):
+        self._ttl = ttl
+
+    def _expires_at(self, expires_at: float | None) -> float:
+        if expires_at is not None:
+            return expires_at
+        return float("inf") if self._ttl is None else time.time() + self._ttl
+
+    @abstractmethod
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        ...
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any, expires_at: float | None = None):
+        ...
+
+    @abstractmethod
+    def delete(self, key: Hashable):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+
+def _loads(data: str | bytes, default: Any) -> Any:
+    """Decodes a value of a shared store, one it can't decode, e.g. a pickle of an older version, is a miss"""
+    try:
+        return json.loads(data)
+    except ValueError:
+        return default
+
+
+class TTLCache(Cache):
+    """A thread-safe in-memory LRU cache, at most `maxsize` entries are kept, the least recently used one is evicted first"""
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        super().__init__(ttl)
+        self._maxsize = maxsize
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float | None = None):
+        expires_at = self._expires_at(expires_at)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCache(Cache):
+    """A cache in an SQLite file, shared by all processes that open the same `path`.
+
+    Entries are namespaced, so several caches can share one file. Every `PRUNE_EVERY` writes, expired entries are removed,
+    and if the namespace still holds more than `maxsize` entries, the ones closest to expiry are evicted."""
+
+    PRUNE_EVERY = 100
+
+    def __init__(
+        self, path: str, namespace: str, maxsize: int, ttl: float | None = None
+    ):
+        super().__init__(ttl)
+        self._namespace = namespace
+        self._maxsize = maxsize
+        self._writes = 0
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, value BLOB, "
+            "expires_at REAL, PRIMARY KEY (namespace, key))"
+        )
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM cache "
+                "WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self._namespace, str(key), time.time()),
+            ).fetchone()
+        return default if row is None else _loads(row[0], default)
+
+    def set(self, key: Hashable, value: Any, expires_at: float | None = None):
+        entry = (self._namespace, str(key), json.dumps(value))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (*entry, self._expires_at(expires_at)),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune()
+
+    def _prune(self):
+        self._db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires_at <= ?",
+            (self._namespace, time.time()),
+        )
+        self._db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN (SELECT key FROM cache "
+            "WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self._namespace, self._namespace, self._maxsize),
+        )
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key = ?",
+                (self._namespace, str(key)),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM cache WHERE namespace = ?", (self._namespace,)
+            )
+
+
+class RedisError(Exception):
+    ...
+
+
+class RedisCache(Cache):
+    """A cache on any server speaking the Redis protocol, e.g. `redis://localhost:6379/0`.
+
+    Keys are prefixed with the namespace. The server evicts entries on its own, so there is no `maxsize`.
+    Connection errors are logged and treated as cache misses, so the app keeps working without the server."""
+
+    def __init__(self, url: str, namespace: str, ttl: float | None = None):
+        super().__init__(ttl)
+        parsed = urlparse(url)
+        self._address = (parsed.hostname or "localhost", parsed.port or 6379)
+        self._db = int(parsed.path.lstrip("/") or 0)
+        self._prefix = f"{namespace}:"
+        self._lock = Lock()
+        self._socket: socket.socket | None = None
+        self._reader = None
+
+    def _connect(self):
+        self._socket = socket.create_connection(self._address, timeout=1)
+        self._reader = self._socket.makefile("rb")
+        if self._db:
+            self._send("SELECT", self._db)
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            return self._reader.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unknown reply type {kind!r}")
+
+    def _send(self, *args) -> Any:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._socket.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _command(self, *args) -> Any:
+        with self._lock:
+            try:
+                if self._socket is None:
+                    self._connect()
+                return self._send(*args)
+            except (OSError, RedisError) as e:
+                logger.warning("Redis cache command %s failed: %s", args[0], e)
+                if self._socket is not None:
+                    self._socket.close()
+                self._socket = None
+                return None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._command("GET", self._prefix + str(key))
+        return default if value is None else _loads(value, default)
+
+    def set(self, key: Hashable, value: Any, expires_at: float | None = None):
+        expires_at = self._expires_at(expires_at)
+        args = ["SET", self._prefix + str(key), json.dumps(value)]
+        if expires_at != float("inf"):
+            ttl_ms = int((expires_at - time.time()) * 1000)
+            if ttl_ms <= 0:
+                return
+            args += ["PX", ttl_ms]
+        self._command(*args)
+
+    def delete(self, key: Hashable):
+        self._command("DEL", self._prefix + str(key))
+
+    def clear(self):
+        cursor = b"0"
+        while True:
+            reply = self._command("SCAN", cursor, "MATCH", self._prefix + "*")
+            if reply is None:
+                return
+            cursor, keys = reply
+            if keys:
+                self._command("DEL", *keys)
+            if cursor == b"0":
+                return
@@ -0,0 +1,13 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Tuple
+
+
+def encode_cursor(timestamp: int, id: str) -> str:
+    """Encodes the keyset position of a row into an opaque pagination cursor"""
+    return urlsafe_b64encode(f"{timestamp}:{id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    """Reverse of `encode_cursor`, raises ValueError for malformed cursors"""
+    timestamp, id = urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+    return int(timestamp), id
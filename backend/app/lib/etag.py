@@ -0,0 +1,19 @@
+from hashlib import blake2b
+
+
+def make_etag(version: int, *parts) -> str:
+    """A weak entity tag of the data `version` and the `parts` that pick its representation"""
+    digest = blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header matches `etag`, which is the weak comparison"""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(",")
+    )
@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Callable
+
+EXPORT_FIELDS = (
+    "record",
+    "id",
+    "name",
+    "limit",
+    "color",
+    "emoji",
+    "funnel",
+    "timestamp",
+    "amount",
+)
+"""The CSV columns. Funnel records fill `name` to `emoji`, spending records fill `funnel` (the funnel's name) to `amount`"""
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def _chunked(
+    records: AsyncIterator[dict],
+    buffer: io.StringIO,
+    write: Callable[[dict], object],
+) -> AsyncIterator[str]:
+    """Writes the records into the buffer, which is yielded and reset every `CHUNK_SIZE` characters"""
+    async for record in records:
+        write(record)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def to_csv(records: AsyncIterator[dict]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_FIELDS, restval="")
+    writer.writeheader()
+    return _chunked(records, buffer, writer.writerow)
+
+
+def to_ndjson(records: AsyncIterator[dict]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+
+    def write(record: dict):
+        buffer.write(json.dumps(record, ensure_ascii=False))
+        buffer.write("\n")
+
+    return _chunked(records, buffer, write)
+
+
+async def gzip_chunks(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        if data := compressor.compress(chunk.encode()):
+            yield data
+    yield compressor.flush()
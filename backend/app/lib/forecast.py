@@ -0,0 +1,49 @@
+import numpy as np
+
+from .monthly_period import DAY_MS
+
+BURN_RATE_WINDOW = 28
+RECENT_BURN_RATE_WINDOW = 7
+
+
+def daily_spend(
+    funnel_index: np.ndarray,
+    timestamps: np.ndarray,
+    amounts: np.ndarray,
+    funnels: int,
+    start: int,
+    days: int,
+) -> np.ndarray:
+    """Sums the spendings into a (funnels, days) matrix of the amount spent per funnel and day since the ms `start`"""
+    day = (timestamps - start) // DAY_MS
+    inside = (day >= 0) & (day < days)
+    cells = funnel_index[inside] * days + day[inside]
+    return np.bincount(
+        cells, weights=amounts[inside], minlength=funnels * days
+    ).reshape(funnels, days)
+
+
+def trailing_mean(daily: np.ndarray, window: int) -> np.ndarray:
+    """The mean of each row over its last `window` days. Days before the first one count as 0"""
+    return daily[:, -window:].sum(axis=1) / window
+
+
+def forecast(
+    limits: np.ndarray,
+    spent: np.ndarray,
+    daily: np.ndarray,
+    remaining_days: int,
+) -> dict[str, np.ndarray]:
+    """Projects every funnel to the end of the current period at the pace of its recent spendings.
+
+    `spent` is the amount spent in the period so far, `daily` ends today and `remaining_days` don't count today"""
+    burn_rate = trailing_mean(daily, BURN_RATE_WINDOW)
+    recent_burn_rate = trailing_mean(daily, RECENT_BURN_RATE_WINDOW)
+    projected_spent = spent + burn_rate * remaining_days
+    return {
+        "burn_rate": burn_rate,
+        "recent_burn_rate": recent_burn_rate,
+        "projected_spent": projected_spent,
+        "projected_remaining": limits - projected_spent,
+        "daily_allowance": np.maximum(limits - spent, 0) / (remaining_days + 1),
+    }
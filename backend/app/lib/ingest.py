@@ -0,0 +1,115 @@
+import codecs
+import csv
+import json
+import zlib
+from typing import AsyncIterator, Literal
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class UploadDecodeError(ValueError):
+    """The body is corrupt or truncated gzip, or isn't UTF-8, so none of the file past this point can be read"""
+
+
+async def _iter_text(body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decodes the body as UTF-8, gunzipping it first if it starts like a gzip file"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    decompressor = None
+    started = False
+
+    def decode(data: bytes, final: bool = False) -> str:
+        try:
+            return decoder.decode(data, final)
+        except UnicodeDecodeError as e:
+            raise UploadDecodeError("Body is not valid UTF-8") from e
+
+    def decompress(data: bytes) -> bytes:
+        try:
+            return decompressor.decompress(data)
+        except zlib.error as e:
+            raise UploadDecodeError("Body is not a valid gzip file") from e
+
+    async for data in body:
+        if not data:
+            continue
+        if not started:
+            started = True
+            if data.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        if decompressor is not None:
+            data = decompress(data)
+        yield decode(data)
+    if decompressor is not None:
+        yield decode(decompressor.flush())
+        if not decompressor.eof:
+            raise UploadDecodeError("Body is a truncated gzip file")
+    yield decode(b"", final=True)
+
+
+async def _iter_lines(body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    rest = ""
+    async for text in _iter_text(body):
+        lines = (rest + text).split("\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line
+    if rest:
+        yield rest
+
+
+async def _iter_csv_rows(body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Yields the text of each CSV row, joining the lines of quoted fields that span several lines"""
+    pending: list[str] = []
+    async for line in _iter_lines(body):
+        pending.append(line)
+        if sum(part.count('"') for part in pending) % 2 == 0:
+            yield "\n".join(pending)
+            pending.clear()
+    if pending:
+        yield "\n".join(pending)
+
+
+def _parse_ndjson(rows: list[str]) -> list[dict | ValueError]:
+    records = []
+    for row in rows:
+        try:
+            records.append(json.loads(row))
+        except ValueError as e:
+            records.append(e)
+    return records
+
+
+async def iter_record_chunks(
+    body: AsyncIterator[bytes],
+    format: Literal["csv", "ndjson"],
+    chunk_size: int,
+    skip: int = 0,
+) -> AsyncIterator[list[dict | ValueError]]:
+    """Parses an uploaded file as it arrives into lists of at most `chunk_size` records, after skipping `skip` records.
+
+    CSV files must start with a header. A record that can't be parsed is replaced by its ValueError.
+    A body that can't be decoded raises UploadDecodeError once the chunks before the bad bytes are yielded"""
+    rows = _iter_csv_rows(body) if format == "csv" else _iter_lines(body)
+    header: list[str] | None = None
+
+    def parse(chunk: list[str]) -> list[dict | ValueError]:
+        if format == "csv":
+            return list(csv.DictReader(chunk, fieldnames=header))
+        return _parse_ndjson(chunk)
+
+    chunk: list[str] = []
+    async for row in rows:
+        if not row.strip():
+            continue
+        if format == "csv" and header is None:
+            header = next(csv.reader([row]))
+            continue
+        if skip:
+            skip -= 1
+            continue
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield parse(chunk)
+            chunk = []
+    if chunk:
+        yield parse(chunk)
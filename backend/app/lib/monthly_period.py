@@ -1,49 +1,194 @@
-from datetime import datetime
-from calendar import monthrange
+from datetime import date, datetime, timedelta, tzinfo
+from functools import lru_cache
 from typing import Tuple
+from zoneinfo import ZoneInfo
 import math
 
+import numpy as np
+
 PERIOD_BREAKPOINT = 15
 
+DAY_MS = 24 * 60 * 60 * 1000
+
+EPOCH = date(1970, 1, 1)
+
 
 def clamp_month(month: int, year: int) -> Tuple[int, int]:
     """Returns new month and a delta for the year"""
-    if month % 12 == 0:
-        return 12, year
-    return month % 12, year + math.floor(month / 12)
+    return (month - 1) % 12 + 1, year + (month - 1) // 12
 
 
 def ms_timestamp(dt: datetime):
     return math.ceil(dt.timestamp() * 1000)
 
 
-def get_current_period_start(dt: datetime = datetime.now()):
-    new_month, new_year = clamp_month(
-        dt.month - 1 if dt.day < PERIOD_BREAKPOINT else dt.month, dt.year
-    )
-    dt = dt.replace(
-        year=new_year,
-        month=new_month,
-        day=PERIOD_BREAKPOINT,
-    )
-    print(dt)
-    return ms_timestamp(dt)
-
-
-def get_current_period_remaining_days(dt: datetime = datetime.now()):
-    new_month, new_year = clamp_month(
-        dt.month + 1 if dt.day >= PERIOD_BREAKPOINT else dt.month, dt.year
-    )
-    next_period_start = dt.replace(
-        year=new_year,
-        month=new_month,
-        day=PERIOD_BREAKPOINT,
-    )
-    return (next_period_start - dt).days - 1
-
-
-def get_current_period_length(dt: datetime = datetime.now()):
-    new_month, new_year = clamp_month(
-        dt.month if dt.day >= PERIOD_BREAKPOINT else dt.month - 1, dt.year
-    )
-    return monthrange(new_year, new_month)[1]
+class PeriodCalendar:
+    """Billing periods that start at midnight of the `breakpoint` day of every month, in `timezone`,
+    or in the server's local time when it's None.
+
+    Periods are numbered by the month they start in, as `year * 12 + month - 1`. The bounds of the period
+    of each day are computed once, so the per-request helpers are dictionary lookups."""
+
+    def __init__(self, breakpoint: int = PERIOD_BREAKPOINT, timezone: tzinfo | None = None):
+        if not 1 <= breakpoint <= 28:
+            raise ValueError("The breakpoint must be a day that every month has, i.e. 1 to 28")
+        self.breakpoint = breakpoint
+        self.timezone = timezone
+        self._indices: dict[date, int] = {}
+        self._midnights: dict[date, int] = {}
+
+    def _day(self, dt: datetime | None) -> date:
+        if dt is None:
+            return self.today()
+        if dt.tzinfo is not None:
+            return dt.astimezone(self.timezone).date()
+        return dt.date()
+
+    def _day_of(self, timestamp: int) -> date:
+        return datetime.fromtimestamp(timestamp / 1000, self.timezone).date()
+
+    def today(self) -> date:
+        return datetime.now(self.timezone).date()
+
+    def midnight(self, day: date) -> int:
+        """The ms timestamp of the midnight that starts `day`"""
+        midnight = self._midnights.get(day)
+        if midnight is None:
+            midnight = ms_timestamp(
+                datetime(day.year, day.month, day.day, tzinfo=self.timezone)
+            )
+            self._midnights[day] = midnight
+        return midnight
+
+    def index_of_day(self, day: date) -> int:
+        index = self._indices.get(day)
+        if index is None:
+            index = day.year * 12 + day.month - 1
+            if day.day < self.breakpoint:
+                index -= 1
+            self._indices[day] = index
+        return index
+
+    def first_day(self, index: int) -> date:
+        year, month = divmod(index, 12)
+        return date(year, month + 1, self.breakpoint)
+
+    def start(self, index: int) -> int:
+        """The ms timestamp of the midnight that starts the period `index`"""
+        return self.midnight(self.first_day(index))
+
+    def index(self, timestamp: int) -> int:
+        return self.index_of_day(self._day_of(timestamp))
+
+    def current_index(self, dt: datetime | None = None) -> int:
+        return self.index_of_day(self._day(dt))
+
+    def period_start(self, timestamp: int) -> int:
+        return self.start(self.index(timestamp))
+
+    def next_period_start(self, timestamp: int) -> int:
+        return self.start(self.index(timestamp) + 1)
+
+    def current_period_start(self, dt: datetime | None = None) -> int:
+        return self.start(self.current_index(dt))
+
+    def period_length(self, dt: datetime | None = None) -> int:
+        """The amount of days in the current period"""
+        index = self.current_index(dt)
+        return (self.first_day(index + 1) - self.first_day(index)).days
+
+    def remaining_days(self, dt: datetime | None = None) -> int:
+        """The amount of days left in the current period, not counting today"""
+        day = self._day(dt)
+        return (self.first_day(self.index_of_day(day) + 1) - day).days - 1
+
+    def bucket_start(self, bucket: str, day_number: int) -> int:
+        """The ms timestamp of the midnight that starts the "day", "week" (from Monday) or "period"
+        of the local day `day_number`, counted from 1970-01-01"""
+        day = EPOCH + timedelta(days=day_number)
+        if bucket == "week":
+            day -= timedelta(days=day.weekday())
+        elif bucket == "period":
+            day = self.first_day(self.index_of_day(day))
+        return self.midnight(day)
+
+    def _utc_offset(self, timestamp: int) -> int:
+        dt = datetime.fromtimestamp(timestamp / 1000, self.timezone)
+        if self.timezone is None:
+            dt = dt.astimezone()
+        return round(dt.utcoffset().total_seconds() * 1000)
+
+    def utc_offsets(self, timestamp_from: int, timestamp_to: int) -> list[tuple[int, int]]:
+        """The ms UTC offsets in effect over the range, as (since, offset) pairs ordered by `since`.
+
+        The offset is sampled every week, changes in between are bisected to the ms"""
+        offsets = [(timestamp_from, self._utc_offset(timestamp_from))]
+        timestamp = timestamp_from
+        while timestamp < timestamp_to:
+            sample = min(timestamp + 7 * DAY_MS, timestamp_to)
+            offset = self._utc_offset(sample)
+            if offset != offsets[-1][1]:
+                before, after = timestamp, sample
+                while after - before > 1:
+                    middle = (before + after) // 2
+                    if self._utc_offset(middle) == offsets[-1][1]:
+                        before = middle
+                    else:
+                        after = middle
+                offsets.append((after, offset))
+            timestamp = sample
+        return offsets
+
+    def _starts_spanning(self, timestamps: np.ndarray) -> tuple[int, np.ndarray]:
+        """The index of the first period that the ms timestamps span, and the starts of all periods they span"""
+        first = self.index(int(timestamps.min()))
+        last = self.index(int(timestamps.max()))
+        return first, np.array([self.start(i) for i in range(first, last + 1)], np.int64)
+
+    def indices(self, timestamps: np.ndarray) -> np.ndarray:
+        """Vectorized `index`, a binary search among the starts of the periods that the array spans"""
+        if len(timestamps) == 0:
+            return np.empty(0, np.int64)
+        first, starts = self._starts_spanning(timestamps)
+        return first + np.searchsorted(starts, timestamps, side="right") - 1
+
+    def starts(self, timestamps: np.ndarray) -> np.ndarray:
+        """Vectorized `period_start`"""
+        if len(timestamps) == 0:
+            return np.empty(0, np.int64)
+        _, starts = self._starts_spanning(timestamps)
+        return starts[np.searchsorted(starts, timestamps, side="right") - 1]
+
+
+@lru_cache(maxsize=None)
+def get_calendar(
+    breakpoint: int = PERIOD_BREAKPOINT, timezone: str | None = None
+) -> PeriodCalendar:
+    """Returns the calendar of a user's settings. It's shared by all users with the same settings, and so are its memos"""
+    return PeriodCalendar(breakpoint, None if timezone is None else ZoneInfo(timezone))
+
+
+default_calendar = get_calendar()
+"""The calendar of the server's local time with the default breakpoint"""
+
+
+def get_current_period_start(dt: datetime | None = None):
+    return default_calendar.current_period_start(dt)
+
+
+def get_period_start(timestamp: int):
+    """Returns the start of the period that the ms `timestamp` belongs to"""
+    return default_calendar.period_start(timestamp)
+
+
+def get_next_period_start(timestamp: int):
+    """Returns the start of the period after the one that the ms `timestamp` belongs to"""
+    return default_calendar.next_period_start(timestamp)
+
+
+def get_current_period_remaining_days(dt: datetime | None = None):
+    return default_calendar.remaining_days(dt)
+
+
+def get_current_period_length(dt: datetime | None = None):
+    return default_calendar.period_length(dt)
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+from typing import Any, Hashable
+
+
+class Subscription:
+    """A queue of the messages published to a key, read on the event loop that subscribed.
+
+    When the reader falls `maxsize` messages behind, the oldest ones are dropped"""
+
+    def __init__(self, pubsub: "PubSub", key: Hashable, maxsize: int):
+        self._pubsub = pubsub
+        self._key = key
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def _put(self, message: Any):
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(message)
+
+    async def get(self) -> Any:
+        return await self._queue.get()
+
+    def close(self):
+        self._pubsub._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class PubSub:
+    """Delivers messages published from any thread to the asyncio subscribers of a key, within this process"""
+
+    def __init__(self, maxsize: int = 100):
+        self._maxsize = maxsize
+        self._subscriptions: dict[Hashable, set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key: Hashable) -> Subscription:
+        """Must be called on the event loop that reads the subscription"""
+        subscription = Subscription(self, key, self._maxsize)
+        with self._lock:
+            self._subscriptions.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription._key, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription._key, None)
+
+    def has_subscribers(self, key: Hashable) -> bool:
+        return key in self._subscriptions
+
+    def publish(self, key: Hashable, message: Any):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(key, ()))
+        for subscription in subscriptions:
+            subscription._loop.call_soon_threadsafe(subscription._put, message)
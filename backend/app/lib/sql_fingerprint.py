@@ -0,0 +1,39 @@
+import re
+from hashlib import blake2b
+from typing import Any
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b")
+_NAMED_PARAM = re.compile(r"(?<!:):\w+|\$\d+|%\(\w+\)s|%s")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED_LISTS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """The statement with its literals and parameters replaced by `?`, lists of them by `(...)`,
+    and runs of whitespace by a single space. Statements that only differ in their values normalize alike"""
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _NAMED_PARAM.sub("?", statement)
+    statement = _PARAM_LIST.sub("(...)", statement)
+    statement = _REPEATED_LISTS.sub("(...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def fingerprint(normalized: str) -> str:
+    return blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+
+def _types(parameters: Any) -> str:
+    if isinstance(parameters, dict):
+        return ", ".join(f"{name}: {type(value).__name__}" for name, value in parameters.items())
+    return ", ".join(type(value).__name__ for value in parameters)
+
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> str:
+    """The types of the bound parameters without their values, e.g. `(str, int)`, or `3 x (str, int)` for executemany"""
+    if executemany:
+        rows = list(parameters)
+        return f"{len(rows)} x ({_types(rows[0]) if rows else ''})"
+    return f"({_types(parameters or ())})"
@@ -0,0 +1,39 @@
+import json
+import logging
+import sys
+from typing import TextIO
+
+from .config import LOG_LEVEL, LOG_JSON, SQL_ECHO
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as a single line JSON object"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def setup_logging(stream: TextIO = sys.stderr):
+    """Sends the app's and SQLAlchemy's logs to `stream`, gated by LOG_LEVEL and SQL_ECHO"""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(
+        JsonFormatter()
+        if LOG_JSON
+        else logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    )
+    for name, level in (
+        ("app", LOG_LEVEL),
+        ("sqlalchemy.engine", logging.INFO if SQL_ECHO else logging.WARNING),
+    ):
+        logger = logging.getLogger(name)
+        logger.handlers = [handler]
+        logger.setLevel(level)
+        logger.propagate = False
@@ -1,27 +1,64 @@
+import logging
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from .routers import funnels, spendings, users
+from .routers import (
+    admin,
+    analytics,
+    events,
+    export,
+    funnels,
+    imports,
+    spendings,
+    sync,
+    users,
+)
+from .config import COMPRESSION_BROTLI_QUALITY, COMPRESSION_GZIP_LEVEL, COMPRESSION_MIN_SIZE
 from .database import metadata_obj, engine
+from .log import setup_logging
+from .lib import prometheus
+from .middlewares import CompressionMiddleware, TimingMiddleware
+from .timing import metrics
+
+logger = logging.getLogger(__name__)
 
 allowed_origins = [
     "*"
 ]
 
 def make_app() -> FastAPI:
+    setup_logging()
+    logger.info("Using database at %s", engine.url)
+
     app = FastAPI()
 
     app.include_router(funnels.router)
     app.include_router(spendings.router)
     app.include_router(users.router)
+    app.include_router(export.router)
+    app.include_router(analytics.router)
+    app.include_router(imports.router)
+    app.include_router(sync.router)
+    app.include_router(events.router)
+    app.include_router(admin.router)
 
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=COMPRESSION_MIN_SIZE,
+        gzip_level=COMPRESSION_GZIP_LEVEL,
+        brotli_quality=COMPRESSION_BROTLI_QUALITY,
+    )
     app.add_middleware(
         CORSMiddleware, 
         allow_origins=allowed_origins, 
         allow_credentials=True, 
         allow_methods=["*"], 
-        allow_headers=["*"]
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "Server-Timing"],
     )
+    app.add_middleware(TimingMiddleware)
 
     return app
 
@@ -30,3 +67,8 @@ app = make_app()
 @app.get('/ping')
 def ping():
     return 'pong'
+
+@app.get('/metrics', response_class=PlainTextResponse)
+def get_metrics():
+    """Latency histograms and SQL statistics per route, of this worker process, in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type=prometheus.MEDIA_TYPE)
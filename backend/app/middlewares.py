@@ -1 +1,241 @@
+import zlib
+from time import perf_counter
+from typing import Callable
 
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .timing import RequestTimings, record_request, request_timings
+
+try:
+    import brotli
+except ImportError:  # optional, responses are only gzipped without it
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+)
+"""Prefixes of the content types worth compressing, others (e.g. application/gzip) are already compressed"""
+
+STREAM_FLUSH_SIZE = 64 * 1024
+"""Bytes of a streamed body after which the compressor is flushed, so that clients can parse what they got so far"""
+
+THREADPOOL_SIZE = 256 * 1024
+"""Whole bodies from this size on are compressed on the threadpool rather than on the event loop"""
+
+
+def uncompressed(endpoint: Callable) -> Callable:
+    """Opts a route out of CompressionMiddleware, e.g. one whose stream must reach the client message by message"""
+    endpoint.uncompressed = True
+    return endpoint
+
+
+class _Gzip:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, wbits=zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _Brotli:
+    name = "br"
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """The q-values of the encodings of an Accept-Encoding header by lowercased name, `*` included"""
+    encodings = {}
+    for part in accept_encoding.split(","):
+        name, *params = [token.strip() for token in part.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            encodings[name.lower()] = quality
+    return encodings
+
+
+class CompressionMiddleware:
+    """Compresses responses with brotli when the client accepts it and the `brotli` package is installed, else with gzip.
+
+    Responses smaller than `minimum_size` are sent as they are. A streamed body is buffered until it reaches
+    `minimum_size`, then compressed as it goes and flushed every `STREAM_FLUSH_SIZE` bytes.
+    Responses that already have a Content-Encoding, have a type outside of COMPRESSIBLE_TYPES,
+    or come from an `uncompressed` route are left alone."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 1,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _make_compressor(self, scope: Scope) -> _Gzip | _Brotli | None:
+        encodings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+
+        def accepts(name: str) -> bool:
+            return encodings.get(name, encodings.get("*", 0)) > 0
+
+        if brotli is not None and accepts("br"):
+            return _Brotli(self.brotli_quality)
+        if accepts("gzip"):
+            return _Gzip(self.gzip_level)
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        compressor: _Gzip | _Brotli | None = None
+        buffer = bytearray()
+        pending = 0  # bytes given to the compressor since it was last flushed
+        streaming = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, compressor, pending, streaming
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                endpoint = scope.get("endpoint")
+                if (
+                    message["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                    or getattr(endpoint, "uncompressed", False)
+                ):
+                    await send(message)
+                    return
+                MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+                compressor = self._make_compressor(scope)
+                if compressor is None:
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            body: bytes = message.get("body", b"")
+            more_body: bool = message.get("more_body", False)
+
+            if not streaming:
+                buffer.extend(body)
+                if more_body and len(buffer) < self.minimum_size:
+                    return
+                if not more_body and len(buffer) < self.minimum_size:
+                    await send(start)
+                    await send({"type": "http.response.body", "body": bytes(buffer)})
+                    return
+
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = compressor.name
+                body = bytes(buffer)
+                buffer.clear()
+                if not more_body:
+                    compress = lambda: compressor.compress(body) + compressor.finish()
+                    data = (
+                        await run_in_threadpool(compress)
+                        if len(body) >= THREADPOOL_SIZE
+                        else compress()
+                    )
+                    headers["Content-Length"] = str(len(data))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                del headers["Content-Length"]
+                await send(start)
+                streaming = True
+
+            data = compressor.compress(body)
+            pending += len(body)
+            if not more_body:
+                data += compressor.finish()
+            elif pending >= STREAM_FLUSH_SIZE:
+                data += compressor.flush()
+                pending = 0
+            if data or not more_body:
+                await send(
+                    {"type": "http.response.body", "body": data, "more_body": more_body}
+                )
+
+        await self.app(scope, receive, send_compressed)
+
+
+class TimingMiddleware:
+    """Times every request, sends its RequestTimings as a Server-Timing header and records it in the metrics of GET /metrics.
+
+    The header only covers what happened before the response started, the metrics cover the whole response"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings(scope=scope)
+        token = request_timings.set(timings)
+        started = perf_counter()
+        status = 500
+
+        async def send_timed(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timings.handler = perf_counter() - started
+                MutableHeaders(raw=message["headers"]).append(
+                    "Server-Timing", timings.server_timing()
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            request_timings.reset(token)
+            record_request(
+                scope["method"],
+                timings.route,
+                status,
+                perf_counter() - started,
+                timings,
+            )
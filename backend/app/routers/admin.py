@@ -0,0 +1,26 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Query, status
+
+from ..dependencies import DepAdminAuth
+from ..dto.admin import *
+from ..slow_queries import slow_query_log
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get(
+    "/slow-queries",
+    summary="List the slowest recent SQL statements by fingerprint",
+    description=(
+        "Covers the statements of this worker process that took at least `SLOW_QUERY_MS`, among the last "
+        "`SLOW_QUERY_LOG_SIZE` of them. Statements that only differ in their values share a fingerprint. "
+        "Only the users in `ADMIN_USERNAMES` may call it."
+    ),
+    status_code=status.HTTP_200_OK,
+    response_model=list[SlowQueryFingerprint],
+)
+async def get_slow_queries(
+    admin: DepAdminAuth, limit: Annotated[int, Query(ge=1, le=100)] = 20
+):
+    return slow_query_log.top(limit)
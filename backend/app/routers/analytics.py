@@ -0,0 +1,43 @@
+from fastapi import APIRouter, status, Response
+
+from ..dependencies import DepSpendingDAO, DepUserAuth
+from ..dto.analytics import *
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+CLOSED_RANGE_MAX_AGE = 24 * 60 * 60
+"""Seconds a client may reuse totals of a range that ended before the current period"""
+
+
+@router.get(
+    "/",
+    summary="Get the totals of spendings per funnel and day, week or period",
+    description=(
+        "Buckets start at midnight in the user's timezone, weeks start on Monday, periods on the user's breakpoint. "
+        "The range defaults to the current period. "
+        "Ranges that end before the current period don't change anymore, so their responses may be cached."
+    ),
+    status_code=status.HTTP_200_OK,
+    response_model=list[AnalyticsBucket],
+)
+async def get_analytics(
+    response: Response,
+    spending_dao: DepSpendingDAO,
+    user: DepUserAuth,
+    bucket: Bucket = "day",
+    timestamp_from: int | None = None,
+    timestamp_to: int | None = None,
+):
+    calendar = await spending_dao.calendar(user.username)
+    closed = (
+        timestamp_to is not None and timestamp_to <= calendar.current_period_start()
+    )
+    response.headers["Cache-Control"] = (
+        f"private, max-age={CLOSED_RANGE_MAX_AGE}" if closed else "no-cache"
+    )
+    return await spending_dao.get_totals(
+        user.username,
+        bucket,
+        timestamp_from=timestamp_from,
+        timestamp_to=timestamp_to,
+    )
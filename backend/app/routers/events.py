@@ -0,0 +1,62 @@
+import asyncio
+import json
+from typing import AsyncIterator
+
+from fastapi import APIRouter, status
+from fastapi.responses import StreamingResponse
+
+from ..config import EVENTS_KEEPALIVE
+from ..dependencies import DepStreamUserAuth
+from ..events import user_events
+from ..middlewares import uncompressed
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+
+
+def format_event(message: dict) -> str:
+    return f"event: {message['type']}\nid: {message['version']}\ndata: {json.dumps(message)}\n\n"
+
+
+async def iter_events(
+    username: str, keepalive: float = EVENTS_KEEPALIVE
+) -> AsyncIterator[str]:
+    """Yields the user's messages as server-sent events, and a comment after every `keepalive` seconds of silence.
+
+    The subscription starts with the stream, so it never outlives a client that left before the first byte"""
+    with user_events.subscribe(username) as subscription:
+        yield f"retry: {round(keepalive * 1000)}\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(message)
+
+
+@router.get(
+    "/",
+    summary="Stream updates of the user's data as server-sent events",
+    description=(
+        "Every write to the user's data sends an event whose `id` is the new data version. "
+        "`spendings` events carry the amounts to add to the `remaining` and `daily` of each funnel, "
+        "`funnels` events the written funnels as `GET /funnel/` shows them, `funnel_deleted` the id of a deleted funnel, "
+        "and `changed` events call for a reload. So do gaps between the ids of consecutive events, "
+        "since a client that falls behind loses the oldest events. "
+        "Only writes handled by the same server process are streamed."
+    ),
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={200: {"content": {EVENT_STREAM_MEDIA_TYPE: {}}}},
+)
+# a compressor would hold the events back until it has enough of them
+@uncompressed
+async def get_events(user: DepStreamUserAuth):
+    return StreamingResponse(
+        iter_events(user.username),
+        media_type=EVENT_STREAM_MEDIA_TYPE,
+        # X-Accel-Buffering stops nginx from holding the events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
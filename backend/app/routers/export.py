@@ -0,0 +1,47 @@
+from typing import Literal
+
+from fastapi import APIRouter, status
+from fastapi.responses import StreamingResponse
+
+from ..dependencies import DepSpendingDAO, DepUserAuth
+from ..lib.export import EXPORT_FIELDS, gzip_chunks, to_csv, to_ndjson
+from .spendings import NDJSON_MEDIA_TYPE
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+@router.get(
+    "/",
+    summary="Download all of the user's funnels and spendings",
+    description=(
+        "Funnels come first, then every spending regardless of period. "
+        f"CSV columns are `{','.join(EXPORT_FIELDS)}`, where spendings refer to their funnel by name. "
+        "With `gzip=true` the file itself is gzipped."
+    ),
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/csv": {}, NDJSON_MEDIA_TYPE: {}, "application/gzip": {}}}
+    },
+)
+async def get_export(
+    spending_dao: DepSpendingDAO,
+    user: DepUserAuth,
+    format: Literal["csv", "ndjson"] = "csv",
+    gzip: bool = False,
+):
+    records = spending_dao.iter_export(user.username)
+    if format == "csv":
+        chunks, media_type = to_csv(records), "text/csv"
+    else:
+        chunks, media_type = to_ndjson(records), NDJSON_MEDIA_TYPE
+
+    filename = f"s-tracker.{format}"
+    if gzip:
+        chunks, media_type = gzip_chunks(chunks), "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
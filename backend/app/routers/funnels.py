@@ -1,9 +1,9 @@
 from uuid import UUID
 
-from fastapi import APIRouter, status, HTTPException
+from fastapi import APIRouter, status, HTTPException, Response
 import pydantic
 
-from ..dependencies import DepFunnelDAO, DepUserAuth, VoidDepUserAuth
+from ..dependencies import DepDataETag, DepFunnelDAO, DepUserAuth
 from ..exceptions import FunnelDoesNotExistException
 from ..dto.funnels import *
 
@@ -16,11 +16,31 @@ router = APIRouter(
 @router.get(
     "/",
     summary="Get a list of all funnels",
+    description="Send the `ETag` of a previous response in `If-None-Match` to get a 304 while nothing changed.",
     status_code=status.HTTP_200_OK,
     response_model=list[FunnelPublic],
+    responses={304: {"description": "Not Modified"}},
 )
-def funnels_list(funnel_dao: DepFunnelDAO, user: DepUserAuth):
-    return funnel_dao.get_all(user.username)
+async def funnels_list(
+    response: Response, funnel_dao: DepFunnelDAO, user: DepUserAuth, etag: DepDataETag
+):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return await funnel_dao.get_all(user.username)
+
+
+@router.get(
+    "/forecast",
+    summary="Forecast the end of the current period for all funnels",
+    description=(
+        "Projects each funnel at its average daily spending over the last 28 days, "
+        "and recommends an even daily allowance for the rest of the period."
+    ),
+    status_code=status.HTTP_200_OK,
+    response_model=list[FunnelForecast],
+)
+async def get_forecast(funnel_dao: DepFunnelDAO, user: DepUserAuth):
+    return await funnel_dao.get_forecast(user.username)
 
 
 @router.get(
@@ -29,8 +49,8 @@ def funnels_list(funnel_dao: DepFunnelDAO, user: DepUserAuth):
     status_code=200,
     response_model=FunnelPublic,
 )
-def get_funnel(funnel_id: UUID, funnel_dao: DepFunnelDAO, user: DepUserAuth):
-    result = funnel_dao.get(funnel_id, user.username)
+async def get_funnel(funnel_id: UUID, funnel_dao: DepFunnelDAO, user: DepUserAuth):
+    result = await funnel_dao.get(funnel_id, user.username)
     if result is None:
         raise HTTPException(status_code=404, detail="Funnel not found")
     return result
@@ -42,10 +62,12 @@ def get_funnel(funnel_id: UUID, funnel_dao: DepFunnelDAO, user: DepUserAuth):
     status_code=status.HTTP_201_CREATED,
     response_model=pydantic.UUID4,
 )
-def create_funnel(
+async def create_funnel(
     funnel: FunnelCreateBody, funnel_dao: DepFunnelDAO, user: DepUserAuth
 ):
-    return funnel_dao.create(FunnelCreate(**funnel.dict(), user_name=user.username))
+    return await funnel_dao.create(
+        FunnelCreate(**funnel.dict(), user_name=user.username)
+    )
 
 
 @router.put(
@@ -53,14 +75,14 @@ def create_funnel(
     summary="Update an existing funnel",
     status_code=status.HTTP_204_NO_CONTENT,
 )
-def update_funnel(
+async def update_funnel(
     funnel_id: UUID,
     funnel: FunnelCreateBody,
     funnel_dao: DepFunnelDAO,
     user: DepUserAuth,
 ):
     try:
-        funnel_dao.update(
+        await funnel_dao.update(
             funnel_id, FunnelCreate(**funnel.dict(), user_name=user.username)
         )
     except FunnelDoesNotExistException:
@@ -71,10 +93,11 @@ def update_funnel(
     "/{funnel_id}",
     summary="Delete a funnel",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[VoidDepUserAuth],
 )
-def delete_funnel(funnel_id: UUID, funnel_dao: DepFunnelDAO):
+async def delete_funnel(
+    funnel_id: UUID, funnel_dao: DepFunnelDAO, user: DepUserAuth
+):
     try:
-        funnel_dao.delete(funnel_id)
+        await funnel_dao.delete(funnel_id, user.username)
     except FunnelDoesNotExistException:
         raise HTTPException(status_code=404, detail="Funnel does not exist")
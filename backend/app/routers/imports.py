@@ -0,0 +1,79 @@
+from typing import Literal
+
+from fastapi import APIRouter, status, HTTPException, Request
+from pydantic import UUID4
+
+from ..config import IMPORT_CHUNK_SIZE
+from ..dependencies import DepImportDAO, DepUserAuth
+from ..dto.imports import *
+from ..lib.export import EXPORT_FIELDS
+from ..lib.ingest import UploadDecodeError, iter_record_chunks
+from .spendings import NDJSON_MEDIA_TYPE
+
+router = APIRouter(prefix="/import", tags=["import"])
+
+
+@router.post(
+    "/",
+    summary="Import funnels and spendings from a file in the format of /export",
+    description=(
+        "The body is the raw file, optionally gzipped. CSV files need a header, the columns are a subset of "
+        f"`{','.join(EXPORT_FIELDS)}`, rows without a `record` are spendings. Rows are committed in chunks. "
+        "If an import fails midway, send the same file again with `resume` set to the import's id, "
+        "and the rows it has already processed are skipped."
+    ),
+    status_code=status.HTTP_200_OK,
+    response_model=ImportPublic,
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "text/csv": {"schema": {"type": "string"}},
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}},
+                "application/gzip": {"schema": {"type": "string", "format": "binary"}},
+            },
+            "required": True,
+        }
+    },
+)
+async def post_import(
+    request: Request,
+    import_dao: DepImportDAO,
+    user: DepUserAuth,
+    format: Literal["csv", "ndjson"] = "csv",
+    resume: UUID4 | None = None,
+):
+    if resume is None:
+        job = await import_dao.start(user.username)
+    else:
+        job = await import_dao.get(resume, user.username)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Import does not exist")
+        if job.finished:
+            return job
+
+    funnel_ids = await import_dao.funnel_ids(user.username)
+    chunks = iter_record_chunks(
+        request.stream(), format, IMPORT_CHUNK_SIZE, skip=job.rows_done
+    )
+    try:
+        async for records in chunks:
+            job = await import_dao.import_chunk(job, user.username, records, funnel_ids)
+    except UploadDecodeError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{e}, import {job.id} stopped after {job.rows_done} rows",
+        )
+    return await import_dao.finish(job)
+
+
+@router.get(
+    "/{id}",
+    summary="Get the progress of an import",
+    status_code=status.HTTP_200_OK,
+    response_model=ImportPublic,
+)
+async def get_import(id: UUID4, import_dao: DepImportDAO, user: DepUserAuth):
+    job = await import_dao.get(id, user.username)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import does not exist")
+    return job
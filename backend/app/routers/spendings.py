@@ -1,27 +1,94 @@
-from pydantic import UUID4
-from fastapi import APIRouter, status, HTTPException
+import json
+from typing import Annotated
 
-from ..dependencies import DepSpendingDAO, VoidDepUserAuth, DepUserAuth
-from ..exceptions import SpendingDoesNotExistException
+from pydantic import UUID4, ValidationError
+from fastapi import APIRouter, status, HTTPException, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from ..config import MAX_BATCH_SIZE
+from ..dependencies import DepDataETag, DepSpendingDAO, DepUserAuth
+from ..exceptions import SpendingDoesNotExistException, FunnelDoesNotExistException
 from ..dto.spendings import *
+from ..lib.cursor import encode_cursor, decode_cursor
 
 router = APIRouter(prefix="/spending", tags=["spending"])
 
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+MAX_ROW_BYTES = 1024
+"""Bytes a spending of a batch may take, several times what one takes as JSON"""
+
+
 @router.get(
     "/",
     summary="Get a list of all spendings between optional timestamp bounds",
+    description=(
+        "Spendings are ordered by timestamp. When `limit` is set, the cursor of the next page "
+        "is returned in the `X-Next-Cursor` header. "
+        f"Send `Accept: {NDJSON_MEDIA_TYPE}` to get the rows as newline-delimited JSON, streamed when `limit` isn't set. "
+        "Send the `ETag` of a previous response in `If-None-Match` to get a 304 while nothing changed. "
+        "Amounts below 1e-4 or from 1e16 are written with a bare exponent, e.g. `1e-7` and `1e16` "
+        "rather than `1e-07` and `1e+16`; they parse to the same numbers."
+    ),
     status_code=status.HTTP_200_OK,
     response_model=list[SpendingPublic],
+    responses={
+        200: {"content": {NDJSON_MEDIA_TYPE: {}}},
+        304: {"description": "Not Modified"},
+    },
 )
-def get_spendings(
+async def get_spendings(
+    response: Response,
     spending_dao: DepSpendingDAO,
     user: DepUserAuth,
+    etag: DepDataETag,
     timestamp_from: int | None = None,
     timestamp_to: int | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=1000)] = None,
+    cursor: str | None = None,
+    accept: Annotated[str | None, Header()] = None,
 ):
-    return spending_dao.get_all(
-        username=user.username, timestamp_from=timestamp_from, timestamp_to=timestamp_to
+    try:
+        after = decode_cursor(cursor) if cursor is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    filters = dict(
+        timestamp_from=timestamp_from, timestamp_to=timestamp_to, after=after
+    )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
+    ndjson = accept is not None and NDJSON_MEDIA_TYPE in accept
+    if ndjson and limit is None:
+        rows = spending_dao.iter_all(user.username, **filters)
+        return StreamingResponse(
+            (json.dumps(row) + "\n" async for row in rows),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=dict(response.headers),
+        )
+
+    # one extra row tells whether there is a next page
+    spendings = await spending_dao.get_rows(
+        user.username, limit=None if limit is None else limit + 1, **filters
+    )
+    if limit is not None and len(spendings) > limit:
+        spendings = spendings[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            spendings[-1]["timestamp"], spendings[-1]["id"]
+        )
+    if ndjson:
+        # a page is at most 1000 rows, so it's rendered at once, the header has to go out before the body
+        return Response(
+            "".join(json.dumps(row) + "\n" for row in spendings),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=dict(response.headers),
+        )
+    # the rows come from the DB already valid, so they skip the response_model, which would validate them again
+    return Response(
+        spending_rows_adapter.dump_json(spendings),
+        media_type="application/json",
+        headers=dict(response.headers),
     )
 
 
@@ -30,35 +97,147 @@ def get_spendings(
     summary="Create a spending",
     status_code=status.HTTP_201_CREATED,
     response_model=UUID4,
-    dependencies=[VoidDepUserAuth],
 )
-def post_spending(spending: SpendingCreate, spending_dao: DepSpendingDAO):
-    return spending_dao.create(spending)
+async def post_spending(
+    spending: SpendingCreate, spending_dao: DepSpendingDAO, user: DepUserAuth
+):
+    try:
+        return await spending_dao.create(spending, user.username)
+    except FunnelDoesNotExistException:
+        raise HTTPException(status_code=404, detail="Funnel does not exist")
+
+
+def _batch_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"At most {MAX_BATCH_SIZE} spendings are accepted per batch",
+    )
+
+
+async def _read_batch(request: Request) -> bytes:
+    """Reads the body of a batch, rejecting it as soon as it's larger than MAX_BATCH_SIZE rows can be,
+    or as an NDJSON body, has more lines than that. So an oversized batch is never held in memory as a whole"""
+    max_bytes = MAX_BATCH_SIZE * MAX_ROW_BYTES
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        raise _batch_too_large()
+
+    ndjson = NDJSON_MEDIA_TYPE in request.headers.get("content-type", "")
+    body = bytearray()
+    lines = 0
+    async for chunk in request.stream():
+        body.extend(chunk)
+        lines += chunk.count(b"\n") if ndjson else 0
+        if len(body) > max_bytes or lines > MAX_BATCH_SIZE:
+            raise _batch_too_large()
+    return bytes(body)
+
+
+def _parse_batch(body: bytes, content_type: str | None) -> list:
+    """Parses a JSON array, or NDJSON where an unparseable line becomes a row error"""
+    if content_type is not None and NDJSON_MEDIA_TYPE in content_type:
+        rows = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                rows.append(e)
+        return rows
+    try:
+        rows = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body is not valid JSON")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a list of spendings")
+    return rows
+
+
+@router.post(
+    "/batch",
+    summary="Create many spendings in one transaction",
+    description=(
+        f"Accepts a JSON array of spendings, or `{NDJSON_MEDIA_TYPE}` with one spending per line. "
+        "Valid rows are inserted, and each row gets either an `id` or an `error` in the response, in order."
+    ),
+    status_code=status.HTTP_200_OK,
+    response_model=list[SpendingBatchResult],
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": SpendingCreate.model_json_schema(),
+                    }
+                },
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}},
+            },
+            "required": True,
+        }
+    },
+)
+async def post_spendings_batch(
+    request: Request, spending_dao: DepSpendingDAO, user: DepUserAuth
+):
+    rows = _parse_batch(await _read_batch(request), request.headers.get("content-type"))
+    if len(rows) > MAX_BATCH_SIZE:
+        raise _batch_too_large()
+
+    results = [SpendingBatchResult() for _ in rows]
+    valid: list[tuple[int, SpendingCreate]] = []
+    for index, row in enumerate(rows):
+        if isinstance(row, ValueError):
+            results[index].error = f"Invalid JSON: {row}"
+            continue
+        try:
+            valid.append((index, SpendingCreate.model_validate(row)))
+        except ValidationError as e:
+            results[index].error = "; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                for error in e.errors()
+            )
+
+    ids = await spending_dao.create_many(
+        [spending for _, spending in valid], user.username
+    )
+    for (index, _), id in zip(valid, ids):
+        if id is None:
+            results[index].error = "Funnel does not exist"
+        else:
+            results[index].id = id
+    return results
 
 
 @router.put(
     "/{spending_id}",
     summary="Update a spending",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[VoidDepUserAuth],
 )
-def put_spending(
-    spending_id: UUID4, spending: SpendingCreate, spending_dao: DepSpendingDAO
+async def put_spending(
+    spending_id: UUID4,
+    spending: SpendingCreate,
+    spending_dao: DepSpendingDAO,
+    user: DepUserAuth,
 ):
     try:
-        return spending_dao.update(spending_id, spending)
+        return await spending_dao.update(spending_id, spending, user.username)
     except SpendingDoesNotExistException:
         raise HTTPException(status_code=404, detail="Spending does not exist")
+    except FunnelDoesNotExistException:
+        raise HTTPException(status_code=404, detail="Funnel does not exist")
 
 
 @router.delete(
     "/{spending_id}",
     summary="Delete a spending",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[VoidDepUserAuth],
 )
-def delete_spending(spending_id: UUID4, spending_dao: DepSpendingDAO):
+async def delete_spending(
+    spending_id: UUID4, spending_dao: DepSpendingDAO, user: DepUserAuth
+):
     try:
-        return spending_dao.delete(spending_id)
+        return await spending_dao.delete(spending_id, user.username)
     except SpendingDoesNotExistException:
         raise HTTPException(status_code=404, detail="Spending does not exist")
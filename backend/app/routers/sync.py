@@ -0,0 +1,48 @@
+from typing import Annotated
+
+from fastapi import APIRouter, status, HTTPException, Query
+
+from ..config import MAX_BATCH_SIZE
+from ..dependencies import DepSyncDAO, DepUserAuth
+from ..dto.spendings import *
+from ..dto.sync import *
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+@router.get(
+    "/",
+    summary="Get the funnels and spendings that changed since a version",
+    description=(
+        "Deleted funnels and spendings are listed in `deleted`. "
+        "Without `since`, the whole state of the user is returned. Pass the `version` of the response "
+        "as `since` of the next sync."
+    ),
+    status_code=status.HTTP_200_OK,
+    response_model=SyncDelta,
+)
+async def get_sync(
+    sync_dao: DepSyncDAO,
+    user: DepUserAuth,
+    since: Annotated[int, Query(ge=0)] = 0,
+):
+    return await sync_dao.get_delta(user.username, since)
+
+
+@router.post(
+    "/",
+    summary="Apply spending writes that were queued offline",
+    description=(
+        "Writes are applied in order in one transaction, and each gets either its `id` or an `error` in the "
+        "response, in order. Retrying a write has no further effect."
+    ),
+    status_code=status.HTTP_200_OK,
+    response_model=list[SpendingBatchResult],
+)
+async def post_sync(writes: list[SyncWrite], sync_dao: DepSyncDAO, user: DepUserAuth):
+    if len(writes) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_BATCH_SIZE} writes per request",
+        )
+    return await sync_dao.apply(writes, user.username)
@@ -3,7 +3,7 @@ from datetime import datetime, timezone, timedelta
 import pyotp
 import jwt
 
-from ..dependencies import DepUserDAO, DepUserAuth, DepFunnelDAO
+from ..dependencies import DepUserDAO, DepUserAuth, DepFunnelDAO, DepSpendingDAO
 from ..exceptions import JwtTokenBlacklistedException
 from ..dto.users import *
 from ..dto.funnels import FunnelCreate
@@ -39,9 +39,9 @@ def generate_jwt_pair(username: str):
     status_code=status.HTTP_200_OK,
     response_model=NewOtp,
 )
-def generate_otp_secret(body: GenerateSecretBody, user_dao: DepUserDAO):
+async def generate_otp_secret(body: GenerateSecretBody, user_dao: DepUserDAO):
     username = body.username
-    if not user_dao.check_username(username):
+    if not await user_dao.check_username(username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken"
         )
@@ -60,13 +60,15 @@ def generate_otp_secret(body: GenerateSecretBody, user_dao: DepUserDAO):
     status_code=status.HTTP_200_OK,
     response_model=JwtPair,
 )
-def create_user(user: UserCreate, user_dao: DepUserDAO, funnel_dao: DepFunnelDAO):
+async def create_user(
+    user: UserCreate, user_dao: DepUserDAO, funnel_dao: DepFunnelDAO
+):
     if not pyotp.TOTP(user.otp_secret).verify(user.otp_example):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid OTP"
         )
-    user_dao.create(user)
-    funnel_dao.create_default_funnels(username=user.username)
+    await user_dao.create(user)
+    await funnel_dao.create_default_funnels(username=user.username)
     return generate_jwt_pair(user.username)
 
 
@@ -76,8 +78,8 @@ def create_user(user: UserCreate, user_dao: DepUserDAO, funnel_dao: DepFunnelDAO
     status_code=status.HTTP_200_OK,
     response_model=JwtPair,
 )
-def login(user: UserLogin, user_dao: DepUserDAO):
-    if not user_dao.check_auth(username=user.username, otp=user.otp):
+async def login(user: UserLogin, user_dao: DepUserDAO):
+    if not await user_dao.check_auth(username=user.username, otp=user.otp):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Invalid password"
         )
@@ -90,10 +92,10 @@ def login(user: UserLogin, user_dao: DepUserDAO):
     status_code=status.HTTP_200_OK,
     response_model=JwtPair,
 )
-def refresh_pair(body: JwtRefreshBody, user_dao: DepUserDAO):
+async def refresh_pair(body: JwtRefreshBody, user_dao: DepUserDAO):
     try:
-        decoded = user_dao.decode_token(body.refresh)
-        user_dao.invalidate_tokens(decoded["username"], decoded["iat"])
+        decoded = await user_dao.decode_token(body.refresh)
+        await user_dao.invalidate_tokens(decoded["username"], decoded["iat"])
         return generate_jwt_pair(decoded["username"])
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -115,5 +117,33 @@ def refresh_pair(body: JwtRefreshBody, user_dao: DepUserDAO):
     status_code=status.HTTP_200_OK,
     response_model=UserJwtPayload,
 )
-def check_auth(user: DepUserAuth):
+async def check_auth(user: DepUserAuth):
     return user
+
+
+@router.get(
+    "/settings",
+    summary="Get the period breakpoint and timezone of the user",
+    status_code=status.HTTP_200_OK,
+    response_model=UserSettings,
+)
+async def get_settings(user: DepUserAuth, user_dao: DepUserDAO):
+    return await user_dao.get_settings(user.username)
+
+
+@router.put(
+    "/settings",
+    summary="Change the period breakpoint and timezone of the user",
+    description="Periods start at midnight of the breakpoint day in the timezone, or in the server's local time when it's null. The totals of all periods are recomputed.",
+    status_code=status.HTTP_200_OK,
+    response_model=UserSettings,
+)
+async def update_settings(
+    settings: UserSettings,
+    user: DepUserAuth,
+    user_dao: DepUserDAO,
+    spending_dao: DepSpendingDAO,
+):
+    await user_dao.update_settings(user.username, settings)
+    await spending_dao.rebuild_period_totals(user.username)
+    return settings
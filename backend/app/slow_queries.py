@@ -0,0 +1,125 @@
+import logging
+import time
+from collections import deque
+from time import perf_counter
+
+import sqlalchemy as sa
+
+from .config import SLOW_QUERY_LOG_SIZE, SLOW_QUERY_MS
+from .dto.admin import SlowQuery, SlowQueryFingerprint
+from .lib.sql_fingerprint import fingerprint, normalize_sql, parameter_shape
+from .timing import request_timings
+
+logger = logging.getLogger(__name__)
+
+
+class SlowQueryLog:
+    """Keeps the last `size` statements that took at least `threshold_ms`, written from any thread"""
+
+    def __init__(self, threshold_ms: float, size: int):
+        self.threshold_ms = threshold_ms
+        self._queries: deque[SlowQuery] = deque(maxlen=size)
+
+    def add(self, query: SlowQuery):
+        self._queries.append(query)
+        logger.warning(
+            "Slow query %.1f ms on %s: %s parameters=%s plan=%s",
+            query.duration_ms,
+            query.route or "no request",
+            query.sql,
+            query.parameters,
+            " | ".join(query.plan),
+        )
+
+    def top(self, limit: int) -> list[SlowQueryFingerprint]:
+        """The fingerprints of the kept statements, slowest first"""
+        fingerprints: dict[str, SlowQueryFingerprint] = {}
+        for query in list(self._queries):
+            entry = fingerprints.get(query.fingerprint)
+            if entry is None:
+                entry = fingerprints[query.fingerprint] = SlowQueryFingerprint(
+                    fingerprint=query.fingerprint,
+                    sql=query.sql,
+                    count=0,
+                    max_ms=0,
+                    total_ms=0,
+                    routes=[],
+                    parameters=query.parameters,
+                    plan=query.plan,
+                    last_seen=query.timestamp,
+                )
+            entry.count += 1
+            entry.total_ms += query.duration_ms
+            entry.last_seen = max(entry.last_seen, query.timestamp)
+            if query.route is not None and query.route not in entry.routes:
+                entry.routes.append(query.route)
+            if query.duration_ms > entry.max_ms:
+                entry.max_ms = query.duration_ms
+                entry.parameters = query.parameters
+                entry.plan = query.plan
+        return sorted(fingerprints.values(), key=lambda entry: -entry.max_ms)[:limit]
+
+    def clear(self):
+        self._queries.clear()
+
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_LOG_SIZE)
+
+
+def _explain(
+    conn: sa.Connection, statement: str, parameters, executemany: bool
+) -> list[str]:
+    """The SQLite query plan of the statement, indented like the sqlite3 shell does"""
+    if conn.dialect.name != "sqlite":
+        return []
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    # a raw cursor, so that the EXPLAIN fires no events and leaves the transaction alone
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        rows = cursor.fetchall()
+    except Exception as e:
+        logger.debug("Could not explain %s: %s", statement, e)
+        return []
+    finally:
+        cursor.close()
+    depths = {0: -1}
+    plan = []
+    for id, parent, _, detail in rows:
+        depths[id] = depths.get(parent, -1) + 1
+        plan.append("  " * depths[id] + detail)
+    return plan
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._slow_query_started = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slow_query_started", None)
+    if started is None:
+        return
+    duration_ms = (perf_counter() - started) * 1000
+    if duration_ms < slow_query_log.threshold_ms:
+        return
+
+    timings = request_timings.get()
+    sql = normalize_sql(statement)
+    slow_query_log.add(
+        SlowQuery(
+            fingerprint=fingerprint(sql),
+            sql=sql,
+            parameters=parameter_shape(parameters, executemany),
+            route=None if timings is None else f"{timings.scope['method']} {timings.route}",
+            duration_ms=round(duration_ms, 3),
+            plan=_explain(conn, statement, parameters, executemany),
+            timestamp=int(time.time() * 1000),
+        )
+    )
+
+
+def log_slow_queries(engine: sa.Engine):
+    """Logs the statements run on `engine` that take at least SLOW_QUERY_MS, with their query plan"""
+    sa.event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    sa.event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,64 @@
+import fnmatch
+import socketserver
+import threading
+import time
+
+
+class RedisStandIn:
+    """A minimal in-process server speaking the Redis protocol, supports just the commands `RedisCache` uses"""
+
+    def __init__(self):
+        self.data: dict[bytes, tuple[bytes, float]] = {}
+        stand_in = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    args = []
+                    for _ in range(int(line[1:])):
+                        length = int(self.rfile.readline()[1:])
+                        args.append(self.rfile.read(length + 2)[:-2])
+                    self.wfile.write(stand_in.execute(*args))
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"redis://127.0.0.1:{self._server.server_address[1]}/0"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _alive(self, key: bytes) -> bool:
+        return key in self.data and self.data[key][1] > time.time()
+
+    def execute(self, command: bytes, *args: bytes) -> bytes:
+        command = command.upper()
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command == b"GET":
+            if not self._alive(args[0]):
+                return b"$-1\r\n"
+            value = self.data[args[0]][0]
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if command == b"SET":
+            expires_at = float("inf")
+            if len(args) == 4 and args[2].upper() == b"PX":
+                expires_at = time.time() + int(args[3]) / 1000
+            self.data[args[0]] = (args[1], expires_at)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            deleted = sum(self.data.pop(key, None) is not None for key in args)
+            return b":%d\r\n" % deleted
+        if command == b"SCAN":
+            pattern = args[2].decode()
+            keys = [key for key in self.data if fnmatch.fnmatch(key.decode(), pattern)]
+            reply = b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(keys)
+            return reply + b"".join(b"$%d\r\n%s\r\n" % (len(k), k) for k in keys)
+        return b"-ERR unknown command\r\n"
@@ -1,5 +1,23 @@
+from contextlib import contextmanager
+
 from fastapi.testclient import TestClient
+import sqlalchemy as sa
 
 
 def get_funnels(client: TestClient):
     return client.get("/funnel")
+
+
+@contextmanager
+def capture_queries(conn: sa.Connection):
+    """Collects every SQL statement executed on `conn` while the block runs, along with its parameters"""
+    statements: list[tuple[str, tuple]] = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    sa.event.listen(conn, "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        sa.event.remove(conn, "before_cursor_execute", on_execute)
@@ -0,0 +1,194 @@
+import sqlite3
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from fastapi.testclient import TestClient
+import sqlalchemy as sa
+
+from ..dao.spendings import SpendingDAO
+from ..dao.tables import spendings_table
+from ..dto.spendings import SpendingCreate
+
+from ..lib.monthly_period import *
+from .shared import *
+
+
+def test_analytics_days(client: TestClient, fake_auth):
+    response = client.get("/analytics")
+    assert response.status_code == 200, response.text
+    assert response.headers["cache-control"] == "no-cache"
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    buckets = response.json()
+    assert {bucket["funnel_id"] for bucket in buckets} == {
+        funnel["id"] for funnel in get_funnels(client).json()
+    }
+    assert all(
+        bucket | {"funnel_id": None}
+        == {"funnel_id": None, "start": ms_timestamp(today), "spent": 450, "count": 3}
+        for bucket in buckets
+    )
+
+
+def test_analytics_periods(client: TestClient, fake_auth):
+    """Tests that spendings of past periods fall into their own buckets, which may be cached"""
+    period_start = get_current_period_start(datetime.now())
+    last_period = ms_timestamp(
+        datetime.fromtimestamp(period_start / 1000) - timedelta(days=1)
+    )
+    funnel_id = get_funnels(client).json()[0]["id"]
+    client.post(
+        "/spending",
+        json={"amount": 70, "timestamp": last_period, "funnel_id": funnel_id},
+    )
+
+    response = client.get(
+        "/analytics",
+        params={"bucket": "period", "timestamp_from": 0, "timestamp_to": period_start},
+    )
+    assert response.status_code == 200, response.text
+    assert response.headers["cache-control"].endswith("max-age=86400")
+    assert response.json() == [
+        {
+            "funnel_id": funnel_id,
+            "start": get_period_start(last_period),
+            "spent": 70,
+            "count": 1,
+        }
+    ]
+
+    response = client.get(
+        "/analytics", params={"bucket": "period", "timestamp_from": 0}
+    )
+    assert [bucket["start"] for bucket in response.json()] == [
+        get_period_start(last_period)
+    ] + [period_start] * 3
+
+
+def past_timestamps(periods: int) -> list[int]:
+    """A timestamp in the middle of each of the last `periods` closed periods"""
+    timestamps = []
+    period_start = get_current_period_start(datetime.now())
+    for _ in range(periods):
+        middle = datetime.fromtimestamp(period_start / 1000) - timedelta(days=14)
+        timestamps.append(ms_timestamp(middle))
+        period_start = get_period_start(timestamps[-1])
+    return timestamps
+
+
+def test_closed_periods_served_from_snapshots(
+    client: TestClient, db_connection: sa.Connection, fake_auth
+):
+    """Tests that totals of closed periods come from snapshots, which are dropped only by writes to their period"""
+    funnel_id = get_funnels(client).json()[0]["id"]
+    timestamps = past_timestamps(3)
+    ids = client.post(
+        "/spending/batch",
+        json=[
+            {"amount": 10, "timestamp": timestamp, "funnel_id": funnel_id}
+            for timestamp in timestamps
+        ],
+    ).json()
+
+    def get_period_totals() -> dict[int, float]:
+        response = client.get(
+            "/analytics", params={"bucket": "period", "timestamp_from": 0}
+        )
+        return {bucket["start"]: bucket["spent"] for bucket in response.json()}
+
+    periods = [get_period_start(timestamp) for timestamp in timestamps]
+    assert [get_period_totals()[period] for period in periods] == [10, 10, 10]
+    for bucket in ("day", "week"):
+        response = client.get(
+            "/analytics", params={"bucket": bucket, "timestamp_from": 0}
+        )
+        assert sum(b["spent"] for b in response.json()) == 30 + 3 * 450
+
+    # bypasses the DAO, so the snapshots are not dropped
+    db_connection.execute(
+        sa.update(spendings_table)
+        .where(spendings_table.c.id.in_([id["id"] for id in ids]))
+        .values(amount=20)
+    )
+    assert [get_period_totals()[period] for period in periods] == [10, 10, 10]
+
+    client.put(
+        f"/spending/{ids[1]['id']}",
+        json={"amount": 30, "timestamp": timestamps[1], "funnel_id": funnel_id},
+    )
+    assert [get_period_totals()[period] for period in periods] == [10, 30, 10]
+
+
+def test_failed_snapshot_write(client: TestClient, db_connection: sa.Connection, fake_auth):
+    """Tests that snapshots that fail to be stored, e.g. on a locked DB, neither fail the read nor the rest of its transaction"""
+    funnel_id = get_funnels(client).json()[0]["id"]
+    spending = {"amount": 10, "timestamp": past_timestamps(1)[0], "funnel_id": funnel_id}
+
+    def lock_snapshots(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT OR REPLACE INTO period_snapshots"):
+            raise sa.exc.OperationalError(
+                statement, parameters, sqlite3.OperationalError("database is locked")
+            )
+
+    dao = SpendingDAO(db_connection)
+    sa.event.listen(db_connection, "before_cursor_execute", lock_snapshots)
+    try:
+        id = dao.create(SpendingCreate(**spending), "test")
+        totals = dao.get_totals("test", "period", timestamp_from=0)
+    finally:
+        sa.event.remove(db_connection, "before_cursor_execute", lock_snapshots)
+    assert sum(bucket.spent for bucket in totals) == 10 + 3 * 450
+    assert id in [s.id for s in dao.get_all("test", timestamp_from=0)]
+    assert dao.get_totals("test", "period", timestamp_from=0) == totals
+
+
+def test_analytics_user_timezone(client: TestClient, fake_auth):
+    """Tests that buckets follow the user's timezone and breakpoint across the DST transitions of Europe/Berlin"""
+    response = client.put(
+        "/user/settings", json={"period_breakpoint": 1, "timezone": "Europe/Berlin"}
+    )
+    assert response.status_code == 200, response.text
+    berlin = ZoneInfo("Europe/Berlin")
+    funnel_id = get_funnels(client).json()[0]["id"]
+    times = [
+        datetime(2024, 3, 30, 23, 30, tzinfo=berlin),
+        # before and after 02:00 turns into 03:00
+        datetime(2024, 3, 31, 0, 30, tzinfo=berlin),
+        datetime(2024, 3, 31, 23, 30, tzinfo=berlin),
+        # still September 30 in UTC
+        datetime(2024, 10, 1, 0, 30, tzinfo=berlin),
+    ]
+    client.post(
+        "/spending/batch",
+        json=[
+            {"amount": 10, "timestamp": ms_timestamp(time), "funnel_id": funnel_id}
+            for time in times
+        ],
+    )
+
+    def get_starts(bucket: str, timestamp_to: datetime) -> dict[int, int]:
+        response = client.get(
+            "/analytics",
+            params={
+                "bucket": bucket,
+                "timestamp_from": 0,
+                "timestamp_to": ms_timestamp(timestamp_to),
+            },
+        )
+        return {b["start"]: b["count"] for b in response.json()}
+
+    # within a period, and again over closed periods, served from snapshots the second time
+    for timestamp_to in (datetime(2024, 4, 1, 12, tzinfo=berlin), datetime(2025, 1, 1)):
+        for _ in range(2):
+            assert {
+                start: count
+                for start, count in get_starts("day", timestamp_to).items()
+                if start < ms_timestamp(datetime(2024, 4, 1, tzinfo=berlin))
+            } == {
+                ms_timestamp(datetime(2024, 3, 30, tzinfo=berlin)): 1,
+                ms_timestamp(datetime(2024, 3, 31, tzinfo=berlin)): 2,
+            }
+    assert get_starts("period", datetime(2025, 1, 1)) == {
+        ms_timestamp(datetime(2024, 3, 1, tzinfo=berlin)): 3,
+        ms_timestamp(datetime(2024, 10, 1, tzinfo=berlin)): 1,
+    }
@@ -0,0 +1,44 @@
+import json
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from ..dto.funnels import *
+from ..lib.monthly_period import ms_timestamp
+from .shared import *
+
+
+def test_get_funnels(async_client: TestClient, fake_auth):
+    response = get_funnels(async_client)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert len(data) == 3
+    assert all(FunnelPublic.validate(funnel) for funnel in data)
+
+
+def test_spending_roundtrip(async_client: TestClient, fake_auth):
+    """Tests that writes through the async backend are visible to its reads"""
+    funnel = get_funnels(async_client).json()[0]
+    response = async_client.post(
+        "/spending",
+        json={
+            "amount": 250,
+            "timestamp": ms_timestamp(datetime.now()),
+            "funnel_id": funnel["id"],
+        },
+    )
+    assert response.status_code == 201, response.text
+
+    spendings = async_client.get("/spending").json()
+    assert any(spending["id"] == response.json() for spending in spendings)
+    updated = async_client.get(f"/funnel/{funnel['id']}").json()
+    assert updated["remaining"] == funnel["remaining"] - 250
+
+
+def test_get_spendings_ndjson(async_client: TestClient, fake_auth):
+    response = async_client.get(
+        "/spending", headers={"Accept": "application/x-ndjson"}
+    )
+    assert response.status_code == 200, response.text
+    streamed = [json.loads(line) for line in response.text.splitlines()]
+    assert streamed == async_client.get("/spending").json()
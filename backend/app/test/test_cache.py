@@ -0,0 +1,256 @@
+import pickle
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+import pytest
+import sqlalchemy as sa
+
+from ..cache import data_version_cache, funnel_overview_cache
+from ..dao.base import BaseDAO, cache_data_version
+from ..dao.funnels import FunnelDAO
+from ..dao.spendings import SpendingDAO
+from ..dao.tables import users_table
+from ..database import metadata_obj
+from ..dto.spendings import SpendingCreate
+from ..hooks import commit, on_user_data_changed, user_data_changed, _user_data_changed_hooks
+from ..lib.cache import *
+from .redis_stand_in import RedisStandIn
+from .shared import *
+
+
+def fail_commit(connection: sa.Connection):
+    raise sa.exc.OperationalError("COMMIT", {}, Exception("database is locked"))
+
+
+@pytest.fixture(params=["memory", "disk", "redis"])
+def cache(request, tmp_path: Path):
+    if request.param == "memory":
+        yield TTLCache(maxsize=2)
+    elif request.param == "disk":
+        yield DiskCache(str(tmp_path / "cache.db"), "test", maxsize=2)
+    else:
+        with RedisStandIn() as server:
+            yield RedisCache(server.url, "test")
+
+
+def test_get_set_delete(cache: Cache):
+    assert cache.get("key") is None
+    assert cache.get("key", MISSING) is MISSING
+    cache.set("key", {"a": [1, 2]})
+    assert cache.get("key") == {"a": [1, 2]}
+    cache.set("none", None)
+    assert cache.get("none", MISSING) is None
+    cache.delete("key")
+    assert cache.get("key") is None
+    cache.clear()
+    assert cache.get("none", MISSING) is MISSING
+
+
+def test_expiry(cache: Cache):
+    cache.set("expired", 1, expires_at=time.time() - 1)
+    cache.set("fresh", 2, expires_at=time.time() + 60)
+    assert cache.get("expired") is None
+    assert cache.get("fresh") == 2
+
+
+def test_disk_cache_shared(tmp_path: Path):
+    """Tests that separate DiskCache instances, e.g. in different workers, see each other's writes"""
+    path = str(tmp_path / "cache.db")
+    first, second = DiskCache(path, "test", 10), DiskCache(path, "test", 10)
+    first.set("key", "value")
+    assert second.get("key") == "value"
+    second.delete("key")
+    assert first.get("key") is None
+
+
+def test_disk_cache_ignores_undecodable(tmp_path: Path):
+    """Tests that a value that isn't JSON, e.g. a pickle planted in the shared file, is a miss rather than loaded"""
+    cache = DiskCache(str(tmp_path / "cache.db"), "test", 10)
+    cache._db.execute(
+        "INSERT INTO cache VALUES ('test', 'key', ?, ?)",
+        (pickle.dumps({"a": 1}), time.time() + 60),
+    )
+    assert cache.get("key", MISSING) is MISSING
+
+
+def test_memory_cache_evicts_lru():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+
+def test_redis_cache_unavailable():
+    """Tests that an unreachable server degrades to cache misses"""
+    cache = RedisCache("redis://127.0.0.1:1/0", "test")
+    cache.set("key", "value")
+    assert cache.get("key") is None
+
+
+def test_hooks_fire_on_commit(app, db_connection: sa.Connection):
+    fired = []
+    hook = on_user_data_changed(fired.append)
+    try:
+        db_connection.execute(sa.select(1))
+        user_data_changed(db_connection, "test")
+        assert fired == ["test"]
+        commit(db_connection)
+        assert fired == ["test", "test"]
+        commit(db_connection)
+        assert fired == ["test", "test"]
+    finally:
+        _user_data_changed_hooks.remove(hook)
+
+
+def test_hooks_fire_on_commit_after_rollback(app, db_connection: sa.Connection):
+    fired = []
+    hook = on_user_data_changed(fired.append)
+    try:
+        db_connection.execute(sa.select(1))
+        user_data_changed(db_connection, "rolled back")
+        db_connection.rollback()
+        db_connection.execute(sa.select(1))
+        user_data_changed(db_connection, "test")
+        commit(db_connection)
+        assert fired == ["rolled back", "test", "test"]
+        db_connection.execute(sa.select(1))
+        user_data_changed(db_connection, "again")
+        commit(db_connection)
+        assert fired[-2:] == ["again", "again"]
+    finally:
+        _user_data_changed_hooks.remove(hook)
+
+
+def test_hooks_fire_after_the_commit(tmp_path: Path):
+    """Tests that the second firing comes once other connections see the writes, and never if the COMMIT fails"""
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    metadata_obj.create_all(engine)
+    seen = []
+
+    def count_users(username: str):
+        with engine.connect() as other:
+            seen.append(
+                other.execute(sa.select(sa.func.count()).select_from(users_table)).scalar()
+            )
+
+    hook = on_user_data_changed(count_users)
+    try:
+        with engine.connect() as conn:
+            conn.execute(sa.insert(users_table).values(username="test", otp_secret=""))
+            user_data_changed(conn, "test")
+            commit(conn)
+        assert seen == [0, 1]
+
+        with engine.connect() as conn:
+            conn.execute(sa.insert(users_table).values(username="other", otp_secret=""))
+            user_data_changed(conn, "other")
+            sa.event.listen(conn, "commit", fail_commit)
+            with pytest.raises(sa.exc.OperationalError):
+                commit(conn)
+            assert "committing" not in conn.info
+        assert seen == [0, 1, 1]
+    finally:
+        _user_data_changed_hooks.remove(hook)
+        engine.dispose()
+
+
+def test_overview_cached_and_invalidated(
+    client: TestClient, db_connection: sa.Connection, fake_auth
+):
+    funnels = get_funnels(client).json()
+    with capture_queries(db_connection) as statements:
+        assert get_funnels(client).json() == funnels
+    assert statements == []
+
+    spending = {"amount": 10, "timestamp": int(time.time() * 1000)}
+    client.post("/spending", json=spending | {"funnel_id": funnels[0]["id"]})
+    assert funnel_overview_cache.get("test") is None
+    assert get_funnels(client).json()[0]["remaining"] == funnels[0]["remaining"] - 10
+
+
+def test_overview_cached_per_day(client: TestClient, fake_auth):
+    """Tests that the overview cached on a previous day isn't served, since the ETag has moved on to the new day"""
+    funnels = get_funnels(client).json()
+    cached = funnel_overview_cache.get("test")
+    stale = [funnel | {"remaining": 0} for funnel in cached["funnels"]]
+
+    funnel_overview_cache.set("test", {"day": "2000-01-01", "funnels": stale})
+    assert get_funnels(client).json() == funnels
+    funnel_overview_cache.set("test", cached | {"funnels": stale})
+    assert get_funnels(client).json()[0]["remaining"] == 0
+
+
+@pytest.mark.parametrize("path", ["/funnel/", "/spending/"])
+def test_conditional_get(client: TestClient, db_connection, fake_auth, path: str):
+    """Tests that lists answer 304 without any SQL until the user's data changes"""
+    response = client.get(path)
+    etag = response.headers["etag"]
+    assert client.get(path, params={"limit": 10}).headers["etag"] != etag
+
+    with capture_queries(db_connection) as statements:
+        response = client.get(path, headers={"If-None-Match": f'"x", {etag}'})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    assert statements == []
+
+    funnel_id = get_funnels(client).json()[0]["id"]
+    client.post("/spending", json={"amount": 1, "timestamp": 0, "funnel_id": funnel_id})
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert client.get(path, headers={"If-None-Match": "*"}).status_code == 304
+
+
+def test_data_version_cached_on_commit(app, db_connection: sa.Connection):
+    """Tests that the cached version follows commits only, and that a stale reader can't put an older one back"""
+    dao = SpendingDAO(db_connection)
+    funnel_id = FunnelDAO(db_connection, dao).get_all("test")[0].id
+    commit(db_connection)
+    version = dao.data_version("test")
+
+    dao.create(SpendingCreate(amount=1, timestamp=0, funnel_id=funnel_id), "test")
+    data_version_cache.clear()
+    assert dao.data_version("test") == version + 1
+    assert data_version_cache.get("test") is None
+    db_connection.rollback()
+    assert dao.data_version("test") == version
+
+    dao.create(SpendingCreate(amount=1, timestamp=0, funnel_id=funnel_id), "test")
+    commit(db_connection)
+    assert data_version_cache.get("test") == version + 1
+    # a reader that loaded the version before the commit
+    cache_data_version("test", version)
+    assert dao.data_version("test") == version + 1
+
+
+def test_data_version_cached_after_the_commit(tmp_path: Path):
+    """Tests that the bumped version is cached once other connections read it too, and never if the COMMIT fails"""
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    metadata_obj.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(sa.insert(users_table).values(username="test", otp_secret=""))
+
+    try:
+        with engine.connect() as conn:
+            BaseDAO(conn)._data_changed("test")
+            sa.event.listen(conn, "commit", fail_commit)
+            with pytest.raises(sa.exc.OperationalError):
+                commit(conn)
+        assert data_version_cache.get("test") is None
+        # the COMMIT failed before it reached the DBAPI connection, which is still in the transaction
+        engine.dispose()
+
+        with engine.connect() as conn:
+            BaseDAO(conn)._data_changed("test")
+            commit(conn)
+        assert data_version_cache.get("test") == 1
+        data_version_cache.clear()
+        with engine.connect() as other:
+            assert BaseDAO(other).data_version("test") == 1
+    finally:
+        engine.dispose()
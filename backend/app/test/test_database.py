@@ -0,0 +1,75 @@
+import threading
+from pathlib import Path
+from uuid import uuid4
+
+import sqlalchemy as sa
+
+from ..config import SQLITE_PRAGMAS
+from ..dao.tables import funnels_table, spendings_table, users_table
+from ..database import metadata_obj, use_sqlite_pragmas
+
+
+def make_file_engine(path: Path) -> sa.Engine:
+    engine = sa.create_engine(f"sqlite:///{path}")
+    use_sqlite_pragmas(engine)
+    metadata_obj.create_all(engine)
+    return engine
+
+
+def test_pragmas_applied(tmp_path: Path):
+    engine = make_file_engine(tmp_path / "db.sqlite")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == int(
+            SQLITE_PRAGMAS["busy_timeout"]
+        )
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+
+
+def test_concurrent_readers_and_writers(tmp_path: Path):
+    """Tests that concurrent writes queue up on busy_timeout and readers are never blocked by them"""
+    engine = make_file_engine(tmp_path / "db.sqlite")
+    funnel_id = str(uuid4())
+    with engine.begin() as conn:
+        conn.execute(sa.insert(users_table).values(username="test", otp_secret=""))
+        conn.execute(
+            sa.insert(funnels_table).values(id=funnel_id, name="Test", user_name="test")
+        )
+
+    writers, readers, per_thread = 4, 4, 50
+    errors: list[Exception] = []
+
+    def write():
+        try:
+            for i in range(per_thread):
+                with engine.begin() as conn:
+                    conn.execute(
+                        sa.insert(spendings_table).values(
+                            id=str(uuid4()), amount=1, timestamp=i, funnel_id=funnel_id
+                        )
+                    )
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            for _ in range(per_thread):
+                with engine.connect() as conn:
+                    conn.execute(sa.select(sa.func.count()).select_from(spendings_table))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(writers)] + [
+        threading.Thread(target=read) for _ in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with engine.connect() as conn:
+        count = conn.execute(
+            sa.select(sa.func.count()).select_from(spendings_table)
+        ).scalar()
+    assert count == writers * per_thread
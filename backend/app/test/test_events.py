@@ -0,0 +1,123 @@
+import asyncio
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+import sqlalchemy as sa
+
+from ..dao.base import BaseDAO
+from ..dao.funnels import FunnelDAO
+from ..dao.spendings import SpendingDAO
+from ..dao.tables import users_table
+from ..database import metadata_obj
+from ..dto.funnels import FunnelCreate
+from ..dto.spendings import SpendingCreate
+from ..events import user_events
+from ..hooks import commit
+from ..lib.monthly_period import ms_timestamp
+from ..lib.pubsub import PubSub
+from ..routers.events import iter_events
+from .shared import *
+
+
+def test_pubsub():
+    async def main():
+        pubsub = PubSub(maxsize=2)
+        with pubsub.subscribe("a") as subscription:
+            assert pubsub.has_subscribers("a")
+            thread = threading.Thread(
+                target=lambda: [pubsub.publish("a", i) for i in range(3)]
+            )
+            thread.start()
+            thread.join()
+            pubsub.publish("b", "other")
+            # the oldest message is dropped
+            assert [await subscription.get() for _ in range(2)] == [1, 2]
+        assert not pubsub.has_subscribers("a")
+
+    asyncio.run(main())
+
+
+def test_events_published_on_commit(app, db_connection: sa.Connection):
+    """Tests that writes reach the subscribers once committed, with the deltas of the funnels' remaining amounts"""
+    funnel = FunnelDAO(db_connection, SpendingDAO(db_connection)).get_all("test")[0]
+    spending = SpendingCreate(
+        amount=30, timestamp=ms_timestamp(datetime.now()), funnel_id=funnel.id
+    )
+
+    async def main():
+        with user_events.subscribe("test") as subscription:
+            SpendingDAO(db_connection).create(spending, "test")
+            db_connection.rollback()
+            SpendingDAO(db_connection).create(spending, "test")
+            commit(db_connection)
+            message = await asyncio.wait_for(subscription.get(), 1)
+            assert message["type"] == "spendings"
+            assert message["deltas"] == [
+                {"id": str(funnel.id), "remaining": -30, "daily": -30}
+            ]
+
+            FunnelDAO(db_connection, SpendingDAO(db_connection)).update(
+                funnel.id,
+                FunnelCreate(**funnel.dict(), user_name="test"),
+            )
+            commit(db_connection)
+            next_message = await asyncio.wait_for(subscription.get(), 1)
+            assert next_message["type"] == "funnels"
+            assert next_message["version"] == message["version"] + 1
+            assert next_message["funnels"][0]["remaining"] == funnel.remaining - 30
+
+    asyncio.run(main())
+
+
+def test_events_not_published_when_the_commit_fails(tmp_path: Path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    metadata_obj.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(sa.insert(users_table).values(username="test", otp_secret=""))
+
+    def fail_commit(connection: sa.Connection):
+        raise sa.exc.OperationalError("COMMIT", {}, Exception("database is locked"))
+
+    async def main():
+        with user_events.subscribe("test") as subscription:
+            with engine.connect() as conn:
+                BaseDAO(conn)._data_changed("test")
+                sa.event.listen(conn, "commit", fail_commit)
+                with pytest.raises(sa.exc.OperationalError):
+                    commit(conn)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(subscription.get(), 0.1)
+            # the COMMIT failed before it reached the DBAPI connection, which is still in the transaction
+            engine.dispose()
+
+            with engine.connect() as conn:
+                BaseDAO(conn)._data_changed("test")
+                commit(conn)
+            assert await asyncio.wait_for(subscription.get(), 1) == {
+                "type": "changed",
+                "version": 1,
+            }
+
+    try:
+        asyncio.run(main())
+    finally:
+        engine.dispose()
+
+
+def test_iter_events():
+    async def main():
+        events = iter_events("test", keepalive=0.05)
+        assert await anext(events) == "retry: 50\n\n"
+        message = {"type": "changed", "version": 7}
+        user_events.publish("test", message)
+        assert await anext(events) == (
+            f"event: changed\nid: 7\ndata: {json.dumps(message)}\n\n"
+        )
+        assert await anext(events) == ": keepalive\n\n"
+        await events.aclose()
+        assert not user_events.has_subscribers("test")
+
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+import csv
+import gzip
+import io
+import json
+
+from fastapi.testclient import TestClient
+
+from ..lib.export import EXPORT_FIELDS
+from .shared import *
+
+
+def test_export_csv(client: TestClient, fake_auth):
+    response = client.get("/export")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "s-tracker.csv" in response.headers["content-disposition"]
+
+    reader = csv.DictReader(io.StringIO(response.text))
+    assert tuple(reader.fieldnames) == EXPORT_FIELDS
+    records = list(reader)
+    funnels = [record for record in records if record["record"] == "funnel"]
+    spendings = [record for record in records if record["record"] == "spending"]
+    assert records == funnels + spendings
+
+    funnel_names = {funnel["name"] for funnel in get_funnels(client).json()}
+    assert {funnel["name"] for funnel in funnels} == funnel_names
+    assert len(spendings) == 9
+    assert all(spending["funnel"] in funnel_names for spending in spendings)
+
+
+def test_export_ndjson_gzip(client: TestClient, fake_auth):
+    response = client.get("/export", params={"format": "ndjson", "gzip": True})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/gzip"
+    assert "s-tracker.ndjson.gz" in response.headers["content-disposition"]
+
+    lines = gzip.decompress(response.content).decode().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [record["record"] for record in records] == ["funnel"] * 3 + [
+        "spending"
+    ] * 9
+    assert records[-1].keys() == {"record", "id", "funnel", "timestamp", "amount"}
+
+
+def test_export_async_backend(async_client: TestClient, fake_auth):
+    response = async_client.get("/export", params={"format": "ndjson"})
+    assert response.status_code == 200, response.text
+    assert len(response.text.splitlines()) == 12
@@ -0,0 +1,21 @@
+import numpy as np
+
+from ..lib.forecast import *
+
+
+def test_daily_spend():
+    daily = daily_spend(
+        np.array([0, 1, 1, 0]),
+        np.array([-1, DAY_MS, DAY_MS + 5, 3 * DAY_MS]),
+        np.array([1.0, 2.0, 3.0, 4.0]),
+        funnels=2,
+        start=0,
+        days=3,
+    )
+    assert daily.tolist() == [[0, 0, 0], [0, 5, 0]]
+
+
+def test_trailing_mean():
+    daily = np.array([[2.0, 4.0, 6.0, 8.0], [1.0, 0.0, 0.0, 3.0]])
+    assert trailing_mean(daily, 2).tolist() == [7, 1.5]
+    assert trailing_mean(daily, 8).tolist() == [2.5, 0.5]
@@ -1,6 +1,10 @@
+from datetime import datetime
+
 from fastapi.testclient import TestClient
+import pytest
 
 from ..dto.funnels import *
+from ..lib.monthly_period import get_current_period_remaining_days
 from .shared import *
 
 test_funnel = {
@@ -69,3 +73,46 @@ def test_funnel_non_auth(client: TestClient):
     delete = client.delete("/funnel/123")
 
     assert all(req.status_code == 403 for req in (get, post, put, delete))
+
+
+def test_get_funnels_single_query(client: TestClient, db_connection, fake_auth):
+    """Tests that the funnel overview is computed in one query regardless of the funnel count"""
+    for _ in range(5):
+        create_funnel(client)
+
+    with capture_queries(db_connection) as statements:
+        response = get_funnels(client)
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 8
+    # plus the lookup of the data version for the ETag, which the writes above invalidated
+    assert len(statements) == 2
+    assert "funnels" not in statements[0][0]
+
+
+def test_get_funnels_remaining(client: TestClient, fake_auth):
+    """Tests that remaining amount is the limit minus the current period spendings"""
+    data = get_funnels(client).json()
+    assert all(funnel["remaining"] == 20000 - 450 for funnel in data)
+
+    funnel_id = create_funnel(client).json()
+    funnel = client.get(f"/funnel/{funnel_id}").json()
+    assert funnel["remaining"] == test_funnel["limit"]
+
+
+def test_forecast(client: TestClient, fake_auth):
+    response = client.get("/funnel/forecast")
+    assert response.status_code == 200, response.text
+
+    remaining_days = get_current_period_remaining_days(datetime.now())
+    for forecast in response.json():
+        assert forecast["burn_rate"] == pytest.approx(450 / 28)
+        assert forecast["recent_burn_rate"] == pytest.approx(450 / 7)
+        assert forecast["projected_spent"] == pytest.approx(
+            450 + 450 / 28 * remaining_days
+        )
+        assert forecast["projected_remaining"] == pytest.approx(
+            20000 - forecast["projected_spent"]
+        )
+        assert forecast["daily_allowance"] == pytest.approx(
+            (20000 - 450) / (remaining_days + 1)
+        )
@@ -0,0 +1,112 @@
+import gzip
+import json
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from ..dao.funnels import FunnelDAO
+from ..dao.imports import ImportDAO
+from ..dao.spendings import SpendingDAO
+from ..lib.monthly_period import ms_timestamp
+from ..routers import imports
+from .shared import *
+
+now = ms_timestamp(datetime.now())
+
+csv_file = f"""record,name,limit,color,emoji,funnel,timestamp,amount
+funnel,"Rent, utilities",50000,#ff0000,🏠,,,
+spending,,,,,"Rent, utilities",{now},30000
+,,,,,Test #0,{now},100
+spending,,,,,Unknown,{now},100
+spending,,,,,Test #0,{now},a lot
+"""
+
+
+def count_spendings(client: TestClient) -> int:
+    return len(client.get("/spending").json())
+
+
+def test_import_csv(client: TestClient, fake_auth, monkeypatch):
+    monkeypatch.setattr(imports, "IMPORT_CHUNK_SIZE", 2)
+    count = count_spendings(client)
+
+    response = client.post("/import", content=csv_file)
+    assert response.status_code == 200, response.text
+    job = response.json()
+    assert job | {"id": None} == {
+        "id": None,
+        "rows_done": 5,
+        "rows_failed": 2,
+        "finished": True,
+    }
+    assert client.get(f"/import/{job['id']}").json() == job
+
+    funnel = next(f for f in get_funnels(client).json() if f["emoji"] == "🏠")
+    assert funnel["name"] == "Rent, utilities"
+    assert funnel["remaining"] == 20000
+    assert count_spendings(client) == count + 2
+
+
+def test_import_undecodable(client: TestClient, fake_auth):
+    """Tests that a corrupt or truncated gzip body, or one that isn't UTF-8, is a 400 rather than a 500"""
+    compressed = gzip.compress(csv_file.encode())
+    for body in (
+        compressed[: len(compressed) // 2],
+        compressed[:20] + b"\x00" * 50 + compressed[70:],
+        csv_file.encode()[:60] + b"\xff\xfe" + csv_file.encode()[60:],
+    ):
+        response = client.post("/import", content=body)
+        assert response.status_code == 400, response.text
+        assert "stopped after" in response.json()["detail"]
+
+
+def test_import_export_roundtrip(client: TestClient, fake_auth):
+    """Tests that importing an export reuses the funnels with the same names"""
+    funnels = get_funnels(client).json()
+    exported = client.get("/export", params={"format": "ndjson", "gzip": True})
+
+    response = client.post(
+        "/import", params={"format": "ndjson"}, content=exported.content
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["rows_done"] == 12
+    assert response.json()["rows_failed"] == 0
+    assert len(get_funnels(client).json()) == len(funnels)
+    assert count_spendings(client) == 18
+
+
+def test_import_resume(client: TestClient, db_connection, fake_auth):
+    """Tests that resuming an import skips the rows that are already committed"""
+    lines = [
+        json.dumps({"funnel": "Test #0", "timestamp": now, "amount": amount})
+        for amount in (1, 2, 3, 4)
+    ]
+    spendingDao = SpendingDAO(db_connection)
+    importDao = ImportDAO(
+        db_connection, FunnelDAO(db_connection, spendingDao), spendingDao
+    )
+    job = importDao.start("test")
+    records = [json.loads(line) for line in lines[:2]]
+    importDao.import_chunk(job, "test", records, importDao.funnel_ids("test"))
+    count = count_spendings(client)
+
+    response = client.post(
+        "/import",
+        params={"format": "ndjson", "resume": str(job.id)},
+        content="\n".join(lines),
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["rows_done"] == 4
+    assert count_spendings(client) == count + 2
+    amounts = [s["amount"] for s in client.get("/spending").json()]
+    assert sorted(amount for amount in amounts if amount < 10) == [1, 2, 3, 4]
+
+    bogus = {"resume": "00000000-0000-4000-8000-000000000000"}
+    assert client.post("/import", params=bogus, content="").status_code == 404
+
+
+def test_import_async_backend(async_client: TestClient, fake_auth):
+    response = async_client.post("/import", content=gzip.compress(csv_file.encode()))
+    assert response.status_code == 200, response.text
+    assert response.json()["rows_done"] == 5
+    assert response.json()["rows_failed"] == 2
@@ -0,0 +1,34 @@
+import io
+import json
+import logging
+
+import pytest
+
+from ..log import JsonFormatter, setup_logging
+
+
+@pytest.fixture
+def restore_loggers():
+    """setup_logging configures the loggers of the whole process, the rest of the tests get them back as they were"""
+    loggers = [logging.getLogger(name) for name in ("app", "sqlalchemy.engine")]
+    saved = [(logger.handlers, logger.level, logger.propagate) for logger in loggers]
+    yield
+    for logger, (handlers, level, propagate) in zip(loggers, saved):
+        logger.handlers = handlers
+        logger.setLevel(level)
+        logger.propagate = propagate
+
+
+def test_json_formatter():
+    record = logging.LogRecord("app.test", logging.INFO, "", 0, "a %s", ("b",), None)
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "a b"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "app.test"
+
+
+def test_sql_not_echoed_by_default(client, fake_auth, restore_loggers):
+    stream = io.StringIO()
+    setup_logging(stream)
+    client.get("/funnel")
+    assert "SELECT" not in stream.getvalue()
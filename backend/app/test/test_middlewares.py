@@ -0,0 +1,171 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from ..lib.prometheus import Histogram
+from ..main import app as main_app
+from ..middlewares import *
+
+ROWS = [{"id": i, "amount": i * 1.5, "timestamp": 1700000000000 + i} for i in range(1000)]
+
+
+@pytest.fixture
+def compressed_client():
+    app = FastAPI()
+
+    @app.get("/big")
+    def big():
+        return ROWS
+
+    @app.get("/huge")
+    def huge():
+        return ROWS * 10
+
+    @app.get("/small")
+    def small():
+        return ROWS[:1]
+
+    @app.get("/opted-out")
+    @uncompressed
+    def opted_out():
+        return ROWS
+
+    @app.get("/gzip-file")
+    def gzip_file():
+        return Response(gzip.compress(json.dumps(ROWS).encode()), media_type="application/gzip")
+
+    @app.get("/encoded")
+    def encoded():
+        return PlainTextResponse("x" * 5000, headers={"Content-Encoding": "identity"})
+
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    return TestClient(app)
+
+
+def test_compression(compressed_client: TestClient):
+    response = compressed_client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(json.dumps(ROWS)) / 3
+    assert response.json() == ROWS
+
+    response = compressed_client.get("/huge", headers={"Accept-Encoding": "gzip"})
+    assert int(response.headers["content-length"]) < THREADPOOL_SIZE
+    assert response.json() == ROWS * 10
+
+    for accept_encoding in ("identity", "gzip;q=0, deflate", "*, gzip;q=0, br;q=0"):
+        response = compressed_client.get("/big", headers={"Accept-Encoding": accept_encoding})
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.json() == ROWS
+
+    response = compressed_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == ROWS[:1]
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli isn't installed")
+def test_compression_brotli(compressed_client: TestClient):
+    response = compressed_client.get("/big", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.json() == ROWS
+
+
+def test_compression_skipped(compressed_client: TestClient):
+    """Tests that opted out routes, compressed types and encoded responses are sent as they are"""
+    for path in ("/opted-out", "/gzip-file", "/encoded"):
+        response = compressed_client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert response.headers.get("content-encoding") in (None, "identity"), path
+        assert "vary" not in response.headers, path
+
+    events_route = next(route for route in main_app.routes if route.name == "get_events")
+    assert events_route.endpoint.uncompressed
+
+
+def test_compression_streaming():
+    """Tests that a stream is compressed as it goes, with a flush every STREAM_FLUSH_SIZE bytes"""
+    lines = [json.dumps(row) + "\n" for row in ROWS * 5]
+
+    async def iter_lines():
+        for line in lines:
+            yield line
+
+    app = CompressionMiddleware(StreamingResponse(iter_lines(), media_type="application/x-ndjson"))
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", b"gzip")]}
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(10)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+
+    start, *bodies = sent
+    headers = dict(start["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    assert [body["more_body"] for body in bodies] == [True] * (len(bodies) - 1) + [False]
+
+    # everything up to the last flush reaches the client before the stream ends
+    text = "".join(lines)
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    flushed = decompressor.decompress(b"".join(body["body"] for body in bodies[:-1]))
+    assert len(flushed) >= len(text) // STREAM_FLUSH_SIZE * STREAM_FLUSH_SIZE
+    assert flushed.decode() == text[: len(flushed)]
+    assert gzip.decompress(b"".join(body["body"] for body in bodies)).decode() == text
+
+
+def parse_server_timing(header: str) -> dict[str, dict[str, str]]:
+    metrics = {}
+    for metric in header.split(","):
+        name, *params = [part.strip() for part in metric.split(";")]
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+
+def test_server_timing(client: TestClient, fake_auth):
+    response = client.get("/funnel/")
+    assert response.status_code == 200, response.text
+
+    timing = parse_server_timing(response.headers["server-timing"])
+    assert timing.keys() == {"handler", "auth", "db"}
+    assert int(timing["db"]["desc"].strip('"').split()[-1]) >= 1
+    assert float(timing["handler"]["dur"]) >= float(timing["db"]["dur"]) > 0
+
+
+def test_metrics(client: TestClient, fake_auth):
+    client.get("/funnel/")
+    client.get("/nowhere")
+    response = TestClient(main_app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    lines = response.text.splitlines()
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert any(
+        line.startswith('http_request_duration_seconds_bucket{method="GET",route="/funnel/",le="+Inf"} ')
+        for line in lines
+    )
+    assert any(
+        line.startswith('http_requests_total{method="GET",route="unmatched",status="404"} ')
+        for line in lines
+    )
+
+    histogram = Histogram("latency", "Latency", ("route",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value, "/a")
+    assert histogram.render().splitlines()[2:] == [
+        'latency_bucket{route="/a",le="0.1"} 2',
+        'latency_bucket{route="/a",le="1.0"} 3',
+        'latency_bucket{route="/a",le="+Inf"} 4',
+        'latency_sum{route="/a"} 2.65',
+        'latency_count{route="/a"} 4',
+    ]
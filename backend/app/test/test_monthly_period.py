@@ -1,4 +1,9 @@
-from datetime import datetime
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
 from ..lib.monthly_period import *
 
 
@@ -14,6 +19,18 @@ def test_period_start():
     ) == ms_timestamp(datetime(year=2023, month=9, day=5))
 
 
+def test_period_start_in_january():
+    assert get_current_period_start(
+        datetime(year=2024, month=1, day=1)
+    ) == ms_timestamp(datetime(year=2023, month=12, day=PERIOD_BREAKPOINT))
+
+
+def test_clamp_month():
+    assert clamp_month(0, 2024) == (12, 2023)
+    assert clamp_month(12, 2024) == (12, 2024)
+    assert clamp_month(13, 2024) == (1, 2025)
+
+
 def test_period_length():
     assert get_current_period_length(datetime(year=2023, month=1, day=20)) == 31
     assert get_current_period_length(datetime(year=2023, month=2, day=20)) == 28
@@ -25,3 +42,109 @@ def test_period_remaining():
     assert get_current_period_remaining_days(datetime(year=2023, month=9, day=20)) == 14
     assert get_current_period_remaining_days(datetime(year=2023, month=9, day=5)) == 29
     assert get_current_period_remaining_days(datetime(year=2023, month=9, day=4)) == 0
+
+
+def test_calendar_breakpoint():
+    calendar = PeriodCalendar(breakpoint=5)
+    assert calendar.current_period_start(datetime(2023, 9, 4)) == ms_timestamp(
+        datetime(2023, 8, 5)
+    )
+    assert calendar.current_period_start(datetime(2023, 9, 5)) == ms_timestamp(
+        datetime(2023, 9, 5)
+    )
+    assert calendar.remaining_days(datetime(2023, 9, 20)) == 14
+    assert calendar.remaining_days(datetime(2023, 9, 4)) == 0
+    assert calendar.period_length(datetime(2024, 2, 20)) == 29
+
+    with pytest.raises(ValueError):
+        PeriodCalendar(breakpoint=31)
+
+
+def test_calendar_timezone():
+    """Tests that periods start at midnight of the calendar's timezone"""
+    tokyo = PeriodCalendar(breakpoint=1, timezone=ZoneInfo("Asia/Tokyo"))
+    new_york = PeriodCalendar(breakpoint=1, timezone=ZoneInfo("America/New_York"))
+    # 2024-03-01 05:00 in Tokyo, still February 29 in New York
+    timestamp = ms_timestamp(datetime(2024, 2, 29, 20, tzinfo=timezone.utc))
+
+    assert tokyo.period_start(timestamp) == ms_timestamp(
+        datetime(2024, 3, 1, tzinfo=ZoneInfo("Asia/Tokyo"))
+    )
+    assert new_york.period_start(timestamp) == ms_timestamp(
+        datetime(2024, 2, 1, tzinfo=ZoneInfo("America/New_York"))
+    )
+    assert new_york.next_period_start(timestamp) == ms_timestamp(
+        datetime(2024, 3, 1, tzinfo=ZoneInfo("America/New_York"))
+    )
+
+
+def test_calendar_vectorized():
+    calendar = PeriodCalendar(timezone=ZoneInfo("Europe/Berlin"))
+    timestamps = np.random.default_rng(0).integers(
+        1_600_000_000_000, 1_760_000_000_000, 10_000
+    )
+    assert calendar.starts(timestamps).tolist() == [
+        calendar.period_start(timestamp) for timestamp in timestamps.tolist()
+    ]
+    assert calendar.indices(timestamps).tolist() == [
+        calendar.index(timestamp) for timestamp in timestamps.tolist()
+    ]
+    assert calendar.starts(np.array([], np.int64)).tolist() == []
+
+
+def test_calendar_month_end():
+    calendar = PeriodCalendar(breakpoint=28)
+    assert calendar.period_start(ms_timestamp(datetime(2023, 2, 27, 23, 59))) == (
+        ms_timestamp(datetime(2023, 1, 28))
+    )
+    assert calendar.period_start(ms_timestamp(datetime(2023, 2, 28))) == ms_timestamp(
+        datetime(2023, 2, 28)
+    )
+    assert calendar.period_length(datetime(2023, 2, 28)) == 28
+    assert calendar.period_length(datetime(2024, 2, 28)) == 29
+    assert calendar.remaining_days(datetime(2024, 3, 27)) == 0
+
+    calendar = PeriodCalendar(breakpoint=1)
+    assert calendar.next_period_start(ms_timestamp(datetime(2023, 12, 31, 23))) == (
+        ms_timestamp(datetime(2024, 1, 1))
+    )
+    assert calendar.bucket_start("week", (date(2024, 1, 1) - EPOCH).days) == (
+        ms_timestamp(datetime(2024, 1, 1))
+    )
+    assert calendar.bucket_start("period", (date(2023, 12, 31) - EPOCH).days) == (
+        ms_timestamp(datetime(2023, 12, 1))
+    )
+
+
+def test_calendar_dst():
+    """Tests the boundaries of the days and periods around the transitions of Europe/Berlin in 2024,
+    from +01:00 to +02:00 at 01:00 UTC on March 31, and back at 01:00 UTC on October 27"""
+    berlin = ZoneInfo("Europe/Berlin")
+    calendar = get_calendar(27, "Europe/Berlin")
+    assert calendar is get_calendar(27, "Europe/Berlin")
+
+    spring = ms_timestamp(datetime(2024, 3, 31, 1, tzinfo=timezone.utc))
+    autumn = ms_timestamp(datetime(2024, 10, 27, 1, tzinfo=timezone.utc))
+    year_start = ms_timestamp(datetime(2024, 1, 1, tzinfo=berlin))
+    assert calendar.utc_offsets(year_start, year_start + 366 * DAY_MS) == [
+        (year_start, 3_600_000),
+        (spring, 7_200_000),
+        (autumn, 3_600_000),
+    ]
+
+    march_31 = (date(2024, 3, 31) - EPOCH).days
+    assert calendar.bucket_start("day", march_31 + 1) - calendar.bucket_start(
+        "day", march_31
+    ) == 23 * 60 * 60 * 1000
+
+    # the period starts at midnight of the +02:00 side, and the repeated hour belongs to it
+    period_start = ms_timestamp(datetime(2024, 10, 27, tzinfo=berlin))
+    assert period_start == ms_timestamp(
+        datetime(2024, 10, 26, 22, tzinfo=timezone.utc)
+    )
+    assert calendar.period_start(autumn - 1) == period_start
+    assert calendar.period_start(autumn + 1) == period_start
+    assert calendar.period_start(period_start - 1) == ms_timestamp(
+        datetime(2024, 9, 27, tzinfo=berlin)
+    )
+    assert calendar.period_length(datetime(2024, 10, 27, 2, 30, tzinfo=berlin)) == 31
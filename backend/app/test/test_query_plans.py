@@ -0,0 +1,38 @@
+import re
+
+from fastapi.testclient import TestClient
+import sqlalchemy as sa
+
+from .shared import *
+
+FULL_SCAN = re.compile(r"^SCAN \w+$")
+
+
+def explain(conn: sa.Connection, statement: str, parameters) -> list[str]:
+    cursor = conn.connection.driver_connection.execute(
+        f"EXPLAIN QUERY PLAN {statement}", parameters
+    )
+    return [row[3] for row in cursor.fetchall()]
+
+
+def test_no_full_scans(client: TestClient, db_connection: sa.Connection, fake_auth):
+    """Tests that no query issued by the funnel and spending routes scans a whole table"""
+    with capture_queries(db_connection) as statements:
+        funnel_id = get_funnels(client).json()[0]["id"]
+        client.get(f"/funnel/{funnel_id}")
+        client.get("/spending")
+        client.get("/analytics", params={"bucket": "week"})
+        spending_id = client.post(
+            "/spending",
+            json={"amount": 1, "timestamp": 1, "funnel_id": funnel_id},
+        ).json()
+        client.put(
+            f"/spending/{spending_id}",
+            json={"amount": 2, "timestamp": 2, "funnel_id": funnel_id},
+        )
+        client.delete(f"/spending/{spending_id}")
+
+    assert statements
+    for statement, parameters in statements:
+        plan = explain(db_connection, statement, parameters)
+        assert not any(FULL_SCAN.match(step) for step in plan), (statement, plan)
@@ -0,0 +1,69 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ..lib.sql_fingerprint import fingerprint, normalize_sql, parameter_shape
+from ..log import setup_logging
+from ..slow_queries import slow_query_log
+
+
+@pytest.fixture
+def log_every_query(monkeypatch):
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 0)
+    slow_query_log.clear()
+    yield
+    slow_query_log.clear()
+
+
+def test_normalize_sql():
+    normalized = normalize_sql(
+        "SELECT a.id, b.t1\n  FROM a JOIN b ON a.id = b.a_id\n"
+        "WHERE a.name = 'O''Brien' AND a.amount > -2.5e3 AND a.id IN (?, ?, ?) AND a.x = :x LIMIT 10"
+    )
+    assert normalized == (
+        "SELECT a.id, b.t1 FROM a JOIN b ON a.id = b.a_id "
+        "WHERE a.name = ? AND a.amount > ? AND a.id IN (...) AND a.x = ? LIMIT ?"
+    )
+    assert normalize_sql("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)") == (
+        "INSERT INTO t (a, b) VALUES (...)"
+    )
+    assert fingerprint(normalize_sql("SELECT 1 WHERE x IN (?)")) == fingerprint(
+        normalize_sql("SELECT  2 WHERE x IN (?, ?)")
+    )
+
+    assert parameter_shape(("a", 1, None)) == "(str, int, NoneType)"
+    assert parameter_shape([("a", 1.5), ("b", 2.5)], executemany=True) == "2 x (str, float)"
+
+
+def test_slow_queries_logged(client: TestClient, fake_auth, log_every_query):
+    stream = io.StringIO()
+    setup_logging(stream)
+    assert client.get("/funnel/").status_code == 200
+
+    [query] = [
+        query
+        for query in slow_query_log.top(100)
+        if "FROM funnels" in query.sql and query.routes == ["GET /funnel/"]
+    ]
+    assert "?" in query.sql and "'test'" not in query.sql
+    assert "str" in query.parameters and "test" not in query.parameters
+    assert any("funnels" in line for line in query.plan)
+    assert f"on GET /funnel/: {query.sql}" in stream.getvalue()
+
+
+def test_admin_slow_queries(client: TestClient, fake_auth, log_every_query, monkeypatch):
+    client.get("/funnel/")
+    client.get("/spending/")
+    assert client.get("/admin/slow-queries").status_code == 403
+
+    monkeypatch.setattr("app.dependencies.ADMIN_USERNAMES", {"test"})
+    response = client.get("/admin/slow-queries")
+    assert response.status_code == 200, response.text
+    fingerprints = response.json()
+    assert len(fingerprints) >= 2
+    assert [entry["max_ms"] for entry in fingerprints] == sorted(
+        (entry["max_ms"] for entry in fingerprints), reverse=True
+    )
+    assert all(entry["count"] >= 1 and entry["total_ms"] >= entry["max_ms"] for entry in fingerprints)
+    assert client.get("/admin/slow-queries", params={"limit": 1}).json() == fingerprints[:1]
@@ -1,9 +1,18 @@
+import json
+import re
 from datetime import datetime
+from uuid import uuid4
 
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
+import sqlalchemy as sa
 
+from ..cache import user_settings_cache
+from ..dao.spendings import SpendingDAO
+from ..dao.tables import funnel_period_totals_table, funnels_table, users_table
 from ..dto.spendings import *
-from ..lib.monthly_period import ms_timestamp
+from ..lib.monthly_period import get_calendar, ms_timestamp
 from .shared import *
 
 test_spending = {
@@ -66,3 +75,225 @@ def test_funnel_non_auth(client: TestClient):
     delete = client.delete("/spending/123")
 
     assert all(req.status_code == 403 for req in (get, post, put, delete))
+
+
+def get_remaining(client: TestClient, funnel_id: str) -> float:
+    return client.get(f"/funnel/{funnel_id}").json()["remaining"]
+
+
+def test_spending_writes_update_remaining(client: TestClient, fake_auth):
+    """Tests that creating, updating and deleting a spending keeps the funnel totals in sync"""
+    funnel_id, other_funnel_id = [f["id"] for f in get_funnels(client).json()[:2]]
+    remaining = get_remaining(client, funnel_id)
+    other_remaining = get_remaining(client, other_funnel_id)
+
+    spending_id = client.post(
+        "/spending", json=test_spending | {"funnel_id": funnel_id}
+    ).json()
+    assert get_remaining(client, funnel_id) == remaining - 250
+
+    client.put(
+        f"/spending/{spending_id}",
+        json=test_spending | {"amount": 100, "funnel_id": other_funnel_id},
+    )
+    assert get_remaining(client, funnel_id) == remaining
+    assert get_remaining(client, other_funnel_id) == other_remaining - 100
+
+    client.delete(f"/spending/{spending_id}")
+    assert get_remaining(client, other_funnel_id) == other_remaining
+
+
+def test_rebuild_period_totals(client: TestClient, db_connection, fake_auth):
+    """Tests that rebuilding the totals repairs drift"""
+    funnel_id = get_funnels(client).json()[0]["id"]
+    remaining = get_remaining(client, funnel_id)
+
+    db_connection.execute(sa.update(funnel_period_totals_table).values(spent=0))
+    assert get_remaining(client, funnel_id) == 20000
+
+    assert SpendingDAO(db_connection).rebuild_period_totals() == 3
+    assert get_remaining(client, funnel_id) == remaining
+
+
+def test_period_totals_follow_stored_settings(client: TestClient, db_connection, fake_auth):
+    """Tests that writes file their totals by the settings in the DB, when the cached ones lag behind"""
+    funnel_id = get_funnels(client).json()[0]["id"]
+    user_settings_cache.set("test", (3, "Pacific/Kiritimati"))
+    spending = SpendingCreate(amount=10, timestamp=ms_timestamp(datetime.now()), funnel_id=funnel_id)
+    SpendingDAO(db_connection).create(spending, "test")
+
+    period_starts = db_connection.execute(
+        sa.select(funnel_period_totals_table.c.period_start).distinct()
+    ).scalars().all()
+    assert period_starts == [get_calendar(15, None).current_period_start()]
+
+
+def test_spendings_scoped_to_user(client: TestClient, db_connection, fake_auth):
+    """Tests that spendings of other users can't be seen or modified"""
+    db_connection.execute(
+        sa.insert(users_table).values({"username": "other", "otp_secret": ""})
+    )
+    db_connection.execute(
+        sa.insert(funnels_table).values(
+            {"id": str(uuid4()), "name": "Other", "limit": 1, "user_name": "other"}
+        )
+    )
+    other_funnel_id = db_connection.execute(
+        sa.select(funnels_table.c.id).where(funnels_table.c.user_name == "other")
+    ).scalar_one()
+    other_spending_id = SpendingDAO(db_connection).create(
+        SpendingCreate(**test_spending, funnel_id=other_funnel_id), "other"
+    )
+
+    assert not any(
+        spending["funnel_id"] == other_funnel_id
+        for spending in get_spendings(client).json()
+    )
+    body = test_spending | {"funnel_id": other_funnel_id}
+    assert client.post("/spending", json=body).status_code == 404
+    assert client.put(f"/spending/{other_spending_id}", json=body).status_code == 404
+    assert client.delete(f"/spending/{other_spending_id}").status_code == 404
+
+
+def test_get_spendings_paginated(client: TestClient, fake_auth):
+    """Tests that walking the pages by cursor yields every spending exactly once, in order"""
+    all_spendings = get_spendings(client).json()
+
+    pages = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/spending", params=params)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    assert all(len(page) <= 2 for page in pages)
+    paginated = [spending for page in pages for spending in page]
+    assert paginated == sorted(
+        all_spendings, key=lambda spending: (spending["timestamp"], spending["id"])
+    )
+
+    assert client.get("/spending", params={"cursor": "bogus"}).status_code == 400
+
+
+def test_get_spendings_fast_path(client: TestClient, db_connection, fake_auth):
+    """Tests that the rows dumped straight to JSON are byte for byte what the response_model used to render,
+    but for the documented spelling of exponents"""
+    funnel_id = get_funnels(client).json()[0]["id"]
+    for amount in (0.1, 12.345, 0.0001, -3.5, 99999999.99, 1e15 + 0.5, 1e-7, -2.5e-12, 1e16):
+        spending = test_spending | {"amount": amount, "funnel_id": funnel_id}
+        SpendingDAO(db_connection).create(SpendingCreate(**spending), "test")
+
+    for params in ({}, {"limit": 3}):
+        response = client.get("/spending", params=params)
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"] == "application/json"
+        spendings = SpendingDAO(db_connection).get_all("test", **params)
+        rendered = JSONResponse(jsonable_encoder(spendings)).body
+        assert response.content == re.sub(
+            rb'("amount":-?[\d.]+e)\+?(-?)0*(\d)', rb"\1\2\3", rendered
+        )
+        assert response.json() == json.loads(rendered)
+
+
+def test_get_spendings_ndjson(client: TestClient, fake_auth):
+    response = client.get("/spending", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    streamed = [json.loads(line) for line in response.text.splitlines()]
+    assert streamed == get_spendings(client).json()
+
+    pages = []
+    params = {"limit": 2}
+    while True:
+        response = client.get(
+            "/spending", params=params, headers={"Accept": "application/x-ndjson"}
+        )
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        pages.append([json.loads(line) for line in response.text.splitlines()])
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert [spending for page in pages for spending in page] == sorted(
+        streamed, key=lambda spending: (spending["timestamp"], spending["id"])
+    )
+
+
+def test_post_spendings_batch(client: TestClient, fake_auth):
+    """Tests that a batch inserts the valid rows and reports the rejected ones in place"""
+    funnel_id = get_funnels(client).json()[0]["id"]
+    remaining = get_remaining(client, funnel_id)
+    count = len(get_spendings(client).json())
+
+    response = client.post(
+        "/spending/batch",
+        json=[
+            test_spending | {"funnel_id": funnel_id},
+            test_spending | {"funnel_id": str(uuid4())},
+            {"amount": "a lot", "funnel_id": funnel_id},
+            test_spending | {"amount": 50, "funnel_id": funnel_id},
+        ],
+    )
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert results[0]["id"] and results[0]["error"] is None
+    assert results[1] == {"id": None, "error": "Funnel does not exist"}
+    assert results[2]["id"] is None and "amount" in results[2]["error"]
+    assert results[3]["id"] and results[3]["error"] is None
+
+    assert len(get_spendings(client).json()) == count + 2
+    assert get_remaining(client, funnel_id) == remaining - 300
+
+
+def test_post_spendings_batch_ndjson(client: TestClient, fake_auth):
+    funnel_id = get_funnels(client).json()[0]["id"]
+    body = "\n".join(
+        [json.dumps(test_spending | {"funnel_id": funnel_id}), "{not json", ""]
+    )
+    response = client.post(
+        "/spending/batch",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert len(results) == 2
+    assert results[0]["id"]
+    assert results[1]["error"].startswith("Invalid JSON")
+
+    assert client.post("/spending/batch", json={"a": 1}).status_code == 400
+
+
+def test_post_spendings_batch_too_large(client: TestClient, fake_auth, monkeypatch):
+    """Tests that an oversized batch is rejected before its body is parsed"""
+    monkeypatch.setattr("app.routers.spendings.MAX_BATCH_SIZE", 2)
+    funnel_id = get_funnels(client).json()[0]["id"]
+    count = len(get_spendings(client).json())
+    line = json.dumps(test_spending | {"funnel_id": funnel_id}) + "\n"
+
+    def lines():
+        for _ in range(3):
+            yield line.encode()
+
+    response = client.post(
+        "/spending/batch",
+        content=lines(),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 413
+    response = client.post(
+        "/spending/batch",
+        json=[test_spending | {"funnel_id": funnel_id, "note": "x" * 2048}],
+    )
+    assert response.status_code == 413
+    assert len(get_spendings(client).json()) == count
+
+    response = client.post(
+        "/spending/batch",
+        content=line * 2,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200, response.text
@@ -0,0 +1,103 @@
+from datetime import datetime
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from ..lib.monthly_period import ms_timestamp
+from .shared import *
+
+now = ms_timestamp(datetime.now())
+
+
+def get_sync(client: TestClient, since: int = 0) -> dict:
+    response = client.get("/sync", params={"since": since})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def get_version(client: TestClient) -> int:
+    """The version after a first write, since the test data is inserted around the change log"""
+    funnel = get_funnels(client).json()[0]
+    client.put(f"/funnel/{funnel['id']}", json=funnel)
+    return get_sync(client)["version"]
+
+
+def test_full_sync(client: TestClient, fake_auth):
+    delta = get_sync(client)
+    assert len(delta["funnels"]) == 3
+    assert len(delta["spendings"]) == 9
+    assert delta["deleted"] == []
+
+
+def test_delta_sync(client: TestClient, fake_auth):
+    """Tests that a sync returns the rows written since the given version, along with tombstones of deleted rows"""
+    version = get_version(client)
+    assert version > 0
+    funnels = get_funnels(client).json()
+    spendings = get_sync(client)["spendings"]
+    moved, deleted = spendings[0], spendings[1]
+    target = next(f["id"] for f in funnels if f["id"] != moved["funnel_id"])
+
+    created = client.post(
+        "/spending", json={"amount": 5, "timestamp": now, "funnel_id": target}
+    ).json()
+    client.put(f"/spending/{moved['id']}", json=moved | {"funnel_id": target})
+    client.delete(f"/spending/{deleted['id']}")
+
+    delta = get_sync(client, version)
+    assert delta["version"] > version
+    assert {s["id"] for s in delta["spendings"]} == {created, moved["id"]}
+    assert {f["id"] for f in delta["funnels"]} == {
+        target,
+        moved["funnel_id"],
+        deleted["funnel_id"],
+    }
+    assert delta["deleted"] == [{"entity": "spending", "id": deleted["id"]}]
+
+    in_target = {s["id"] for s in get_sync(client)["spendings"] if s["funnel_id"] == target}
+    assert {created, moved["id"]} <= in_target
+    client.delete(f"/funnel/{target}")
+    later = get_sync(client, delta["version"])
+    assert later["funnels"] == later["spendings"] == []
+    tombstones = {(tombstone["entity"], tombstone["id"]) for tombstone in later["deleted"]}
+    assert tombstones == {("funnel", target)} | {("spending", id) for id in in_target}
+    assert target not in {s["funnel_id"] for s in get_sync(client)["spendings"]}
+    assert get_sync(client, later["version"]) == {
+        "version": later["version"],
+        "funnels": [],
+        "spendings": [],
+        "deleted": [],
+    }
+
+
+def test_offline_writes(client: TestClient, fake_auth):
+    """Tests that queued writes apply in order and may be retried"""
+    funnel_id = get_funnels(client).json()[0]["id"]
+    version = get_version(client)
+    id, gone = str(uuid4()), str(uuid4())
+    spending = {"amount": 10, "timestamp": now, "funnel_id": funnel_id}
+    writes = [
+        {"id": id, "spending": spending},
+        {"id": gone, "spending": spending},
+        {"id": id, "spending": spending | {"amount": 20}},
+        {"id": gone},
+        {"id": str(uuid4()), "spending": spending | {"funnel_id": str(uuid4())}},
+    ]
+    expected = [
+        {"id": id, "error": None},
+        {"id": gone, "error": None},
+        {"id": id, "error": None},
+        {"id": gone, "error": None},
+        {"id": None, "error": "Funnel does not exist"},
+    ]
+
+    for _ in range(2):
+        response = client.post("/sync", json=writes)
+        assert response.status_code == 200, response.text
+        assert response.json() == expected
+
+    delta = get_sync(client, version)
+    assert delta["spendings"] == [spending | {"id": id, "amount": 20}]
+    assert delta["deleted"] == [{"entity": "spending", "id": gone}]
+    remaining = next(f for f in delta["funnels"] if f["id"] == funnel_id)["remaining"]
+    assert remaining == 20000 - 450 - 20
@@ -1,7 +1,18 @@
 from fastapi.testclient import TestClient
 import pyotp
+import pytest
+import sqlalchemy as sa
 
+from ..cache import token_blacklist_cache, user_settings_cache
+from ..dao.spendings import SpendingDAO
+from ..dao.tables import funnel_period_totals_table
+from ..dao.users import UsersDAO, cache_token_blacklist
 from ..dto.users import *
+from ..exceptions import JwtTokenBlacklistedException
+from ..hooks import commit
+from ..lib.monthly_period import get_calendar
+from ..routers.users import generate_jwt
+from .shared import capture_queries
 
 
 def check_auth(client: TestClient, access: str):
@@ -73,3 +84,68 @@ def test_refresh(client: TestClient, user_data: dict[str, str]):
         client.post("/user/refresh/", json={"refresh": tokens["refresh"]}).status_code
         == 403
     )
+
+
+def test_decode_token_cached(app, db_connection, user_data: dict[str, str]):
+    """Tests that repeated auth skips the DB, while invalidation still takes effect"""
+    user_dao = UsersDAO(db_connection)
+    token = generate_jwt(user_data["username"], 60, "access")
+    decoded = user_dao.decode_token(token)
+
+    with capture_queries(db_connection) as statements:
+        assert user_dao.decode_token(token) == decoded
+    assert statements == []
+
+    user_dao.invalidate_tokens(user_data["username"], decoded["iat"] + 1)
+    # a concurrent request refilling the cache before the commit doesn't undo the invalidation
+    token_blacklist_cache.set(user_data["username"], None)
+    commit(db_connection)
+    with pytest.raises(JwtTokenBlacklistedException):
+        user_dao.decode_token(token)
+    # nor does one that read the entry before the commit and caches it afterwards
+    cache_token_blacklist(user_data["username"], None)
+    cache_token_blacklist(user_data["username"], decoded["iat"] - 1)
+    with pytest.raises(JwtTokenBlacklistedException):
+        user_dao.decode_token(token)
+
+
+def test_settings(client: TestClient, db_connection, fake_auth):
+    """Tests that changing the settings moves the period totals to the periods of the new calendar"""
+    response = client.get("/user/settings/")
+    assert response.json() == {"period_breakpoint": 15, "timezone": None}
+
+    assert client.put("/user/settings/", json={"period_breakpoint": 29}).status_code == 422
+    assert (
+        client.put("/user/settings/", json={"timezone": "Mars/Olympus"}).status_code
+        == 422
+    )
+
+    settings = {"period_breakpoint": 3, "timezone": "Pacific/Kiritimati"}
+    response = client.put("/user/settings/", json=settings)
+    assert response.status_code == 200, response.text
+    assert client.get("/user/settings/").json() == settings
+
+    period_starts = db_connection.execute(
+        sa.select(funnel_period_totals_table.c.period_start).distinct()
+    ).scalars().all()
+    assert period_starts == [get_calendar(3, "Pacific/Kiritimati").current_period_start()]
+    assert all(
+        funnel["remaining"] == 20000 - 450 for funnel in client.get("/funnel").json()
+    )
+
+
+def test_settings_cached_on_commit(app, db_connection: sa.Connection, user_data: dict[str, str]):
+    """Tests that the settings a rebuild caches before the commit don't outlive a rollback"""
+    username = user_data["username"]
+    settings = UserSettings(period_breakpoint=3, timezone="Europe/Berlin")
+    commit(db_connection)
+
+    UsersDAO(db_connection).update_settings(username, settings)
+    SpendingDAO(db_connection).rebuild_period_totals(username)
+    db_connection.rollback()
+    assert user_settings_cache.get(username) is None
+
+    UsersDAO(db_connection).update_settings(username, settings)
+    SpendingDAO(db_connection).rebuild_period_totals(username)
+    commit(db_connection)
+    assert list(user_settings_cache.get(username)) == [3, "Europe/Berlin"]
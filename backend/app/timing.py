@@ -0,0 +1,106 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+
+import sqlalchemy as sa
+
+from .lib.prometheus import Registry
+
+
+@dataclass
+class RequestTimings:
+    """Where the time of a request went, in seconds. `handler` runs until the response starts"""
+
+    handler: float = 0.0
+    auth: float = 0.0
+    db: float = 0.0
+    queries: int = 0
+    scope: dict = field(default_factory=dict, repr=False)
+
+    @property
+    def route(self) -> str:
+        """The path template of the route that handles the request, once it's routed"""
+        route = self.scope.get("route")
+        return route.path if route is not None else "unmatched"
+
+    def server_timing(self) -> str:
+        return (
+            f"handler;dur={self.handler * 1000:.1f}, auth;dur={self.auth * 1000:.1f}, "
+            f'db;dur={self.db * 1000:.1f};desc="SQL statements: {self.queries}"'
+        )
+
+
+# The timings of the request being handled. The threadpool copies the context, so DAO calls add to the same object
+request_timings: ContextVar[RequestTimings | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextmanager
+def timed_auth():
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        if (timings := request_timings.get()) is not None:
+            timings.auth += perf_counter() - started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if request_timings.get() is not None:
+        context._query_started = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = request_timings.get()
+    started = getattr(context, "_query_started", None)
+    if timings is not None and started is not None:
+        timings.db += perf_counter() - started
+        timings.queries += 1
+
+
+def record_query_timings(engine: sa.Engine):
+    """Adds the time of every SQL statement run on `engine` to the timings of the request that ran it"""
+    sa.event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    sa.event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+metrics = Registry()
+"""Served by GET /metrics. Each worker process has its own"""
+
+_ROUTE_LABELS = ("method", "route")
+request_duration = metrics.histogram(
+    "http_request_duration_seconds",
+    "Time from the start of a request to the end of its response",
+    _ROUTE_LABELS,
+)
+request_db_duration = metrics.histogram(
+    "http_request_db_duration_seconds",
+    "Time a request spent in SQL statements",
+    _ROUTE_LABELS,
+)
+request_queries = metrics.histogram(
+    "http_request_sql_statements",
+    "SQL statements run by a request",
+    _ROUTE_LABELS,
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+request_auth_seconds = metrics.counter(
+    "http_request_auth_seconds_total",
+    "Time spent authenticating requests",
+    _ROUTE_LABELS,
+)
+requests_total = metrics.counter(
+    "http_requests_total", "Requests by response status", _ROUTE_LABELS + ("status",)
+)
+
+
+def record_request(
+    method: str, route: str, status: int, duration: float, timings: RequestTimings
+):
+    request_duration.observe(duration, method, route)
+    request_db_duration.observe(timings.db, method, route)
+    request_queries.observe(timings.queries, method, route)
+    request_auth_seconds.inc(method, route, amount=timings.auth)
+    requests_total.inc(method, route, str(status))
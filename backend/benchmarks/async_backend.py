@@ -0,0 +1,110 @@
+"""Load-tests `GET /funnel/` and `GET /spending/` with the sync and the async DB backend.
+
+Each backend gets its own uvicorn process over a seeded SQLite file.
+Run from the backend directory: `python -m benchmarks.async_backend --clients 500`"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import tempfile
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from .shared import *
+
+PORT = 8765
+
+
+async def wait_until_up(client: httpx.AsyncClient):
+    for _ in range(100):
+        try:
+            await client.get("/ping")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+
+async def load(clients: int, requests: int, users: int) -> tuple[list[float], int]:
+    latencies: list[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=120
+    ) as client:
+        await wait_until_up(client)
+
+        async def worker(worker_id: int):
+            nonlocal errors
+            token = make_token(f"user{worker_id % users}")
+            headers = {"Authorization": f"Bearer {token}"}
+            for i in range(requests):
+                start = time.perf_counter()
+                path = "/funnel/" if i % 2 == 0 else "/spending/"
+                try:
+                    response = await client.get(path, headers=headers)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+    return latencies, errors
+
+
+def run(backend: str, db_path: Path, clients: int, requests: int, users: int):
+    env = os.environ | {"DB_BACKEND": backend, "DB_URL": f"sqlite:///{db_path}"}
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(PORT),
+            "--timeout-keep-alive",
+            "120",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        start = time.perf_counter()
+        latencies, errors = asyncio.run(load(clients, requests, users))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    print(
+        f"{backend:>5}: {len(latencies) / elapsed:8.1f} req/s, "
+        f"p50 {statistics.median(latencies) * 1000:8.1f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:8.1f} ms, "
+        f"{errors} errors"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=10, help="per client")
+    parser.add_argument("--spendings", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    db_path = Path(tempfile.mkdtemp()) / "bench.db"
+    seed(make_engine(db_path), args.spendings, users=args.users)
+    print(f"--- {args.clients} concurrent clients, {args.spendings} spendings")
+    for backend in ("sync", "async"):
+        run(backend, db_path, args.clients, args.requests, args.users)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Compares importing spendings one POST at a time with a single POST /spending/batch.
+
+Run from the backend directory: `python -m benchmarks.batch_ingest --rows 2000`"""
+import argparse
+import random
+
+import sqlalchemy as sa
+from fastapi.testclient import TestClient
+
+from app.dao.tables import funnels_table
+from app.dependencies import _get_db_conn
+from app.main import make_app
+from .shared import *
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--spendings", type=int, default=10_000)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    now = seed(engine, args.spendings, users=10)
+    with engine.connect() as conn:
+        funnel_ids = conn.scalars(
+            sa.select(funnels_table.c.id).where(funnels_table.c.user_name == "user1")
+        ).all()
+
+    def get_bench_db_conn():
+        with engine.begin() as conn:
+            yield conn
+
+    app = make_app()
+    app.dependency_overrides[_get_db_conn] = get_bench_db_conn
+    headers = {"Authorization": f"Bearer {make_token('user1')}"}
+    rng = random.Random(0)
+    rows = [
+        {
+            "amount": rng.randint(1, 500),
+            "timestamp": now - rng.randint(0, YEAR_MS),
+            "funnel_id": rng.choice(funnel_ids),
+        }
+        for _ in range(args.rows)
+    ]
+
+    with TestClient(app) as client:
+        with timer() as single:
+            for row in rows:
+                client.post("/spending/", json=row, headers=headers)
+        with timer() as batch:
+            response = client.post("/spending/batch", json=rows, headers=headers)
+        assert all(result["id"] for result in response.json())
+
+    for name, elapsed in (("single", single[0]), ("batch", batch[0])):
+        print(f"{name:>6}: {elapsed * 1000:8.1f} ms, {args.rows / elapsed:10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
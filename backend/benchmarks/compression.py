@@ -0,0 +1,92 @@
+"""Measures the CPU cost and the bytes saved by each encoding and level of CompressionMiddleware, on the bodies of
+`GET /spending/` and of the CSV and NDJSON exports, whole and streamed in 64 KiB chunks like the export is.
+
+Run from the backend directory: `python -m benchmarks.compression --rows 100000`"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+
+from app.dao.spendings import SpendingDAO
+from app.dto.spendings import spending_rows_adapter
+from app.lib.export import CHUNK_SIZE, EXPORT_FIELDS
+from app.middlewares import *
+from app.middlewares import _Brotli, _Gzip
+from .shared import *
+
+
+def payloads(rows: list[dict]) -> dict[str, bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_FIELDS, restval="")
+    writer.writeheader()
+    records = [
+        {"record": "spending", "funnel": "Groceries", "timestamp": row["timestamp"], "amount": row["amount"]}
+        for row in rows
+    ]
+    writer.writerows(records)
+    return {
+        "spendings json": spending_rows_adapter.dump_json(rows),
+        "export csv": buffer.getvalue().encode(),
+        "export ndjson": "".join(json.dumps(record) + "\n" for record in records).encode(),
+    }
+
+
+def stream(body: bytes, encoding: str) -> int:
+    """Sends the body through the middleware in CHUNK_SIZE parts, returns the bytes that went out"""
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/csv")]})
+        for start in range(0, len(body), CHUNK_SIZE):
+            await send(
+                {"type": "http.response.body", "body": body[start : start + CHUNK_SIZE], "more_body": True}
+            )
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = [0]
+
+    async def send(message):
+        sent[0] += len(message.get("body", b""))
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app)(scope, None, send))
+    return sent[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    seed(engine, args.rows, users=1, funnels_per_user=5)
+    with engine.connect() as conn:
+        rows = SpendingDAO(conn).get_rows("user0", timestamp_from=0)
+
+    compressors = [(f"gzip {level}", lambda level=level: _Gzip(level)) for level in (1, 6, 9)]
+    if brotli is not None:
+        compressors += [(f"br {quality}", lambda quality=quality: _Brotli(quality)) for quality in (1, 4, 11)]
+    else:
+        print("brotli isn't installed, only gzip is measured")
+
+    for name, body in payloads(rows).items():
+        print(f"{name}, {len(body) / 2**20:.1f} MB:")
+        for label, make in compressors:
+            compressor = make()
+            with timer() as elapsed:
+                size = len(compressor.compress(body) + compressor.finish())
+            print(
+                f"  {label:>7}: {elapsed[0] * 1000:7.1f} ms, {len(body) / 2**20 / elapsed[0]:6.1f} MB/s, "
+                f"{size / 2**20:5.2f} MB ({1 - size / len(body):.0%} saved)"
+            )
+        for encoding in ("gzip",) + (("br",) if brotli is not None else ()):
+            with timer() as elapsed:
+                size = stream(body, encoding)
+            print(
+                f"  {encoding:>4} streamed: {elapsed[0] * 1000:7.1f} ms, "
+                f"{size / 2**20:5.2f} MB ({1 - size / len(body):.0%} saved)"
+            )
+
+
+if __name__ == "__main__":
+    main()
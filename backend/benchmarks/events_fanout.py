@@ -0,0 +1,116 @@
+"""Measures how long a write takes to reach many idle `GET /events/` streams, and what the streams cost the server in RSS.
+
+A uvicorn process serves a seeded SQLite file. `--clients` streams of one user are opened, then a spending is posted
+and the time until every stream has received its event is measured.
+Run from the backend directory: `python -m benchmarks.events_fanout --clients 100 1000 2000`"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import sqlalchemy as sa
+
+from app.dao.tables import funnels_table
+from .shared import *
+
+PORT = 8767
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def open_stream(token: str) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+    writer.write(
+        f"GET /events/ HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n\r\n".encode()
+    )
+    await writer.drain()
+    # the headers and the `retry:` line arrive as soon as the subscription exists
+    await reader.readuntil(b"retry: ")
+    # the writer is returned too, since the connection closes once it's garbage collected
+    return reader, writer
+
+
+async def wait_for_event(reader: asyncio.StreamReader) -> float:
+    await reader.readuntil(b"event: spendings")
+    return time.perf_counter()
+
+
+async def measure(clients: int, token: str, funnel_id: str, pid: int):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}") as client:
+        idle_rss = rss_mb(pid)
+        streams = []
+        for start in range(0, clients, 200):
+            streams += await asyncio.gather(
+                *(open_stream(token) for _ in range(min(200, clients - start)))
+            )
+        streams_rss = rss_mb(pid)
+
+        waiters = [asyncio.create_task(wait_for_event(reader)) for reader, _ in streams]
+        sent = time.perf_counter()
+        response = await client.post(
+            "/spending/",
+            json={"amount": 10, "timestamp": int(time.time() * 1000), "funnel_id": funnel_id},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        response.raise_for_status()
+        received = sorted(t - sent for t in await asyncio.gather(*waiters))
+        for _, writer in streams:
+            writer.close()
+
+    print(
+        f"{clients:>6} streams: first {received[0] * 1000:7.1f} ms, "
+        f"median {received[len(received) // 2] * 1000:7.1f} ms, last {received[-1] * 1000:7.1f} ms; "
+        f"server RSS {idle_rss:6.1f} MB idle, +{(streams_rss - idle_rss) * 1024 / clients:5.1f} KB per stream"
+    )
+
+
+def run(clients: int):
+    db_path = Path(tempfile.mkdtemp()) / "bench.db"
+    engine = make_engine(db_path)
+    seed(engine, 1000, users=10)
+    with engine.connect() as conn:
+        funnel_id = conn.execute(
+            sa.select(funnels_table.c.id).where(funnels_table.c.user_name == "user1")
+        ).scalar()
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT)],
+        env=os.environ | {"DB_URL": f"sqlite:///{db_path}", "EVENTS_KEEPALIVE": "60"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"http://127.0.0.1:{PORT}/ping")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        asyncio.run(measure(clients, make_token("user1"), funnel_id, server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 1000, 2000])
+    args = parser.parse_args()
+
+    for clients in args.clients:
+        run(clients)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Shows that the peak memory of an export does not grow with the amount of exported spendings.
+
+Run from the backend directory: `python -m benchmarks.export_memory --spendings 100000 1000000`"""
+import argparse
+import asyncio
+import tracemalloc
+
+from app.dao.aio import AsyncSpendingDAO
+from app.lib.export import gzip_chunks, to_csv
+from .shared import *
+
+
+async def export(engine, username: str) -> int:
+    size = 0
+    with engine.connect() as conn:
+        records = AsyncSpendingDAO(conn).iter_export(username)
+        async for chunk in gzip_chunks(to_csv(records)):
+            size += len(chunk)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spendings", type=int, nargs="+", default=[100_000, 500_000])
+    args = parser.parse_args()
+
+    for spendings in args.spendings:
+        engine = make_engine()
+        seed(engine, spendings, users=1)
+        tracemalloc.start()
+        with timer() as elapsed:
+            size = asyncio.run(export(engine, "user0"))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{spendings:>9} spendings: {elapsed[0]:6.2f} s, {size / 2**20:6.1f} MB gzipped, "
+            f"peak {peak / 2**20:5.1f} MB allocated"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compares the vectorized forecast with a per-funnel Python loop, both over the spendings of the trailing burn rate
+window, which is all that FunnelDAO.get_forecast loads.
+
+Run from the backend directory: `python -m benchmarks.forecast --funnels 10000 --spendings 2000000`"""
+import argparse
+
+import numpy as np
+
+from app.lib.forecast import *
+from .shared import *
+
+
+def forecast_loop(
+    limits: list[float],
+    spent: list[float],
+    rows: list[tuple[int, int, float]],
+    start: int,
+    remaining_days: int,
+) -> list[dict[str, float]]:
+    """The straightforward version: per funnel, bucket the spendings of the window by day, then average the trailing days"""
+    by_funnel: dict[int, list[tuple[int, float]]] = {}
+    for funnel, timestamp, amount in rows:
+        by_funnel.setdefault(funnel, []).append((timestamp, amount))
+
+    results = []
+    for funnel, limit in enumerate(limits):
+        daily = [0.0] * BURN_RATE_WINDOW
+        for timestamp, amount in by_funnel.get(funnel, []):
+            daily[(timestamp - start) // DAY_MS] += amount
+        burn_rate = sum(daily) / BURN_RATE_WINDOW
+        projected_spent = spent[funnel] + burn_rate * remaining_days
+        results.append(
+            {
+                "burn_rate": burn_rate,
+                "recent_burn_rate": sum(daily[-RECENT_BURN_RATE_WINDOW:])
+                / RECENT_BURN_RATE_WINDOW,
+                "projected_spent": projected_spent,
+                "projected_remaining": limit - projected_spent,
+                "daily_allowance": max(limit - spent[funnel], 0) / (remaining_days + 1),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--funnels", type=int, default=10_000)
+    parser.add_argument("--spendings", type=int, default=2_000_000)
+    parser.add_argument("--years", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    days = args.years * 365
+    funnel_index = rng.integers(0, args.funnels, args.spendings)
+    timestamps = rng.integers(0, days * DAY_MS, args.spendings)
+    amounts = rng.integers(1, 500, args.spendings).astype(np.float64)
+    limits = np.full(args.funnels, 2000.0)
+    spent = rng.uniform(0, 2000, args.funnels)
+
+    # the DB query of get_forecast only returns the window
+    start = (days - BURN_RATE_WINDOW) * DAY_MS
+    window = timestamps >= start
+    funnel_index, timestamps, amounts = (
+        funnel_index[window],
+        timestamps[window],
+        amounts[window],
+    )
+    rows = list(zip(funnel_index.tolist(), timestamps.tolist(), amounts.tolist()))
+
+    # the DAO builds the arrays from the rows, so both versions start from them
+    with timer() as vectorized:
+        daily = daily_spend(
+            np.fromiter((row[0] for row in rows), np.int64, len(rows)),
+            np.fromiter((row[1] for row in rows), np.int64, len(rows)),
+            np.fromiter((row[2] for row in rows), np.float64, len(rows)),
+            args.funnels,
+            start,
+            BURN_RATE_WINDOW,
+        )
+        result = forecast(limits, spent, daily, 10)
+
+    with timer() as loop:
+        expected = forecast_loop(limits.tolist(), spent.tolist(), rows, start, 10)
+    for key, values in result.items():
+        assert np.allclose(values, [funnel[key] for funnel in expected]), key
+
+    print(
+        f"{args.funnels} funnels, {len(rows)} spendings in the {BURN_RATE_WINDOW}-day window "
+        f"of {args.spendings} over {args.years} years:"
+    )
+    print(f"      loop: {loop[0] * 1000:8.1f} ms")
+    print(f"vectorized: {vectorized[0] * 1000:8.1f} ms ({loop[0] / vectorized[0]:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Measures the throughput of `POST /import` and the server's peak RSS, for files of growing size.
+
+Each run gets its own uvicorn process over a seeded SQLite file, and the file is streamed to it from disk.
+Run from the backend directory: `python -m benchmarks.import_throughput --rows 100000 1000000`"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from app.lib.export import EXPORT_FIELDS
+from .shared import *
+
+PORT = 8766
+
+
+def write_file(path: Path, rows: int, now: int):
+    rng = random.Random(0)
+    with path.open("w") as file:
+        file.write(",".join(EXPORT_FIELDS) + "\n")
+        for i in range(5):
+            file.write(f"funnel,,Funnel {i},2000,#ffffff,x,,,\n")
+        for i in range(rows):
+            file.write(
+                f"spending,,,,,,Funnel {i % 5},"
+                f"{now - rng.randint(0, YEAR_MS)},{rng.randint(1, 500)}\n"
+            )
+
+
+def run(rows: int, chunk_size: int):
+    directory = Path(tempfile.mkdtemp())
+    db_path = directory / "bench.db"
+    now = seed(make_engine(db_path), 1000, users=10)
+    file_path = directory / "import.csv"
+    write_file(file_path, rows, now)
+
+    env = os.environ | {
+        "DB_URL": f"sqlite:///{db_path}",
+        "IMPORT_CHUNK_SIZE": str(chunk_size),
+        # pages of the mmapped DB file count towards RSS as the DB grows, and would hide the import's own memory
+        "SQLITE_MMAP_SIZE": "0",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{PORT}", timeout=None) as client:
+            for _ in range(100):
+                try:
+                    client.get("/ping")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+            headers = {"Authorization": f"Bearer {make_token('user1')}"}
+            with file_path.open("rb") as file, timer() as elapsed:
+                response = client.post("/import/", content=file, headers=headers)
+            job = response.json()
+    finally:
+        server.terminate()
+        _, _, usage = os.wait4(server.pid, 0)
+
+    print(
+        f"{rows:>9} rows, {file_path.stat().st_size / 2**20:6.1f} MB: "
+        f"{job['rows_done'] / elapsed[0]:8.0f} rows/s, {job['rows_failed']} failed, "
+        f"server peak RSS {usage.ru_maxrss / 1024:6.1f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        run(rows, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Compares how `GET /spending/` turns rows into the response body: through SpendingPublic models and FastAPI's
+response_model, as it used to, or straight from the row dicts with `spending_rows_adapter`.
+
+Run from the backend directory: `python -m benchmarks.list_serialization --rows 100000`"""
+import argparse
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.dao.spendings import SpendingDAO
+from app.dto.spendings import SpendingPublic, spending_rows_adapter
+from .shared import *
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    seed(engine, args.rows, users=1, funnels_per_user=5)
+    # what FastAPI does with a response_model: validate the returned value, dump it, then render it with json.dumps
+    response_field = TypeAdapter(list[SpendingPublic])
+
+    with engine.connect() as conn:
+        dao = SpendingDAO(conn)
+        with timer() as fetch_models:
+            spendings = dao.get_all("user0", timestamp_from=0)
+        with timer() as render_models:
+            validated = response_field.validate_python(spendings)
+            old = JSONResponse(jsonable_encoder(validated)).body
+
+        with timer() as fetch_rows:
+            rows = dao.get_rows("user0", timestamp_from=0)
+        with timer() as render_rows:
+            new = spending_rows_adapter.dump_json(rows)
+
+    assert new == old
+    print(f"{len(rows)} rows, {len(new) / 2**20:.1f} MB of JSON:")
+    print(
+        f"    models: fetch {fetch_models[0] * 1000:7.1f} ms + render {render_models[0] * 1000:7.1f} ms"
+    )
+    print(
+        f"      rows: fetch {fetch_rows[0] * 1000:7.1f} ms + render {render_rows[0] * 1000:7.1f} ms "
+        f"({(fetch_models[0] + render_models[0]) / (fetch_rows[0] + render_rows[0]):.0f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
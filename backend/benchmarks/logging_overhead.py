@@ -0,0 +1,45 @@
+"""Measures the per-request cost of SQL echo logging, which used to be always on.
+
+Run from the backend directory: `python -m benchmarks.logging_overhead --requests 2000`"""
+import argparse
+import logging
+import tempfile
+
+from fastapi.testclient import TestClient
+
+from app.dependencies import _get_db_conn
+from app.log import setup_logging
+from app.main import make_app
+from .shared import *
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--spendings", type=int, default=10_000)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    seed(engine, args.spendings, users=10)
+
+    def get_bench_db_conn():
+        with engine.begin() as conn:
+            yield conn
+
+    app = make_app()
+    app.dependency_overrides[_get_db_conn] = get_bench_db_conn
+    headers = {"Authorization": f"Bearer {make_token('user1')}"}
+
+    with tempfile.TemporaryFile("w") as log_file, TestClient(app) as client:
+        setup_logging(log_file)
+        for name, level in (("SQL echo", logging.INFO), ("quiet", logging.WARNING)):
+            logging.getLogger("sqlalchemy.engine").setLevel(level)
+            with timer() as elapsed:
+                for i in range(args.requests):
+                    path = "/funnel/" if i % 2 == 0 else "/spending/"
+                    client.get(path, headers=headers)
+            print(f"{name:>8}: {elapsed[0] / args.requests * 1e6:8.1f} µs/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compares mapping timestamps to their periods with per-call datetime math, the memoized calendar and its vectorized form.
+
+Run from the backend directory: `python -m benchmarks.period_calendar --timestamps 1000000`"""
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from app.lib.monthly_period import PERIOD_BREAKPOINT, PeriodCalendar, clamp_month, ms_timestamp
+from .shared import *
+
+
+def period_start_per_call(timestamp: int) -> int:
+    """The datetime math that used to run for every call"""
+    dt = datetime.fromtimestamp(timestamp / 1000)
+    month, year = clamp_month(
+        dt.month - 1 if dt.day < PERIOD_BREAKPOINT else dt.month, dt.year
+    )
+    return ms_timestamp(
+        dt.replace(
+            year=year,
+            month=month,
+            day=PERIOD_BREAKPOINT,
+            hour=0,
+            minute=0,
+            second=0,
+            microsecond=0,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--timestamps", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    timestamps = np.random.default_rng(0).integers(
+        0, 5 * YEAR_MS, args.timestamps
+    ) + (int(datetime.now().timestamp() * 1000) - 5 * YEAR_MS)
+    as_list = timestamps.tolist()
+    calendar = PeriodCalendar()
+
+    with timer() as per_call:
+        expected = [period_start_per_call(timestamp) for timestamp in as_list]
+    with timer() as memoized:
+        scalar = [calendar.period_start(timestamp) for timestamp in as_list]
+    with timer() as vectorized:
+        vector = calendar.starts(timestamps)
+    assert expected == scalar == vector.tolist()
+
+    print(f"{args.timestamps} timestamps over 5 years:")
+    for name, elapsed in (
+        ("per-call datetime math", per_call),
+        ("memoized calendar", memoized),
+        ("vectorized calendar", vectorized),
+    ):
+        print(f"{name:>22}: {elapsed[0] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Compares summing a user's whole history per week over the spendings with reading closed periods from snapshots.
+
+Run from the backend directory: `python -m benchmarks.period_snapshots --spendings 1000000`,
+pass `--timezone Europe/Berlin` to measure the cost of the user's DST offsets in the GROUP BY"""
+import argparse
+from collections import defaultdict
+
+import sqlalchemy as sa
+
+from app.dao.spendings import SpendingDAO
+from app.dao.tables import users_table
+from .shared import *
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spendings", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--timezone", default=None)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    now = seed(engine, args.spendings, users=args.users)
+    with engine.connect() as conn:
+        conn.execute(
+            sa.update(users_table)
+            .where(users_table.c.username == "user1")
+            .values(timezone=args.timezone)
+        )
+        dao = SpendingDAO(conn)
+        dao.rebuild_period_totals("user1")
+        calendar = dao.calendar("user1")
+
+        with timer() as plain:
+            for _ in range(args.repeat):
+                rows = dao._query_day_totals("user1", calendar, 0, now)
+        expected = defaultdict(float)
+        for funnel_id, day, spent, _ in rows:
+            expected[calendar.bucket_start("week", day), funnel_id] += spent
+
+        with timer() as cold:
+            dao.get_totals("user1", "week", 0, now)
+        with timer() as warm:
+            for _ in range(args.repeat):
+                buckets = dao.get_totals("user1", "week", 0, now)
+        assert len(buckets) == len(expected)
+        assert all(
+            abs(bucket.spent - expected[bucket.start, str(bucket.funnel_id)]) < 1e-6
+            for bucket in buckets
+        )
+
+    print(
+        f"{args.spendings // args.users} spendings of one user in {args.timezone or 'local time'}, weekly totals:"
+    )
+    print(f"        GROUP BY: {plain[0] / args.repeat * 1000:8.1f} ms")
+    print(f"taking snapshots: {cold[0] * 1000:8.1f} ms")
+    print(f"  from snapshots: {warm[0] / args.repeat * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
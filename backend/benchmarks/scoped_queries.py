@@ -0,0 +1,66 @@
+"""Compares the work SQLite does for the spendings list query before and after scoping it with `UserScope`.
+
+Run from the backend directory: `python -m benchmarks.scoped_queries --spendings 1000000`"""
+import argparse
+
+import sqlalchemy as sa
+
+from app.dao.scope import UserScope
+from app.dao.tables import spendings_table
+from .shared import *
+
+# The query SpendingDAO.get_all used to emit: an implicit cross join, and no scope at all without a username
+IMPLICIT_JOIN = sa.text(
+    "SELECT spendings.* FROM spendings, funnels "
+    "WHERE spendings.timestamp > :ts_from AND spendings.timestamp < :ts_to "
+    "AND spendings.funnel_id = funnels.id AND funnels.user_name = :username"
+)
+UNSCOPED = sa.text(
+    "SELECT spendings.* FROM spendings "
+    "WHERE spendings.timestamp > :ts_from AND spendings.timestamp < :ts_to"
+)
+
+
+def scoped(ts_from: int, ts_to: int, username: str):
+    return (
+        UserScope(username)
+        .spendings()
+        .where(spendings_table.c.timestamp > ts_from)
+        .where(spendings_table.c.timestamp < ts_to)
+    )
+
+
+def measure(conn: sa.Connection, query, repeat: int) -> tuple[int, int, float]:
+    with count_vm_steps(conn) as steps, timer() as elapsed:
+        for _ in range(repeat):
+            rows = len(conn.execute(query).all())
+    return rows, steps[0] // repeat, elapsed[0] / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spendings", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for indexes in (False, True):
+        engine = make_engine()
+        now = seed(engine, args.spendings, indexes=indexes)
+        window = {"ts_from": now - YEAR_MS // 12, "ts_to": now}
+        params = window | {"username": "user42"}
+        print(f"--- {args.spendings} spendings, indexes: {indexes}")
+        with engine.connect() as conn:
+            for name, query in (
+                ("unscoped", UNSCOPED.bindparams(**window)),
+                ("implicit join", IMPLICIT_JOIN.bindparams(**params)),
+                ("UserScope", scoped(**params)),
+            ):
+                rows, steps, elapsed = measure(conn, query, args.repeat)
+                print(
+                    f"{name:>14}: {rows:>7} rows, {steps:>11} VM steps, "
+                    f"{elapsed * 1000:9.2f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from uuid import uuid4
+
+import jwt
+import sqlalchemy as sa
+
+from app.config import JWT_SECRET
+from app.dao.spendings import SpendingDAO
+from app.dao.tables import funnels_table, spendings_table, users_table
+from app.database import metadata_obj
+
+YEAR_MS = 365 * 24 * 60 * 60 * 1000
+
+
+def make_engine(path: Path | None = None) -> sa.Engine:
+    if path is None:
+        path = Path(tempfile.mkdtemp()) / "bench.db"
+    return sa.create_engine(f"sqlite:///{path}")
+
+
+def seed(
+    engine: sa.Engine,
+    spendings: int,
+    users: int = 1000,
+    funnels_per_user: int = 3,
+    years: int = 5,
+    indexes: bool = True,
+):
+    """Fills a fresh database with `spendings` rows spread evenly across users, funnels and time"""
+    metadata_obj.create_all(engine)
+    if not indexes:
+        with engine.begin() as conn:
+            for table in (funnels_table, spendings_table):
+                for index in table.indexes:
+                    index.drop(conn)
+
+    now = int(time.time() * 1000)
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        usernames = [f"user{i}" for i in range(users)]
+        conn.execute(
+            sa.insert(users_table),
+            [{"username": name, "otp_secret": ""} for name in usernames],
+        )
+        funnel_ids = [str(uuid4()) for _ in range(users * funnels_per_user)]
+        conn.execute(
+            sa.insert(funnels_table),
+            [
+                {
+                    "id": id,
+                    "name": "Bench",
+                    "limit": 2000,
+                    "color": "#ffffff",
+                    "emoji": "x",
+                    "user_name": usernames[i // funnels_per_user],
+                }
+                for i, id in enumerate(funnel_ids)
+            ],
+        )
+        batch = 50_000
+        for start in range(0, spendings, batch):
+            conn.execute(
+                sa.insert(spendings_table),
+                [
+                    {
+                        "id": str(uuid4()),
+                        "amount": rng.randint(1, 500),
+                        "timestamp": now - rng.randint(0, years * YEAR_MS),
+                        "funnel_id": rng.choice(funnel_ids),
+                    }
+                    for _ in range(min(batch, spendings - start))
+                ],
+            )
+        SpendingDAO(conn).rebuild_period_totals()
+    return now
+
+
+def make_token(username: str) -> str:
+    now = datetime.now(tz=timezone.utc)
+    return jwt.encode(
+        {
+            "username": username,
+            "exp": now + timedelta(hours=1),
+            "iat": now,
+            "type": "access",
+        },
+        JWT_SECRET,
+    )
+
+
+@contextmanager
+def count_vm_steps(conn: sa.Connection, granularity: int = 100):
+    """Counts SQLite virtual machine steps, a proxy for the rows a query examines"""
+    steps = [0]
+
+    def on_progress():
+        steps[0] += granularity
+        return 0
+
+    raw = conn.connection.driver_connection
+    raw.set_progress_handler(on_progress, granularity)
+    try:
+        yield steps
+    finally:
+        raw.set_progress_handler(None, 0)
+
+
+@contextmanager
+def timer():
+    elapsed = [0.0]
+    start = time.perf_counter()
+    try:
+        yield elapsed
+    finally:
+        elapsed[0] = time.perf_counter() - start
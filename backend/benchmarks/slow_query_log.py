@@ -0,0 +1,52 @@
+"""Measures the per-statement cost of the slow-query listeners on top of the timing ones, and shows what the log catches when the spendings
+lose their indexes, the kind of regression an unscoped or unindexed query causes.
+
+Run from the backend directory: `python -m benchmarks.slow_query_log --statements 100000 --spendings 1000000`"""
+import argparse
+import io
+
+import sqlalchemy as sa
+
+from app.dao.spendings import SpendingDAO
+from app.log import setup_logging
+from app.slow_queries import log_slow_queries, slow_query_log
+from app.timing import record_query_timings
+from .shared import *
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statements", type=int, default=100_000)
+    parser.add_argument("--spendings", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    query = sa.text("SELECT :value")
+    # a fresh engine each, since SQLAlchemy keeps the slower path of an engine that had listeners once
+    for name, instrument in (
+        ("no listeners", []),
+        ("timings", [record_query_timings]),
+        ("timings + slow query log", [record_query_timings, log_slow_queries]),
+    ):
+        engine = sa.create_engine("sqlite://")
+        for listen in instrument:
+            listen(engine)
+        with engine.connect() as conn, timer() as elapsed:
+            for i in range(args.statements):
+                conn.execute(query, {"value": i})
+        print(f"{name:>24}: {elapsed[0] / args.statements * 1e6:6.2f} µs/statement")
+
+    engine = make_engine()
+    seed(engine, args.spendings, users=100, indexes=False)
+    log_slow_queries(engine)
+    stream = io.StringIO()
+    setup_logging(stream)
+    slow_query_log.threshold_ms = 10
+    with engine.connect() as conn:
+        SpendingDAO(conn).get_all("user1", timestamp_from=0)
+    [top] = slow_query_log.top(1)
+    print(f"slowest: {top.max_ms:.1f} ms, {top.sql[:80]}...")
+    print("plan:", *top.plan, sep="\n  ")
+
+
+if __name__ == "__main__":
+    main()
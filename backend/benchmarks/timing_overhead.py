@@ -0,0 +1,51 @@
+"""Measures the per-request cost of TimingMiddleware and of timing every SQL statement, and shows a Server-Timing header.
+
+Run from the backend directory: `python -m benchmarks.timing_overhead --requests 2000`"""
+import argparse
+
+import sqlalchemy as sa
+from fastapi.testclient import TestClient
+
+from app import timing
+from app.dependencies import _get_db_conn
+from app.main import make_app
+from app.middlewares import TimingMiddleware
+from .shared import *
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--spendings", type=int, default=10_000)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    seed(engine, args.spendings, users=10)
+
+    def get_bench_db_conn():
+        with engine.begin() as conn:
+            yield conn
+
+    headers = {"Authorization": f"Bearer {make_token('user1')}"}
+    for name, timed in (("timed", True), ("untimed", False)):
+        app = make_app()
+        if timed:
+            timing.record_query_timings(engine)
+        else:
+            app.user_middleware = [m for m in app.user_middleware if m.cls is not TimingMiddleware]
+            sa.event.remove(engine, "before_cursor_execute", timing._before_cursor_execute)
+            sa.event.remove(engine, "after_cursor_execute", timing._after_cursor_execute)
+        app.dependency_overrides[_get_db_conn] = get_bench_db_conn
+
+        with TestClient(app) as client:
+            with timer() as elapsed:
+                for i in range(args.requests):
+                    path = "/funnel/" if i % 2 == 0 else "/spending/"
+                    response = client.get(path, headers=headers)
+        print(f"{name:>8}: {elapsed[0] / args.requests * 1e6:8.1f} µs/request")
+        if timed:
+            print(f"          {path} Server-Timing: {response.headers['server-timing']}")
+
+
+if __name__ == "__main__":
+    main()